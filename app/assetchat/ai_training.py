@@ -1,198 +1,253 @@
+import hashlib
 import logging
 import tempfile
+from itertools import islice
 from pathlib import Path
-from typing import TypedDict
 
-import magic
+from assetchat.chunking import Chunker
 from assetchat.common import (
     get_collection_id,
     get_collection_name,
+    get_embeddings,
     get_vector_store,
 )
-from assetchat.models import ProcessedFile, VectorToDelete
+from assetchat.document_loading import DocumentList, DocumentLoader
+from assetchat.file_deletion import purge_stale_vectors
+from assetchat.models import ProcessedFile, TrainingState
+from backend.fetching import ObjectFetcher
 from django.core.files import File
 from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
 from filemanager.models import Folder
-from langchain.document_loaders import PyMuPDFLoader
-from langchain.document_loaders import TextLoader as LangChainTextLoader
-from langchain.document_loaders import (
-    UnstructuredFileLoader,
-    UnstructuredImageLoader,
-    UnstructuredWordDocumentLoader,
-)
-from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 log = logging.getLogger("assetchat.utils")
 
-PathList = list[Path]
-DocumentList = list[Document]
-
-ImageLoader = UnstructuredImageLoader
-MicrosoftWordLoader = UnstructuredWordDocumentLoader
-PDFLoader = PyMuPDFLoader
-TextLoader = LangChainTextLoader
-UnknownFileLoader = UnstructuredFileLoader
-
-
-class MimePathMap(TypedDict):
-    plaintext: PathList
-    microsoft_word: PathList
-    pdf: PathList
-    image: PathList
-    unknown: PathList
-
-
-class MimeDocumentMap(TypedDict):
-    plaintext: DocumentList
-    microsoft_word: DocumentList
-    pdf: DocumentList
-    image: DocumentList
-    unknown: DocumentList
-
-
-mime_loader_map = {
-    "plaintext": TextLoader,
-    "microsoft_word": MicrosoftWordLoader,
-    "pdf": PDFLoader,
-    "image": ImageLoader,
-    "unknown": UnknownFileLoader,
-}
-
 
 def get_file_name(file: File):
     path = Path(file.name)
     return path.name
 
 
-def write_file_to_tmp_dir(file: File, tmp_dir: Path):
+def get_tmp_path(folderr_file, tmp_dir: Path) -> Path:
+    return tmp_dir / str(folderr_file.pk) / get_file_name(folderr_file.file)
+
+
+def write_file_to_tmp_dir(file: File, tmp_dir: Path, digest=None, chunks=None):
     file_path = tmp_dir / get_file_name(file)
     with file_path.open("wb") as target_fp:
-        for chunk in file.chunks():
+        for chunk in chunks or file.chunks():
             target_fp.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
     log.info("File written to %s.", file_path)
     return file_path
 
 
-def get_mime_map(paths: PathList) -> MimePathMap:
-    mime_map: MimePathMap = {
-        "plaintext": [],
-        "microsoft_word": [],
-        "pdf": [],
-        "image": [],
-        "unknown": [],
-    }
-    for path in paths:
-        mime_type = magic.from_file(str(path), mime=True)
-        if mime_type in [
-            "application/msword",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        ]:
-            mime_map["microsoft_word"].append(path)
-        elif mime_type == "application/pdf":
-            mime_map["pdf"].append(path)
-        elif mime_type == "text/plain":
-            mime_map["plaintext"].append(path)
-        elif mime_type.find("image") != -1:
-            mime_map["image"].append(path)
-        else:
-            mime_map["unknown"].append(path)
-    log.debug("Mime map:\n\n %s", mime_map)
-    return mime_map
-
-
-def load_documents(mime_map: MimePathMap) -> MimeDocumentMap:
-    document_map: MimeDocumentMap = {
-        "plaintext": [],
-        "microsoft_word": [],
-        "pdf": [],
-        "image": [],
-        "unknown": [],
-    }
-
-    for file_type, file_paths in mime_map.items():
-        log.info("Loading %s files.", file_type)
-        loader_class = mime_loader_map[file_type]
-        for file_path in file_paths:
-            log.info("Loading file at path %s.", file_path)
-            loader = loader_class(str(file_path))
-            document_map[file_type] += loader.load()  # type: ignore
-    log.debug("Document map:\n\n %s", document_map)
-    return document_map
-
-
-def split_documents(
-    document_map: MimeDocumentMap, chunk_size, overlap_size
-) -> list[Document]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size, chunk_overlap=overlap_size
-    )
-    documents_to_split = []
-    for documents in document_map.values():
-        documents_to_split += documents
-
-    return splitter.split_documents(documents_to_split)
-
-
 def delete_stale_vectors(collection_name):
     with connection.cursor() as cursor:
         collection_id = get_collection_id(collection_name, cursor)
-        if collection_id is not None:
-            log.debug("Got collection_id %s", collection_id)
-            vectors_to_delete = VectorToDelete.objects.filter(
-                collection_id=collection_id
-            )
-            log.info(
-                "%d vectors queued for deletion.", vectors_to_delete.count()
+    if collection_id is not None:
+        log.debug("Got collection_id %s", collection_id)
+        purge_stale_vectors(collection_id)
+    else:
+        log.debug("Collection id was None.")
+
+
+def mark_file(folderr_file, status: int):
+    # Replacing the row instead of updating it keeps the signals that count
+    # files per status simple.
+    previous = getattr(folderr_file, "ai_processed", None)
+    if previous is not None:
+        if previous.status == status:
+            return
+        previous.delete()
+    ProcessedFile.objects.create(file=folderr_file, status=status)
+
+
+def ingest_chunks(folderr_file, chunks: DocumentList, vector_store) -> int:
+    for chunk in chunks:
+        chunk.metadata["file_id"] = folderr_file.pk
+    if chunks:
+        vector_store.add_documents(chunks)
+    mark_file(folderr_file, ProcessedFile.PROCESSED)
+    return len(chunks)
+
+
+def iter_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def download_batch(files, tmp_dir: Path, fetcher: ObjectFetcher) -> dict:
+    """Download files, returning their paths and content hashes by id."""
+    downloads = {}
+    for folderr_file, fetched_object, error in fetcher.fetch(files):
+        file_dir = tmp_dir / str(folderr_file.pk)
+        file_dir.mkdir(exist_ok=True)
+        try:
+            if error is not None:
+                raise error
+            # Sniffs the type now if the upload didn't, so loading can't fail
+            # on it.
+            folderr_file.mime_type
+            digest = hashlib.sha256()
+            file_path = write_file_to_tmp_dir(
+                folderr_file.file, file_dir, digest, fetched_object.chunks()
             )
-            for vector in vectors_to_delete:
-                log.debug("Will delete vector %s", vector.id)
-                cursor.execute(
-                    """DELETE FROM langchain_pg_embedding WHERE collection_id = %s
-                    AND uuid = %s""",
-                    [str(collection_id), str(vector.id)],
-                )
-                log.debug("Deleted vector %s", vector.id)
-            vectors_to_delete.delete()
-        else:
-            log.debug("Collection id was None.")
+            downloads[folderr_file.pk] = (file_path, digest.hexdigest())
+        except Exception as e:
+            log.exception(e)
+            log.warning("File %s couldn't be downloaded.", folderr_file.pk)
+    return downloads
 
 
 def train_from_folder(
     folder: Folder, chunk_size, overlap_size, clear_existing: False
 ):
     collection_name = get_collection_name(folder)
-    vector_store = get_vector_store(collection_name)
+    embeddings = get_embeddings()
+    vector_store = get_vector_store(collection_name, embeddings)
     if clear_existing:
         vector_store.delete_collection()
         vector_store.create_collection()
-        for folderr_file in folder.files.all():
-            if hasattr(folderr_file, "ai_processed"):
-                folderr_file.ai_processed.delete()
+        ProcessedFile.objects.filter(file__folder=folder).delete()
     else:
         delete_stale_vectors(collection_name)
-    unprocessed_files = []
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        saved_paths = []
-        for folderr_file in folder.files.all():
-            if not hasattr(folderr_file, "ai_processed"):
-                log.info("File %s will be ingested.", folderr_file.pk)
-                unprocessed_files.append(folderr_file)
-                file_path = write_file_to_tmp_dir(
-                    folderr_file.file, Path(tmp_dir)
+    chunker = Chunker(chunk_size, overlap_size)
+    TrainingState.for_folder(folder)
+    # Files are ingested and marked as processed a batch at a time so memory
+    # use doesn't grow with the folder and an interrupted run resumes from
+    # the first file that wasn't marked. Each batch is loaded in parallel.
+    # Files that failed before are tried again. Files whose content was
+    # split with the same parameters before reuse those chunks, and aren't
+    # downloaded at all if they weren't saved since.
+    unprocessed_files = (
+        folder.files.filter(
+            Q(ai_processed__isnull=True)
+            | Q(ai_processed__status=ProcessedFile.FAILED)
+        )
+        .select_related("ai_processed", "ai_content_hash")
+        .order_by("created")
+    )
+    processed_count = 0
+    failed_count = 0
+    total_chunk_count = 0
+    with (
+        tempfile.TemporaryDirectory() as tmp_dir,
+        DocumentLoader() as loader,
+        ObjectFetcher(f"training of folder {folder.pk}") as fetcher,
+    ):
+        for batch in iter_batches(
+            unprocessed_files.iterator(), loader.batch_size
+        ):
+            files = {folderr_file.pk: folderr_file for folderr_file in batch}
+            chunks = {}
+            looked_up = set()
+            for folderr_file in batch:
+                content_hash = chunker.get_content_hash(folderr_file)
+                if content_hash is None:
+                    continue
+                looked_up.add(content_hash)
+                cached_chunks = chunker.get(
+                    content_hash, get_tmp_path(folderr_file, Path(tmp_dir))
                 )
-                saved_paths.append(file_path)
-        mime_map = get_mime_map(saved_paths)
-        document_map = load_documents(mime_map)
-        documents = split_documents(document_map, chunk_size, overlap_size)
-        vector_store.add_documents(documents)
-    ProcessedFile.objects.bulk_create(
-        [
-            ProcessedFile(file=unprocessed_file)
-            for unprocessed_file in unprocessed_files
-        ]
+                if cached_chunks is not None:
+                    chunks[folderr_file.pk] = cached_chunks
+            downloads = download_batch(
+                [files[pk] for pk in files.keys() - chunks.keys()],
+                Path(tmp_dir),
+                fetcher,
+            )
+            for file_pk in files.keys() - chunks.keys() - downloads.keys():
+                mark_file(files[file_pk], ProcessedFile.FAILED)
+                failed_count += 1
+            paths = {}
+            for file_pk, (file_path, content_hash) in downloads.items():
+                chunker.set_content_hash(files[file_pk], content_hash)
+                cached_chunks = None
+                if content_hash not in looked_up:
+                    cached_chunks = chunker.get(content_hash, file_path)
+                if cached_chunks is None:
+                    paths[file_pk] = file_path
+                else:
+                    file_path.unlink(missing_ok=True)
+                    chunks[file_pk] = cached_chunks
+            mime_types = {pk: files[pk].mime_type for pk in paths}
+            for file_pk, documents, error in loader.load_many(
+                paths, mime_types
+            ):
+                paths[file_pk].unlink(missing_ok=True)
+                if error is None:
+                    try:
+                        file_chunks = chunker.split(documents)
+                        chunker.set(
+                            downloads[file_pk][1], file_chunks, paths[file_pk]
+                        )
+                        chunks[file_pk] = file_chunks
+                    except Exception as e:
+                        error = e
+                if error is not None:
+                    log.exception(error)
+                    log.warning("File %s couldn't be loaded.", file_pk)
+                    mark_file(files[file_pk], ProcessedFile.FAILED)
+                    failed_count += 1
+            for file_pk, file_chunks in chunks.items():
+                log.info("File %s will be ingested.", file_pk)
+                try:
+                    chunk_count = ingest_chunks(
+                        files[file_pk], file_chunks, vector_store
+                    )
+                except Exception as e:
+                    log.exception(e)
+                    log.warning("File %s couldn't be ingested.", file_pk)
+                    mark_file(files[file_pk], ProcessedFile.FAILED)
+                    failed_count += 1
+                    continue
+                log.info(
+                    "File %s ingested as %d chunks.", file_pk, chunk_count
+                )
+                processed_count += 1
+                total_chunk_count += chunk_count
+    # Also invalidates the folder's cached answers.
+    TrainingState.objects.filter(folder=folder).update(
+        last_trained_at=timezone.now(),
+        collection_version=F("collection_version") + 1,
     )
     credit_count = 1
     if clear_existing:
         credit_count += 1
     folder.created_by.ai_usage_limit.consume_credits(credit_count)
+    embedding_counters = {
+        **embeddings.document_embedding_store.counters,
+        **embeddings.underlying_embeddings.counters,
+    }
+    log.info(
+        "Embedding cache for folder %d: %d hits, %d misses.",
+        folder.pk,
+        embedding_counters["cache_hits"],
+        embedding_counters["cache_misses"],
+    )
+    log.info(
+        "Chunk cache for folder %d: %d hits, %d misses.",
+        folder.pk,
+        chunker.hits,
+        chunker.misses,
+    )
+    log.info(
+        "Embedded %d chunks for folder %d at %.1f chunks/sec, "
+        "%d requests rate limited.",
+        embedding_counters["embedded_chunks"],
+        folder.pk,
+        embeddings.underlying_embeddings.throughput,
+        embedding_counters["rate_limited_requests"],
+    )
+    return {
+        "processed_files": processed_count,
+        "failed_files": failed_count,
+        "chunks": total_chunk_count,
+        **chunker.counters,
+        **fetcher.counters,
+        **embedding_counters,
+    }
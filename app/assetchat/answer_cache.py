@@ -0,0 +1,193 @@
+import logging
+import re
+from datetime import timedelta
+from typing import Optional
+
+from assetchat.common import get_collection_name
+from assetchat.embeddings import hash_text
+from assetchat.models import CachedAnswer, TrainingState
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from filemanager.models import Folder
+from pgvector.django import CosineDistance
+
+log = logging.getLogger("assetchat.answer_cache")
+
+HITS_KEY = "assetchat:answer_cache:hits"
+MISSES_KEY = "assetchat:answer_cache:misses"
+
+
+def get_collection_version(folder) -> int:
+    return (
+        TrainingState.objects.filter(folder=folder)
+        .values_list("collection_version", flat=True)
+        .first()
+        or 0
+    )
+
+
+def get_ai_folders(collection_name: str) -> list:
+    """AI folders whose vectors are stored in a collection."""
+    # The asset's title is the part of the name before one of the
+    # underscores, which narrows the folders down before comparing names.
+    parts = collection_name.split("_")
+    titles = ["_".join(parts[:i]) for i in range(1, len(parts))]
+    ai_folders = Folder.objects.filter(
+        title="AI", parent__title__in=titles
+    ).select_related("parent", "created_by")
+    return [
+        folder
+        for folder in ai_folders
+        if get_collection_name(folder) == collection_name
+    ]
+
+
+def bump_collection_version(collection_name: str):
+    """Invalidate the cached answers of a collection after its content changed."""
+    TrainingState.objects.filter(
+        folder__in=get_ai_folders(collection_name)
+    ).update(collection_version=F("collection_version") + 1)
+    log.debug("Bumped content version of collection %s.", collection_name)
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def count(key: str):
+    # Stats aren't worth failing a question for.
+    try:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+    except Exception:
+        log.warning("Couldn't count %s.", key, exc_info=True)
+
+
+def get_stats() -> dict:
+    try:
+        hits = cache.get(HITS_KEY, 0)
+        misses = cache.get(MISSES_KEY, 0)
+    except Exception:
+        log.warning("Couldn't read the answer cache stats.", exc_info=True)
+        hits = misses = None
+    total = (hits or 0) + (misses or 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else None,
+        "entries": CachedAnswer.objects.count(),
+    }
+
+
+class AnswerCache:
+    """Answers given about a collection, reused for the same question.
+
+    A question matches a cached answer when it's the same once normalized,
+    or when their embeddings are at least ``AI_ANSWER_CACHE_SIMILARITY``
+    similar. Answers expire after ``AI_ANSWER_CACHE_TTL`` seconds or when
+    the folder's ``TrainingState.collection_version`` changes, and each
+    collection keeps at most ``AI_ANSWER_CACHE_MAX_ENTRIES`` answers,
+    evicting the least recently used.
+
+    Only questions that start a conversation can be answered from or stored
+    in the cache, since follow up questions depend on the conversation.
+    """
+
+    def __init__(self, folder, embeddings):
+        self.folder = folder
+        self.collection_name = get_collection_name(folder)
+        self.embeddings = embeddings
+        self.version = get_collection_version(folder)
+        self.question_embeddings = {}
+
+    def embed(self, normalized_question: str) -> list[float]:
+        # A question that missed is embedded once for the lookup and reused
+        # when its answer is stored.
+        embedding = self.question_embeddings.get(normalized_question)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(normalized_question)
+            self.question_embeddings[normalized_question] = embedding
+        return embedding
+
+    def get_queryset(self):
+        return CachedAnswer.objects.filter(
+            collection_name=self.collection_name,
+            collection_version=self.version,
+            created_at__gte=timezone.now()
+            - timedelta(seconds=settings.AI_ANSWER_CACHE_TTL),
+        )
+
+    def lookup(self, question: str) -> Optional[str]:
+        normalized_question = normalize_question(question)
+        cached_answer = (
+            self.get_queryset()
+            .filter(question_hash=hash_text(normalized_question))
+            .first()
+        )
+        if cached_answer is None:
+            max_distance = 1 - settings.AI_ANSWER_CACHE_SIMILARITY
+            embedding = self.embed(normalized_question)
+            cached_answer = (
+                self.get_queryset()
+                .alias(distance=CosineDistance("embedding", embedding))
+                .filter(distance__lte=max_distance)
+                .order_by("distance")
+                .first()
+            )
+        if cached_answer is None:
+            count(MISSES_KEY)
+            log.debug("No cached answer for %r.", question)
+            return None
+        count(HITS_KEY)
+        CachedAnswer.objects.filter(pk=cached_answer.pk).update(
+            hit_count=F("hit_count") + 1, last_used_at=timezone.now()
+        )
+        log.info(
+            "Answered %r with the cached answer to %r.",
+            question,
+            cached_answer.question,
+        )
+        return cached_answer.answer
+
+    def store(self, question: str, answer: str):
+        normalized_question = normalize_question(question)
+        embedding = self.embed(normalized_question)
+        with transaction.atomic():
+            # The answer was generated from the content of the version read
+            # when the question was asked, and is dropped if it changed.
+            if get_collection_version(self.folder) != self.version:
+                log.debug("Not caching the answer to %r.", question)
+                return
+            CachedAnswer.objects.create(
+                collection_name=self.collection_name,
+                collection_version=self.version,
+                question=question,
+                question_hash=hash_text(normalized_question),
+                embedding=embedding,
+                answer=answer,
+            )
+            self.evict()
+
+    def evict(self):
+        """Delete older versions, expired and least recently used answers.
+
+        Answers of newer versions are left to the requests that use them.
+        """
+        collection_answers = CachedAnswer.objects.filter(
+            collection_name=self.collection_name
+        )
+        least_recently_used = collection_answers.order_by(
+            "-last_used_at"
+        ).values("pk")[settings.AI_ANSWER_CACHE_MAX_ENTRIES :]
+        collection_answers.filter(
+            Q(collection_version__lt=self.version)
+            | Q(
+                created_at__lt=timezone.now()
+                - timedelta(seconds=settings.AI_ANSWER_CACHE_TTL)
+            )
+            | Q(pk__in=least_recently_used)
+        ).delete()
@@ -19,6 +19,14 @@ class AssetchatConfig(AppConfig):
             sender=models.Prompt,
         )
 
+        post_save.connect(
+            signals.invalidate_prompt_cache, sender=models.Prompt
+        )
+
+        post_delete.connect(
+            signals.invalidate_prompt_cache, sender=models.Prompt
+        )
+
         post_save.connect(
             signals.create_usage_limit_after_signup, sender=user_model
         )
@@ -26,3 +34,19 @@ class AssetchatConfig(AppConfig):
         post_delete.connect(
             signals.mark_related_vector_for_deletion, sender=File
         )
+
+        post_save.connect(signals.count_new_file, sender=File)
+
+        pre_save.connect(signals.remember_previous_folder, sender=File)
+
+        post_save.connect(signals.recount_after_move, sender=File)
+
+        post_delete.connect(signals.count_deleted_file, sender=File)
+
+        post_save.connect(
+            signals.count_processed_file, sender=models.ProcessedFile
+        )
+
+        post_delete.connect(
+            signals.count_unprocessed_file, sender=models.ProcessedFile
+        )
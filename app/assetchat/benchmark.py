@@ -0,0 +1,360 @@
+import hashlib
+import io
+import logging
+import math
+import random
+import resource
+import secrets
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Optional
+
+import fitz
+from assetchat.ai_training import train_from_folder
+from assetchat.common import clients, get_collection_name, get_vector_store
+from assetchat.document_chat import answer_question, get_chat_history
+from assetchat.embeddings import Vector
+from assetchat.hybrid_search import RETRIEVAL_CHOICES, get_retriever
+from assetchat.models import ChatSummary, EmbeddingCache
+from assetchat.vector_index import get_percentiles
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings
+from filemanager.models import File, Folder
+from langchain.chat_models.fake import FakeListChatModel
+from PIL import Image, ImageDraw
+from sqlalchemy import event
+
+log = logging.getLogger("assetchat.benchmark")
+
+BENCHMARK_EMBEDDING_MODEL = "benchmark"
+
+FILE_KINDS = ["pdf", "docx", "txt", "png"]
+
+WORDS = """filter pump valve motor belt battery charger compressor warranty
+receipt invoice serial model part manual replace clean inspect install
+remove tighten loosen voltage pressure temperature monthly yearly service
+dealer purchase price total tax date owner kitchen garage boiler furnace
+thermostat heater washer dryer dishwasher refrigerator freezer oven
+microwave mower trimmer generator engine oil coolant tire brake light
+switch fuse breaker outlet wire cable hose pipe drain seal gasket bolt
+screw nut bracket panel cover door handle hinge lock key remote display
+error code reset button setting mode timer alarm sensor""".split()
+
+
+class FakeEmbeddingClient:
+    """Deterministic embeddings computed in process, for benchmarks.
+
+    Every word is hashed to a signed dimension, so a text always gets the
+    same vector and texts sharing words get similar ones.
+    """
+
+    def __init__(self, dimensions: int = None):
+        self.dimensions = dimensions or settings.AI_EMBEDDING_DIMENSIONS
+
+    def session(self):
+        return nullcontext()
+
+    def _embed(self, text: str) -> Vector:
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "big")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            # Cosine distance isn't defined for a zero vector.
+            vector[0] = norm = 1.0
+        return [value / norm for value in vector]
+
+    async def embed(self, texts: list[str]) -> list[Vector]:
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts: list[str]) -> list[Vector]:
+        return [self._embed(text) for text in texts]
+
+
+class FakeChatModel(FakeListChatModel):
+    """Chat model that always gives the same answer, for benchmarks.
+
+    Accepts the arguments ChatOpenAI is created with and counts tokens as
+    words, so it can be set as ``AI_CHAT_MODEL``.
+    """
+
+    responses: list = ["This is a benchmark answer."]
+    temperature: float = 0.0
+    openai_api_key: Optional[str] = None
+    streaming: bool = False
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def get_num_tokens_from_messages(self, messages) -> int:
+        return sum(
+            self.get_num_tokens(message.content) for message in messages
+        )
+
+
+class SQLCounter:
+    """Counts statements run through Django and the pooled SQLAlchemy engine.
+
+    Statements run on raw cursors of the engine's connections, like the
+    approximate and full-text searches, aren't seen by SQLAlchemy and aren't
+    counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+    @contextmanager
+    def capture(self):
+        engine = clients.get_engine()
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+        try:
+            with connection.execute_wrapper(self):
+                yield self
+        finally:
+            event.remove(engine, "before_cursor_execute", self.on_execute)
+
+
+def get_peak_rss() -> int:
+    """Peak resident set size of this process and its children in bytes."""
+    # Linux reports kilobytes. Loader workers are children and only count
+    # once they exited.
+    return 1024 * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def make_text(rng: random.Random, word_count: int) -> str:
+    sentences = []
+    while word_count > 0:
+        length = min(word_count, rng.randint(6, 16))
+        words = rng.choices(WORDS, k=length)
+        if rng.random() < 0.2:
+            # Identifiers are what hybrid retrieval is meant to find.
+            words.append(f"{rng.choice('ABCDEFGHXZ')}{rng.randint(100, 9999)}")
+        sentences.append(" ".join(words).capitalize() + ".")
+        word_count -= length
+    return "\n".join(sentences)
+
+
+def make_pdf(text: str) -> bytes:
+    lines = text.splitlines()
+    with fitz.open() as doc:
+        for start in range(0, len(lines), 40):
+            page = doc.new_page()
+            page.insert_text((50, 72), "\n".join(lines[start : start + 40]))
+        return doc.tobytes()
+
+
+def make_docx(text: str) -> bytes:
+    # python-docx comes with unstructured's Word document support.
+    import docx
+
+    document = docx.Document()
+    for line in text.splitlines():
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_png(text: str) -> bytes:
+    lines = text.splitlines()[:40]
+    image = Image.new("RGB", (1200, 20 * len(lines) + 40), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((20, 20 + 20 * i), line, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+file_makers = {
+    "pdf": make_pdf,
+    "docx": make_docx,
+    "txt": lambda text: text.encode(),
+    "png": make_png,
+}
+
+
+def create_benchmark_folder(
+    file_count: int, kinds: list[str], word_count: int, seed: int
+) -> tuple[Folder, list[str]]:
+    """Create a user with an asset whose AI folder holds synthetic files.
+
+    Returns the AI folder and the text of every file.
+    """
+    rng = random.Random(seed)
+    user = get_user_model().objects.create(
+        email=f"benchmark-{secrets.token_hex(8)}@example.com",
+        first_name="Benchmark",
+        last_name="User",
+        terms_agreed=True,
+        is_verified=True,
+    )
+    # Creating an asset creates its AI folder.
+    asset = Folder.objects.create(created_by=user, title="Benchmark")
+    folder = Folder.objects.get(parent=asset, title="AI")
+    texts = []
+    for i in range(file_count):
+        kind = kinds[i % len(kinds)]
+        text = make_text(rng, word_count)
+        texts.append(text)
+        file_name = f"benchmark-{i}.{kind}"
+        File(
+            created_by=user,
+            folder=folder,
+            file_name=file_name,
+            file=ContentFile(file_makers[kind](text), name=file_name),
+        ).save(generate_thumbnail=False)
+    return folder, texts
+
+
+def delete_benchmark_folder(folder: Folder, session_id: str):
+    get_vector_store(get_collection_name(folder)).delete_collection()
+    get_chat_history(session_id).clear()
+    ChatSummary.objects.filter(session_id=session_id).delete()
+    EmbeddingCache.objects.filter(model=BENCHMARK_EMBEDDING_MODEL).delete()
+    for folderr_file in folder.files.all():
+        folderr_file.file.delete(save=False)
+    folder.created_by.delete()
+
+
+def time_calls(calls) -> tuple[list[float], int]:
+    """Run the calls, returning their latencies in ms and the SQL count."""
+    latencies = []
+    with SQLCounter().capture() as counter:
+        for call in calls:
+            started_at = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - started_at) * 1000)
+    return latencies, counter.count
+
+
+@contextmanager
+def offline_settings(local_storage: bool):
+    """Use the fake embeddings and chat model, and local files if asked."""
+    with tempfile.TemporaryDirectory() as media_root:
+        storage_settings = {}
+        if local_storage:
+            storage_settings = {
+                "DEFAULT_FILE_STORAGE": (
+                    "django.core.files.storage.FileSystemStorage"
+                ),
+                "MEDIA_ROOT": media_root,
+            }
+        with override_settings(
+            AI_EMBEDDING_CLIENT="assetchat.benchmark.FakeEmbeddingClient",
+            AI_EMBEDDING_MODEL=BENCHMARK_EMBEDDING_MODEL,
+            AI_CHAT_MODEL="assetchat.benchmark.FakeChatModel",
+            AI_ANSWER_CACHE_ENABLED=False,
+            **storage_settings,
+        ):
+            # Drop the embeddings and stores made with the real client.
+            clients.reset()
+            try:
+                yield
+            finally:
+                clients.reset()
+
+
+def run_benchmark(
+    file_count: int = 20,
+    kinds: list[str] = None,
+    word_count: int = 500,
+    query_count: int = 50,
+    k: int = 4,
+    chunk_size: int = 1000,
+    overlap_size: int = 200,
+    seed: int = 0,
+    local_storage: bool = True,
+    keep: bool = False,
+) -> dict:
+    """Train on a synthetic AI folder and query it without calling OpenAI.
+
+    Embeddings and answers come from ``FakeEmbeddingClient`` and
+    ``FakeChatModel``. With ``local_storage`` the files are stored in a
+    temporary directory instead of the default storage. Everything the
+    benchmark created is deleted afterwards unless ``keep`` is set.
+
+    Training commits through connections of its own, so the benchmark
+    can't be rolled back and refuses to run unless
+    ``AI_BENCHMARK_ENABLED`` or ``TEST`` is set.
+    """
+    if not (settings.AI_BENCHMARK_ENABLED or settings.TEST):
+        raise ImproperlyConfigured(
+            "The benchmark writes to the database. Set AI_BENCHMARK_ENABLED "
+            "to run it against a dedicated benchmark database."
+        )
+    with offline_settings(local_storage):
+        folder, texts = create_benchmark_folder(
+            file_count, kinds or FILE_KINDS, word_count, seed
+        )
+        # Chat summaries are keyed on the UUID sessions of Chat.
+        session_id = str(uuid.uuid4())
+        try:
+            log.info("Training on benchmark folder %d.", folder.pk)
+            with SQLCounter().capture() as counter:
+                started_at = time.perf_counter()
+                summary = train_from_folder(
+                    folder, chunk_size, overlap_size, clear_existing=False
+                )
+                training_seconds = time.perf_counter() - started_at
+            rng = random.Random(seed)
+            queries = [
+                " ".join(rng.choice(texts).split()[:8])
+                for _ in range(query_count)
+            ]
+            vector_store = get_vector_store(get_collection_name(folder))
+            retrieval = {}
+            for mode in RETRIEVAL_CHOICES:
+                retriever = get_retriever(vector_store, mode, k)
+                latencies, statement_count = time_calls(
+                    partial(retriever.get_relevant_documents, query)
+                    for query in queries
+                )
+                retrieval[mode] = {
+                    **get_percentiles(latencies),
+                    "sql_statements": statement_count,
+                }
+            latencies, statement_count = time_calls(
+                partial(answer_question, query, folder, session_id, 0.0)
+                for query in queries
+            )
+            answers = {
+                **get_percentiles(latencies),
+                "sql_statements": statement_count,
+            }
+        finally:
+            if keep:
+                log.info("Kept benchmark folder %d.", folder.pk)
+            else:
+                delete_benchmark_folder(folder, session_id)
+    return {
+        "processed_files": summary["processed_files"],
+        "failed_files": summary["failed_files"],
+        "chunks": summary["chunks"],
+        "training_seconds": training_seconds,
+        "files_per_second": summary["processed_files"] / training_seconds,
+        "chunks_per_second": summary["chunks"] / training_seconds,
+        "training_sql_statements": counter.count,
+        "retrieval": retrieval,
+        "answers": answers,
+        "peak_rss": get_peak_rss(),
+    }
@@ -0,0 +1,134 @@
+import json
+import logging
+
+from assetchat.models import ChatSummary
+from django.conf import settings
+from django.db import connection
+from langchain.chains import LLMChain
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain.schema import (
+    BaseMessage,
+    SystemMessage,
+    get_buffer_string,
+    messages_from_dict,
+)
+
+log = logging.getLogger("assetchat.chat_memory")
+
+CHAT_HISTORY_TABLE = "langchain_chat_history"
+
+
+def get_messages_after(session_id: str, watermark: int):
+    """Messages of a chat stored after ``watermark``, as ``(id, message)``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT id, message FROM {CHAT_HISTORY_TABLE}
+            WHERE session_id = %s AND id > %s ORDER BY id""",
+            [str(session_id), watermark],
+        )
+        rows = cursor.fetchall()
+    messages = messages_from_dict([json.loads(row[1]) for row in rows])
+    return list(zip([row[0] for row in rows], messages))
+
+
+def get_history(session_id: str):
+    """Every message of a chat as ``(type, content)`` rows, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT message::json ->> 'type',
+            message::json -> 'data' ->> 'content'
+            FROM {CHAT_HISTORY_TABLE} WHERE session_id = %s ORDER BY id""",
+            [str(session_id)],
+        )
+        return cursor.fetchall()
+
+
+def get_history_page(session_id: str, before: int, limit: int):
+    """A page of a chat's messages, newest first.
+
+    Returns ``(id, type, content)`` rows for messages with an id lower than
+    ``before``, if given. Only the type and content are read out of the
+    stored JSON, by Postgres.
+    """
+    query = f"""SELECT id, message::json ->> 'type',
+    message::json -> 'data' ->> 'content'
+    FROM {CHAT_HISTORY_TABLE} WHERE session_id = %s"""
+    params = [str(session_id)]
+    if before is not None:
+        query += " AND id < %s"
+        params.append(before)
+    query += " ORDER BY id DESC LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+class RollingSummaryMemory:
+    """Conversation memory made of a stored summary and the latest messages.
+
+    Messages up to the summary's watermark are only read through the
+    summary. Once the messages after it go over
+    ``AI_CHAT_SUMMARY_TOKEN_LIMIT`` tokens, the oldest ones are folded into
+    the summary and the watermark moves past them, so every turn loads the
+    same bounded amount of history however long the chat gets.
+    """
+
+    def __init__(self, session_id: str, chat_history, llm):
+        self.session_id = session_id
+        self.chat_history = chat_history
+        self.llm = llm
+        self.chat_summary = ChatSummary.objects.filter(
+            session_id=session_id
+        ).first() or ChatSummary(session_id=session_id)
+        self.recent_messages = get_messages_after(
+            session_id, self.chat_summary.watermark
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.chat_summary.summary and not self.recent_messages
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        messages = [message for _, message in self.recent_messages]
+        if self.chat_summary.summary:
+            messages.insert(
+                0, SystemMessage(content=self.chat_summary.summary)
+            )
+        return messages
+
+    def save(self, question: str, answer: str):
+        self.chat_history.add_user_message(question)
+        self.chat_history.add_ai_message(answer)
+        self.recent_messages = get_messages_after(
+            self.session_id, self.chat_summary.watermark
+        )
+        self.compact()
+
+    def compact(self):
+        limit = settings.AI_CHAT_SUMMARY_TOKEN_LIMIT
+        pruned = []
+        recent_messages = list(self.recent_messages)
+        while (
+            recent_messages
+            and self.llm.get_num_tokens_from_messages(
+                [message for _, message in recent_messages]
+            )
+            > limit
+        ):
+            pruned.append(recent_messages.pop(0))
+        if not pruned:
+            return
+        self.chat_summary.summary = LLMChain(
+            llm=self.llm, prompt=SUMMARY_PROMPT
+        ).predict(
+            summary=self.chat_summary.summary,
+            new_lines=get_buffer_string([message for _, message in pruned]),
+        )
+        self.chat_summary.watermark = pruned[-1][0]
+        self.chat_summary.save()
+        self.recent_messages = recent_messages
+        log.debug(
+            "Summarized %d messages of chat %s.", len(pruned), self.session_id
+        )
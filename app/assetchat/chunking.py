@@ -0,0 +1,167 @@
+import datetime
+import logging
+from pathlib import Path
+from typing import Optional
+
+import tiktoken
+from assetchat.models import ChunkCache, FileContentHash
+from django.conf import settings
+from django.utils import timezone
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+log = logging.getLogger("assetchat.chunking")
+
+# Bump when the way documents are split changes, so chunks cached before
+# aren't reused.
+CHUNKER_VERSION = 1
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Average characters of English text per token, to turn the chunk sizes the
+# training API takes in characters into tokens.
+CHARACTERS_PER_TOKEN = 4
+
+# Metadata the loaders set to the path of the downloaded file, which is
+# different for every training run.
+PATH_KEYS = ("source", "file_path")
+
+
+def get_token_count(character_count: float) -> int:
+    return round(character_count / CHARACTERS_PER_TOKEN)
+
+
+def get_encoding_name(model: str = None) -> str:
+    try:
+        encoding = tiktoken.encoding_for_model(
+            model or settings.AI_EMBEDDING_MODEL
+        )
+    except KeyError:
+        return DEFAULT_ENCODING
+    return encoding.name
+
+
+def get_params_prefix(encoding_name: str = None) -> str:
+    # Chunks cached with another prefix are never used again.
+    return f"v{CHUNKER_VERSION}:{encoding_name or get_encoding_name()}:"
+
+
+class Chunker:
+    """Splits documents into chunks measured in tokens.
+
+    Chunk and overlap sizes are given in characters, like training always
+    took them, and turned into tokens of the ``AI_EMBEDDING_MODEL``
+    tokenizer. Chunks are capped at ``AI_EMBEDDING_MAX_TOKENS``. The chunks
+    of every file content are cached per set of parameters, so files that
+    were split before don't have to be loaded or split again.
+    """
+
+    def __init__(self, chunk_size: int, overlap_size: int):
+        self.encoding_name = get_encoding_name()
+        token_count = max(1, get_token_count(chunk_size))
+        self.chunk_size = min(token_count, settings.AI_EMBEDDING_MAX_TOKENS)
+        if self.chunk_size < token_count:
+            log.info(
+                "Chunk size %d is over the model's limit, using %d tokens.",
+                token_count,
+                self.chunk_size,
+            )
+        self.overlap_size = min(
+            get_token_count(overlap_size), self.chunk_size - 1
+        )
+        self.splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=self.encoding_name,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.overlap_size,
+            # Uploaded documents are text, not prompts.
+            disallowed_special=(),
+        )
+        self.params = (
+            f"{get_params_prefix(self.encoding_name)}"
+            f"{self.chunk_size}:{self.overlap_size}"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def split(self, documents: list[Document]) -> list[Document]:
+        return self.splitter.split_documents(documents)
+
+    @staticmethod
+    def get_content_hash(folderr_file) -> Optional[str]:
+        """Hash of the file's content, if it wasn't saved since hashing."""
+        try:
+            content_hash = folderr_file.ai_content_hash
+        except FileContentHash.DoesNotExist:
+            return None
+        if (
+            content_hash.file_name != folderr_file.file.name
+            or content_hash.file_updated != folderr_file.updated
+        ):
+            return None
+        return content_hash.content_hash
+
+    @staticmethod
+    def set_content_hash(folderr_file, content_hash: str):
+        FileContentHash.objects.update_or_create(
+            file=folderr_file,
+            defaults={
+                "content_hash": content_hash,
+                "file_name": folderr_file.file.name,
+                "file_updated": folderr_file.updated,
+            },
+        )
+
+    def get(self, content_hash: str, file_path: Path) -> Optional[list]:
+        """Cached chunks of a content, with paths set to ``file_path``."""
+        row = (
+            ChunkCache.objects.filter(
+                content_hash=content_hash, params=self.params
+            )
+            .values_list("pk", "chunks", "last_used_at")
+            .first()
+        )
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        pk, cached_chunks, last_used_at = row
+        now = timezone.now()
+        if last_used_at < now - datetime.timedelta(days=1):
+            ChunkCache.objects.filter(pk=pk).update(last_used_at=now)
+        return [
+            Document(
+                page_content=page_content,
+                metadata=dict(
+                    metadata, **{key: str(file_path) for key in path_keys}
+                ),
+            )
+            for page_content, metadata, path_keys in cached_chunks
+        ]
+
+    def set(self, content_hash: str, chunks: list[Document], file_path: Path):
+        cached_chunks = []
+        for chunk in chunks:
+            metadata = dict(chunk.metadata)
+            path_keys = [
+                key for key in PATH_KEYS if metadata.get(key) == str(file_path)
+            ]
+            for key in path_keys:
+                del metadata[key]
+            cached_chunks.append([chunk.page_content, metadata, path_keys])
+        ChunkCache.objects.bulk_create(
+            [
+                ChunkCache(
+                    content_hash=content_hash,
+                    params=self.params,
+                    chunks=cached_chunks,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+    @property
+    def counters(self) -> dict:
+        return {
+            "chunk_cache_hits": self.hits,
+            "chunk_cache_misses": self.misses,
+        }
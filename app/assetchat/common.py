@@ -1,15 +1,190 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import sqlalchemy
+from assetchat.embeddings import AdaptiveBatchEmbeddings, EmbeddingCacheStore
+from assetchat.vector_index import APPROXIMATE_SEARCH, search
 from django.conf import settings
+from django.utils.module_loading import import_string
 from django.utils.text import slugify
-from langchain.embeddings import OpenAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.memory import SQLChatMessageHistory
+from langchain.memory.chat_message_histories.sql import create_message_model
+from langchain.schema import Document
 from langchain.vectorstores import PGVector
+from langchain.vectorstores.pgvector import Base
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.schema import CreateTable
 
+log = logging.getLogger("assetchat.common")
 
-def get_vector_store(collection_name: str):
-    embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_SECRET_KEY)
-    return PGVector.from_existing_index(
-        embeddings,
-        collection_name=collection_name,
+
+def get_embeddings():
+    """Embeddings that only call the provider for chunks that aren't cached.
+
+    Uncached chunks are sent in concurrent, adaptively sized batches by the
+    client configured in ``AI_EMBEDDING_CLIENT``.
+    """
+    client_class = import_string(settings.AI_EMBEDDING_CLIENT)
+    return CacheBackedEmbeddings(
+        AdaptiveBatchEmbeddings(client_class()),
+        EmbeddingCacheStore(settings.AI_EMBEDDING_MODEL),
+    )
+
+
+class ClientRegistry:
+    """Clients shared by everything that runs in a process.
+
+    Holds one pooled SQLAlchemy engine, the embeddings used to answer
+    questions and a vector store per collection, so that connection setup
+    and the schema checks langchain runs on every new store happen once per
+    process instead of once per question. Only the
+    ``AI_VECTOR_STORE_CACHE_SIZE`` most recently used stores are kept.
+    Everything is dropped in a forked child because connections can't be
+    shared across processes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.engine = None
+        self.embeddings = None
+        self.vector_stores = OrderedDict()
+        self.schema_ready = False
+        self.message_models = {}
+
+    def after_fork(self):
+        if self.engine is not None:
+            # Leave the parent's connections open for the parent to use.
+            self.engine.dispose(close=False)
+        self.reset()
+
+    def get_engine(self) -> sqlalchemy.engine.Engine:
+        with self.lock:
+            if self.engine is None:
+                log.debug(
+                    "Creating SQLAlchemy engine for process %d.", os.getpid()
+                )
+                self.engine = sqlalchemy.create_engine(
+                    POSTGRES_CONNECTION_STRING,
+                    pool_size=settings.AI_DB_POOL_SIZE,
+                    max_overflow=settings.AI_DB_MAX_OVERFLOW,
+                    pool_recycle=settings.AI_DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                )
+            return self.engine
+
+    def get_embeddings(self):
+        with self.lock:
+            if self.embeddings is None:
+                self.embeddings = get_embeddings()
+            return self.embeddings
+
+    def get_vector_store(self, collection_name: str):
+        with self.lock:
+            vector_store = self.vector_stores.get(collection_name)
+            if vector_store is not None:
+                self.vector_stores.move_to_end(collection_name)
+                return vector_store
+        # Created outside the lock, which getting the engine and embeddings
+        # takes as well.
+        vector_store = PooledPGVector(
+            connection_string=POSTGRES_CONNECTION_STRING,
+            embedding_function=self.get_embeddings(),
+            collection_name=collection_name,
+        )
+        with self.lock:
+            # Another thread may have added a store for the collection.
+            vector_store = self.vector_stores.setdefault(
+                collection_name, vector_store
+            )
+            self.vector_stores.move_to_end(collection_name)
+            while (
+                len(self.vector_stores) > settings.AI_VECTOR_STORE_CACHE_SIZE
+            ):
+                self.vector_stores.popitem(last=False)
+        return vector_store
+
+
+clients = ClientRegistry()
+os.register_at_fork(after_in_child=clients.after_fork)
+
+
+class PooledPGVector(PGVector):
+    """PGVector that runs its sessions on the process' pooled engine.
+
+    Sessions check a connection out of the pool and return it when they
+    close, instead of holding one connection for the life of the store.
+    """
+
+    def connect(self) -> sqlalchemy.engine.Engine:
+        return clients.get_engine()
+
+    def create_vector_extension(self) -> None:
+        if not clients.schema_ready:
+            super().create_vector_extension()
+
+    def create_tables_if_not_exists(self) -> None:
+        if not clients.schema_ready:
+            super().create_tables_if_not_exists()
+            clients.schema_ready = True
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: list[float], k: int = 4, filter: dict = None
+    ) -> list[tuple[Document, float]]:
+        # langchain orders by the raw column, which the ANN index can't
+        # serve, so approximate search runs its own query.
+        if settings.AI_VECTOR_SEARCH != APPROXIMATE_SEARCH or filter:
+            return super().similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter
+            )
+        with self._conn.begin() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                rows = search(
+                    cursor, embedding, self.collection_name, k, exact=False
+                )
+            finally:
+                cursor.close()
+        return [
+            (Document(page_content=document, metadata=metadata), distance)
+            for document, metadata, distance in rows
+        ]
+
+
+class PooledSQLChatMessageHistory(SQLChatMessageHistory):
+    """SQLChatMessageHistory that uses the process' pooled engine."""
+
+    def __init__(self, session_id: str, table_name: str):
+        self.table_name = table_name
+        self.connection_string = POSTGRES_CONNECTION_STRING
+        self.session_id = session_id
+        self.engine = clients.get_engine()
+        self.Session = sessionmaker(self.engine)
+        self.Message = clients.message_models.get(table_name)
+        if self.Message is None:
+            self._create_table_if_not_exists()
+            clients.message_models[table_name] = self.Message
+
+
+def get_vector_store(collection_name: str, embeddings=None):
+    """Vector store for a collection.
+
+    Without ``embeddings`` the store is shared by the whole process. Pass
+    ``embeddings`` to get a store of your own, e.g. to read the embedding
+    counters of a single training run.
+    """
+    if embeddings is None:
+        return clients.get_vector_store(collection_name)
+    return PooledPGVector(
         connection_string=POSTGRES_CONNECTION_STRING,
+        embedding_function=embeddings,
+        collection_name=collection_name,
     )
 
 
@@ -29,3 +204,40 @@ def get_collection_id(collection_name, cursor):
     if row is not None:
         if len(row) > 0:
             return row[0]
+
+
+# Lets the vectors of a file be found without scanning the collection.
+FILE_ID_INDEX_SQL = """CREATE INDEX CONCURRENTLY IF NOT EXISTS
+langchain_pg_embedding_file_id_idx
+ON langchain_pg_embedding (collection_id, (cmetadata ->> 'file_id'))"""
+
+
+def get_session_index_sql(table_name: str) -> str:
+    # Chat history is read a session at a time, in id order.
+    return f"""CREATE INDEX CONCURRENTLY IF NOT EXISTS
+    {table_name}_session_id_idx ON {table_name} (session_id, id)"""
+
+
+def create_tables(cursor, metadata):
+    dialect = postgresql.dialect()
+    for table in metadata.sorted_tables:
+        statement = CreateTable(table, if_not_exists=True)
+        cursor.execute(str(statement.compile(dialect=dialect)))
+
+
+def create_vector_tables(cursor):
+    """Create langchain's vector store tables if they don't exist yet.
+
+    langchain creates them on first use, which on a new database is after
+    the migrations that index them ran.
+    """
+    # Importing the models registers their tables.
+    import langchain.vectorstores._pgvector_data_models  # noqa: F401
+
+    create_tables(cursor, Base.metadata)
+
+
+def create_chat_history_table(cursor, table_name: str):
+    # Like the vector store tables, langchain creates it on first use.
+    Message = create_message_model(table_name, declarative_base())
+    create_tables(cursor, Message.metadata)
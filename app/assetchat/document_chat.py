@@ -1,69 +1,174 @@
+import logging
+import threading
+import time
+
+from assetchat.answer_cache import AnswerCache
+from assetchat.chat_memory import RollingSummaryMemory
 from assetchat.common import (
-    POSTGRES_CONNECTION_STRING,
+    PooledSQLChatMessageHistory,
     get_collection_name,
     get_vector_store,
 )
+from assetchat.hybrid_search import get_retriever
 from assetchat.models import Prompt
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
 from langchain import PromptTemplate
 from langchain.chains import ConversationalRetrievalChain
-from langchain.chat_models import ChatOpenAI
-from langchain.memory import (
-    ConversationSummaryBufferMemory,
-    SQLChatMessageHistory,
-)
+
+log = logging.getLogger("assetchat.document_chat")
+
+PROMPT_VERSION_KEY = "assetchat:prompt_version"
+
+
+class PromptCache:
+    """Default prompt templates, compiled once per process.
+
+    Editing a prompt bumps a version stored in the shared cache. Each
+    process compares it with the version of its templates at most every
+    ``AI_PROMPT_CACHE_CHECK_INTERVAL`` seconds and recompiles them when it
+    changed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.templates = {}
+        self.version = None
+        self.checked_at = None
+
+    def clear(self):
+        with self.lock:
+            self.templates = {}
+            self.checked_at = None
+
+    def check_version(self):
+        now = time.monotonic()
+        if (
+            self.checked_at is not None
+            and now - self.checked_at < settings.AI_PROMPT_CACHE_CHECK_INTERVAL
+        ):
+            return
+        try:
+            version = cache.get(PROMPT_VERSION_KEY, 0)
+        except Exception:
+            # Keep the compiled templates until the cache is back.
+            log.warning("Couldn't check the prompt version.", exc_info=True)
+            version = self.version
+        if version != self.version:
+            self.templates = {}
+            self.version = version
+        self.checked_at = now
+
+    def get(self, prompt_type: int, input_variables: list[str]):
+        with self.lock:
+            self.check_version()
+            template = self.templates.get(prompt_type)
+            if template is None:
+                prompt_text = Prompt.objects.get(
+                    prompt_type=prompt_type, default=True
+                )
+                template = PromptTemplate(
+                    template=prompt_text.content,
+                    input_variables=input_variables,
+                )
+                self.templates[prompt_type] = template
+            return template
+
+
+prompt_cache = PromptCache()
+
+
+def bump_prompt_version():
+    # The prompt is already saved, so a cache outage only delays other
+    # processes picking it up.
+    try:
+        cache.add(PROMPT_VERSION_KEY, 0, timeout=None)
+        cache.incr(PROMPT_VERSION_KEY)
+    except Exception:
+        log.warning("Couldn't bump the prompt version.", exc_info=True)
+    prompt_cache.clear()
 
 
 def get_question_generator_template():
-    prompt_text = Prompt.objects.get(
-        prompt_type=Prompt.QUESTION_GENERATOR, default=True
-    )
-    return PromptTemplate(
-        template=prompt_text.content,
-        input_variables=["question", "chat_history"],
+    return prompt_cache.get(
+        Prompt.QUESTION_GENERATOR, ["question", "chat_history"]
     )
 
 
 def get_question_answering_template():
-    prompt_text = Prompt.objects.get(
-        prompt_type=Prompt.QUESTION_ANSWERING, default=True
-    )
-    return PromptTemplate(
-        template=prompt_text.content, input_variables=["context", "question"]
-    )
+    return prompt_cache.get(Prompt.QUESTION_ANSWERING, ["context", "question"])
 
 
 def get_chat_history(session_id):
-    return SQLChatMessageHistory(
-        connection_string=POSTGRES_CONNECTION_STRING,
-        session_id=session_id,
-        table_name="langchain_chat_history",
+    return PooledSQLChatMessageHistory(
+        session_id=session_id, table_name="langchain_chat_history"
     )
 
 
-def answer_question(question, folder, session_id, temperature: float):
-    vector_store = get_vector_store(get_collection_name(folder))
-    llm = ChatOpenAI(
+def get_chat_model(temperature: float, **kwargs):
+    chat_model_class = import_string(settings.AI_CHAT_MODEL)
+    return chat_model_class(
         temperature=temperature,
         openai_api_key=settings.OPENAI_SECRET_KEY,
+        **kwargs,
+    )
+
+
+def answer_question(
+    question,
+    folder,
+    session_id,
+    temperature: float,
+    callbacks=None,
+    retrieval: str = None,
+):
+    """Answer a question about a folder's documents.
+
+    ``retrieval`` picks how the context is found, ``"vector"`` or
+    ``"hybrid"``, and defaults to ``AI_RETRIEVAL``.
+
+    When ``callbacks`` are given, the answer is streamed to them token by
+    token. The standalone question and the history summary are generated by
+    a separate model that doesn't stream, so only answer tokens reach them.
+    """
+    collection_name = get_collection_name(folder)
+    vector_store = get_vector_store(collection_name)
+    llm = get_chat_model(temperature)
+    question_llm = llm
+    if callbacks:
+        llm = get_chat_model(temperature, streaming=True, callbacks=callbacks)
+    memory = RollingSummaryMemory(
+        session_id, get_chat_history(session_id), question_llm
     )
-    chat_history = get_chat_history(session_id)
+    answer_cache = None
+    # Follow up questions depend on the conversation, and answers sampled
+    # at a temperature are meant to vary, so neither uses the cache.
+    if (
+        settings.AI_ANSWER_CACHE_ENABLED
+        and memory.is_empty
+        and not temperature
+    ):
+        answer_cache = AnswerCache(folder, vector_store.embedding_function)
+        answer = answer_cache.lookup(question)
+        if answer is not None:
+            for callback in callbacks or []:
+                callback.on_llm_new_token(answer)
+            memory.save(question, answer)
+            return {"question": question, "answer": answer}
     qa = ConversationalRetrievalChain.from_llm(
         llm,
-        vector_store.as_retriever(),
-        memory=ConversationSummaryBufferMemory(
-            memory_key="chat_history",
-            llm=llm,
-            chat_memory=chat_history,
-            return_messages=True,
-        ),
+        get_retriever(vector_store, retrieval),
+        condense_question_llm=question_llm,
         condense_question_prompt=get_question_generator_template(),
         combine_docs_chain_kwargs={
             "prompt": get_question_answering_template()
         },
+        return_generated_question=True,
     )
-    result = qa({"question": question, "chat_history": chat_history.messages})
+    result = qa({"question": question, "chat_history": memory.messages})
     answer = result["answer"]
-    chat_history.add_user_message(question)
-    chat_history.add_ai_message(answer)
+    memory.save(question, answer)
+    if answer_cache is not None:
+        answer_cache.store(question, answer)
     return result
@@ -0,0 +1,183 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+import fitz
+from billiard.pool import Pool
+from django.conf import settings
+from langchain.document_loaders import PyMuPDFLoader
+from langchain.document_loaders import TextLoader as LangChainTextLoader
+from langchain.document_loaders import (
+    UnstructuredFileLoader,
+    UnstructuredImageLoader,
+    UnstructuredWordDocumentLoader,
+)
+from langchain.schema import Document
+
+log = logging.getLogger("assetchat.document_loading")
+
+DocumentList = list[Document]
+PageRange = Optional[tuple[int, int]]
+
+ImageLoader = UnstructuredImageLoader
+MicrosoftWordLoader = UnstructuredWordDocumentLoader
+PDFLoader = PyMuPDFLoader
+TextLoader = LangChainTextLoader
+UnknownFileLoader = UnstructuredFileLoader
+
+
+mime_loader_map = {
+    "plaintext": TextLoader,
+    "microsoft_word": MicrosoftWordLoader,
+    "pdf": PDFLoader,
+    "image": ImageLoader,
+    "unknown": UnknownFileLoader,
+}
+
+
+def get_mime_category(mime_type: str) -> str:
+    if mime_type in [
+        "application/msword",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ]:
+        return "microsoft_word"
+    elif mime_type == "application/pdf":
+        return "pdf"
+    elif mime_type == "text/plain":
+        return "plaintext"
+    elif mime_type.find("image") != -1:
+        return "image"
+    return "unknown"
+
+
+def load_pdf_pages(file_path: str, first_page: int, last_page: int):
+    # Same documents PyMuPDFLoader builds, limited to a range of pages.
+    with fitz.open(file_path) as doc:
+        doc_metadata = {
+            k: doc.metadata[k]
+            for k in doc.metadata
+            if type(doc.metadata[k]) in [str, int]
+        }
+        return [
+            Document(
+                page_content=doc[page_number].get_text(),
+                metadata=dict(
+                    {
+                        "source": file_path,
+                        "file_path": file_path,
+                        "page": page_number,
+                        "total_pages": len(doc),
+                    },
+                    **doc_metadata,
+                ),
+            )
+            for page_number in range(first_page, last_page)
+        ]
+
+
+def load_file_part(
+    file_path: str, file_type: str, page_range: PageRange = None
+) -> DocumentList:
+    log.info("Loading %s file at path %s.", file_type, file_path)
+    if page_range is not None:
+        return load_pdf_pages(file_path, *page_range)
+    loader_class = mime_loader_map[file_type]
+    loader = loader_class(file_path)
+    return loader.load()
+
+
+def get_file_parts(file_path: Path, file_type: str) -> list[PageRange]:
+    if file_type != "pdf":
+        return [None]
+    pages_per_part = settings.AI_LOADER_PDF_PAGES_PER_PART
+    with fitz.open(str(file_path)) as doc:
+        page_count = len(doc)
+    if page_count <= pages_per_part:
+        return [None]
+    return [
+        (first_page, min(first_page + pages_per_part, page_count))
+        for first_page in range(0, page_count, pages_per_part)
+    ]
+
+
+class DocumentLoader:
+    """Loads downloaded files into documents.
+
+    With more than one process, every file (or range of pages for large
+    PDFs) is loaded by a worker in a billiard pool so CPU bound loaders run
+    in parallel, and a worker that takes longer than the timeout is killed.
+    Billiard is used instead of multiprocessing because Celery's prefork
+    workers are daemonic and can't start multiprocessing children.
+    """
+
+    def __init__(self, processes: int = None, timeout: int = None):
+        self.processes = processes or settings.AI_LOADER_PROCESSES
+        self.timeout = timeout or settings.AI_LOADER_TIMEOUT
+        self.pool = None
+
+    @property
+    def batch_size(self):
+        return max(self.processes, 1)
+
+    def __enter__(self):
+        if self.processes > 1:
+            self.pool = Pool(
+                processes=self.processes,
+                timeout=self.timeout,
+                maxtasksperchild=settings.AI_LOADER_MAX_TASKS_PER_CHILD,
+            )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool is not None:
+            if exc_type is None:
+                self.pool.close()
+            else:
+                self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def _submit(self, file_path: Path, file_type: str, page_range):
+        args = (str(file_path), file_type, page_range)
+        if self.pool is None:
+            return load_file_part(*args)
+        return self.pool.apply_async(load_file_part, args)
+
+    @staticmethod
+    def _result(part):
+        if isinstance(part, list):
+            return part
+        return part.get()
+
+    def load_many(self, paths: dict, mime_types: dict):
+        """Load every file in ``paths``, a map of keys to file paths.
+
+        ``mime_types`` maps the same keys to the files' MIME types, which
+        pick the loader.
+
+        Yields ``(key, documents, error)`` in the order of ``paths``, with
+        either the documents or the exception that stopped the file from
+        loading.
+        """
+        submitted = {}
+        for key, file_path in paths.items():
+            try:
+                file_type = get_mime_category(mime_types[key])
+                submitted[key] = [
+                    self._submit(file_path, file_type, page_range)
+                    for page_range in get_file_parts(file_path, file_type)
+                ]
+            except Exception as e:
+                submitted[key] = e
+        for key, parts in submitted.items():
+            if isinstance(parts, Exception):
+                yield key, [], parts
+                continue
+            documents = []
+            try:
+                for part in parts:
+                    documents += self._result(part)
+            except Exception as e:
+                yield key, [], e
+                continue
+            yield key, documents, None
@@ -0,0 +1,336 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, Iterator, Optional, Protocol, Sequence
+
+import aiohttp
+import openai
+from assetchat.models import EmbeddingCache
+from django.conf import settings
+from django.utils import timezone
+from langchain.embeddings.base import Embeddings
+from langchain.schema import BaseStore
+
+log = logging.getLogger("assetchat.embeddings")
+
+Vector = list[float]
+
+# Maximum number of hashes sent in a single IN clause.
+LOOKUP_BATCH_SIZE = 1000
+
+# Seconds an idle embedding worker waits before checking for work again.
+IDLE_INTERVAL = 0.05
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStore(BaseStore[str, Vector]):
+    """Document embeddings stored in Postgres.
+
+    Keys are chunk texts, stored as their SHA-256 hash together with the
+    embedding model so every collection shares the same cache. Lookups are
+    counted in ``hits`` and ``misses``.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+
+    def mget(self, keys: Sequence[str]) -> list[Optional[Vector]]:
+        hashes = [hash_text(key) for key in keys]
+        unique_hashes = list(set(hashes))
+        cached = {}
+        now = timezone.now()
+        for i in range(0, len(unique_hashes), LOOKUP_BATCH_SIZE):
+            rows = EmbeddingCache.objects.filter(
+                model=self.model,
+                content_hash__in=unique_hashes[i : i + LOOKUP_BATCH_SIZE],
+            )
+            cached.update(rows.values_list("content_hash", "embedding"))
+            # Hits are recorded once a day at most, so reads rarely write.
+            rows.filter(
+                last_used_at__lt=now - datetime.timedelta(days=1)
+            ).update(last_used_at=now)
+        vectors = []
+        for content_hash in hashes:
+            embedding = cached.get(content_hash)
+            if embedding is None:
+                self.misses += 1
+                vectors.append(None)
+            else:
+                self.hits += 1
+                vectors.append(embedding.tolist())
+        log.debug(
+            "Embedding cache lookup: %d hits, %d misses so far.",
+            self.hits,
+            self.misses,
+        )
+        return vectors
+
+    def mset(self, key_value_pairs: Sequence[tuple[str, Vector]]) -> None:
+        EmbeddingCache.objects.bulk_create(
+            [
+                EmbeddingCache(
+                    content_hash=hash_text(key),
+                    model=self.model,
+                    embedding=value,
+                )
+                for key, value in key_value_pairs
+            ],
+            batch_size=LOOKUP_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        EmbeddingCache.objects.filter(
+            model=self.model,
+            content_hash__in=[hash_text(key) for key in keys],
+        ).delete()
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        # Only hashes are stored, so those are what's yielded.
+        queryset = EmbeddingCache.objects.filter(model=self.model)
+        if prefix is not None:
+            queryset = queryset.filter(content_hash__startswith=prefix)
+        yield from queryset.values_list("content_hash", flat=True).iterator()
+
+    @property
+    def counters(self) -> dict:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+
+class RateLimited(Exception):
+    """Raised by embedding clients when the provider responds with a 429."""
+
+
+class EmbeddingClient(Protocol):
+    def session(self) -> AsyncContextManager:
+        ...
+
+    async def embed(self, texts: list[str]) -> list[Vector]:
+        ...
+
+    def embed_sync(self, texts: list[str]) -> list[Vector]:
+        ...
+
+
+class OpenAIEmbeddingClient:
+    def __init__(self, model: str = None, api_key: str = None):
+        self.model = model or settings.AI_EMBEDDING_MODEL
+        self.api_key = api_key or settings.OPENAI_SECRET_KEY
+
+    @asynccontextmanager
+    async def session(self):
+        # Without a session openai opens a new one for every request.
+        async with aiohttp.ClientSession() as session:
+            token = openai.aiosession.set(session)
+            try:
+                yield session
+            finally:
+                openai.aiosession.reset(token)
+
+    def _prepare(self, texts: list[str]) -> list[str]:
+        if self.model.endswith("001"):
+            # Same preprocessing OpenAIEmbeddings applies to older models.
+            return [text.replace("\n", " ") for text in texts]
+        return texts
+
+    @staticmethod
+    def _parse(response) -> list[Vector]:
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def embed(self, texts: list[str]) -> list[Vector]:
+        try:
+            response = await openai.Embedding.acreate(
+                input=self._prepare(texts),
+                model=self.model,
+                api_key=self.api_key,
+            )
+        except openai.error.RateLimitError as e:
+            raise RateLimited(str(e)) from e
+        return self._parse(response)
+
+    def embed_sync(self, texts: list[str]) -> list[Vector]:
+        # openai keeps a requests session per thread for blocking calls.
+        try:
+            response = openai.Embedding.create(
+                input=self._prepare(texts),
+                model=self.model,
+                api_key=self.api_key,
+            )
+        except openai.error.RateLimitError as e:
+            raise RateLimited(str(e)) from e
+        return self._parse(response)
+
+
+class EmbeddingRun:
+    """Tracks which texts of one embed_documents call are left to embed."""
+
+    def __init__(self, texts: list[str]):
+        self.texts = texts
+        self.vectors: list[Optional[Vector]] = [None] * len(texts)
+        self.cursor = 0
+        self.retries = deque()
+        self.attempts = {}
+        self.in_flight = 0
+
+    @property
+    def done(self):
+        return (
+            not self.retries
+            and self.in_flight == 0
+            and self.cursor >= len(self.texts)
+        )
+
+    def next_batch(self, batch_size: int) -> Optional[tuple[int, int]]:
+        if self.retries:
+            return self.retries.popleft()
+        if self.cursor >= len(self.texts):
+            return None
+        start = self.cursor
+        self.cursor = min(start + batch_size, len(self.texts))
+        return start, self.cursor
+
+
+class AdaptiveBatchEmbeddings(Embeddings):
+    """Embeds documents in concurrent batches sized from provider feedback.
+
+    Batches are sent by up to ``concurrency`` asyncio workers. A 429 halves
+    both the batch size and the concurrency and backs off exponentially.
+    Responses slower than ``target_latency`` seconds shrink the batch size,
+    while fast responses grow it and add a worker, up to the maximums.
+    """
+
+    def __init__(
+        self,
+        client: EmbeddingClient = None,
+        batch_size: int = None,
+        max_batch_size: int = None,
+        concurrency: int = None,
+        max_concurrency: int = None,
+        target_latency: float = None,
+        max_retries: int = None,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.client = client or OpenAIEmbeddingClient()
+        self.batch_size = batch_size or settings.AI_EMBEDDING_BATCH_SIZE
+        self.max_batch_size = (
+            max_batch_size or settings.AI_EMBEDDING_MAX_BATCH_SIZE
+        )
+        self.concurrency = concurrency or settings.AI_EMBEDDING_CONCURRENCY
+        self.max_concurrency = (
+            max_concurrency or settings.AI_EMBEDDING_MAX_CONCURRENCY
+        )
+        self.target_latency = (
+            target_latency or settings.AI_EMBEDDING_TARGET_LATENCY
+        )
+        self.max_retries = max_retries or settings.AI_EMBEDDING_MAX_RETRIES
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.embedded_count = 0
+        self.elapsed = 0.0
+        self.rate_limited_count = 0
+
+    @property
+    def throughput(self) -> float:
+        if self.elapsed == 0:
+            return 0.0
+        return self.embedded_count / self.elapsed
+
+    def _on_success(self, latency: float):
+        self.backoff = self.min_backoff
+        if latency > self.target_latency:
+            self.batch_size = max(1, int(self.batch_size * 0.75))
+        elif latency < self.target_latency / 2:
+            self.batch_size = min(
+                self.max_batch_size,
+                max(self.batch_size + 1, int(self.batch_size * 1.5)),
+            )
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def _on_rate_limited(self):
+        self.rate_limited_count += 1
+        self.batch_size = max(1, self.batch_size // 2)
+        self.concurrency = max(1, self.concurrency // 2)
+        self.backoff = min(self.max_backoff, self.backoff * 2)
+        log.info(
+            "Embedding requests rate limited. Batch size: %d, "
+            "concurrency: %d, backing off for %.1fs.",
+            self.batch_size,
+            self.concurrency,
+            self.backoff,
+        )
+
+    async def _worker(self, run: EmbeddingRun, index: int):
+        while not run.done:
+            batch = None
+            # Workers above the current concurrency stay idle until it grows.
+            if index < self.concurrency:
+                batch = run.next_batch(self.batch_size)
+            if batch is None:
+                await asyncio.sleep(IDLE_INTERVAL)
+                continue
+            start, end = batch
+            run.in_flight += 1
+            started_at = time.monotonic()
+            try:
+                vectors = await self.client.embed(run.texts[start:end])
+            except RateLimited:
+                run.attempts[batch] = run.attempts.get(batch, 0) + 1
+                if run.attempts[batch] > self.max_retries:
+                    raise
+                run.retries.append(batch)
+                self._on_rate_limited()
+                await asyncio.sleep(self.backoff)
+                continue
+            finally:
+                run.in_flight -= 1
+            run.vectors[start:end] = vectors
+            self._on_success(time.monotonic() - started_at)
+
+    async def aembed_documents(self, texts: list[str]) -> list[Vector]:
+        run = EmbeddingRun(texts)
+        started_at = time.monotonic()
+        async with self.client.session():
+            workers = [
+                asyncio.ensure_future(self._worker(run, index))
+                for index in range(max(self.concurrency, self.max_concurrency))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for worker in workers:
+                    worker.cancel()
+                raise
+        self.embedded_count += len(texts)
+        self.elapsed += time.monotonic() - started_at
+        return run.vectors
+
+    async def aembed_query(self, text: str) -> Vector:
+        async with self.client.session():
+            vectors = await self.client.embed([text])
+        return vectors[0]
+
+    def embed_documents(self, texts: list[str]) -> list[Vector]:
+        return asyncio.run(self.aembed_documents(texts))
+
+    def embed_query(self, text: str) -> Vector:
+        return self.client.embed_sync([text])[0]
+
+    @property
+    def counters(self) -> dict:
+        return {
+            "embedded_chunks": self.embedded_count,
+            "embedding_seconds": round(self.elapsed, 3),
+            "rate_limited_requests": self.rate_limited_count,
+        }
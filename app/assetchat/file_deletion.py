@@ -1,83 +1,197 @@
 import logging
-from pathlib import Path
+from typing import Optional
 from uuid import UUID
 
+from assetchat.answer_cache import bump_collection_version
 from assetchat.common import get_collection_id, get_collection_name
 from assetchat.models import VectorToDelete
-from django.db import connection
-from filemanager.models import Folder
+from django.db import connection, transaction
+from filemanager.models import File, Folder
 
 log = logging.getLogger("assetchat.file_deletion")
 
+# Maximum number of vector ids deleted by a single statement.
+PURGE_BATCH_SIZE = 1000
 
-def get_stale_vector(folder: Folder, target_file_name: str) -> dict | None:
+
+def get_file_vectors(
+    folder: Folder, file_id: int, file_name: str
+) -> Optional[dict]:
+    """Find every vector ingested from a file.
+
+    Vectors are looked up by the ``file_id`` stored in their metadata. Files
+    ingested before the id was stored are matched on their source file name.
+    """
     collection_name = get_collection_name(folder)
     with connection.cursor() as cursor:
         collection_id = get_collection_id(collection_name, cursor)
-        if collection_id is not None:
-            log.debug("Got collection id %s", collection_id)
+        if collection_id is None:
+            log.debug("Collection id was None.")
+            return None
+        log.debug("Got collection id %s", collection_id)
+        cursor.execute(
+            """SELECT uuid FROM langchain_pg_embedding WHERE collection_id = %s
+            AND cmetadata ->> 'file_id' = %s""",
+            [str(collection_id), str(file_id)],
+        )
+        vector_ids = [row[0] for row in cursor.fetchall()]
+        if not vector_ids:
+            # The base name is compared exactly, since a LIKE pattern would
+            # treat "_" and "%" in file names as wildcards.
+            cursor.execute(
+                """SELECT uuid FROM langchain_pg_embedding
+                WHERE collection_id = %s AND cmetadata ->> 'file_id' IS NULL
+                AND regexp_replace(cmetadata ->> 'source', '^.*/', '') = %s""",
+                [str(collection_id), file_name],
+            )
+            vector_ids = [row[0] for row in cursor.fetchall()]
+    log.debug("Found %d vectors for file %d.", len(vector_ids), file_id)
+    return {"vector_ids": vector_ids, "collection_id": collection_id}
+
+
+def purge_stale_vectors(collection_id) -> int:
+    """Delete the vectors queued for deletion in a collection.
+
+    Vectors are deleted in batches inside a single transaction. Queued rows
+    are locked with SKIP LOCKED so a training run and the background purge
+    never try to delete the same vectors.
+    """
+    deleted_count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        vector_ids = list(
+            VectorToDelete.objects.select_for_update(skip_locked=True)
+            .filter(collection_id=collection_id)
+            .values_list("id", flat=True)
+        )
+        log.info("%d vectors queued for deletion.", len(vector_ids))
+        for i in range(0, len(vector_ids), PURGE_BATCH_SIZE):
+            batch = vector_ids[i : i + PURGE_BATCH_SIZE]
             cursor.execute(
-                """SELECT uuid, cmetadata -> 'source' AS "source_doc" FROM
-            langchain_pg_embedding WHERE collection_id = %s""",
+                """DELETE FROM langchain_pg_embedding WHERE collection_id = %s
+                AND uuid = ANY(%s::uuid[])""",
+                [str(collection_id), [str(vector_id) for vector_id in batch]],
+            )
+            deleted_count += cursor.rowcount
+            VectorToDelete.objects.filter(id__in=batch).delete()
+        if deleted_count > 0:
+            cursor.execute(
+                "SELECT name FROM langchain_pg_collection WHERE uuid = %s",
                 [str(collection_id)],
             )
-            rows = cursor.fetchall()
-            log.debug("Selected %d rows", len(rows))
-            for row in rows:
-                log.debug("Working with row %s", row)
-                vector_id, source_document = row
-                log.debug(
-                    "Vector id: %s\nsource doc: %s", vector_id, source_document
-                )
-                file_name = Path(source_document).name
-                log.debug("File name: %s", file_name)
-                if file_name == target_file_name:
-                    return {
-                        "vector_id": vector_id,
-                        "collection_id": collection_id,
-                    }
-                else:
-                    log.debug(
-                        "%s is not equal to %s", file_name, target_file_name
-                    )
+            row = cursor.fetchone()
+            if row is not None:
+                bump_collection_version(row[0])
+    log.info(
+        "Deleted %d vectors from collection %s.", deleted_count, collection_id
+    )
+    return deleted_count
+
+
+def get_collection_folders() -> dict:
+    """Map every AI folder's collection name to the folder's id.
+
+    Names shared by several folders, like those of two assets with the same
+    title, map to None since their vectors can't be told apart.
+    """
+    ai_folders = Folder.objects.filter(
+        title="AI", parent__isnull=False
+    ).select_related("parent", "created_by")
+    mapping = {}
+    for folder in ai_folders.iterator():
+        collection_name = get_collection_name(folder)
+        if collection_name in mapping:
+            log.warning(
+                "Collection %s is shared by folders %s and %d, skipping it.",
+                collection_name,
+                mapping[collection_name],
+                folder.pk,
+            )
+            mapping[collection_name] = None
         else:
-            log.debug("Collection id was None.")
+            mapping[collection_name] = folder.pk
+    return mapping
 
 
-def enumerate_stale_vectors():
-    stale_vectors = []
-    root_folders = Folder.objects.filter(is_root=True)
-    for root_folder in root_folders:
-        ai_folder = root_folder.subfolders.get(title="AI")
-        collection_name = get_collection_name(ai_folder)
-        current_file_names = [
-            folderr_file.file.name for folderr_file in ai_folder.files.all()
-        ]
-        with connection.cursor() as cursor:
-            collection_id = get_collection_id(collection_name, cursor)
-            if collection_id is not None:
-                cursor.execute(
-                    """SELECT uuid, cmetadata -> 'source' AS "source_doc" FROM
-                    langchain_pg_embedding WHERE collection_id = %s""",
-                    [str(collection_id)],
-                )
-                rows = cursor.fetchall()
-                file_name_to_vector_id_map = {}
-                for row in rows:
-                    vector_id, source_document = row
-                    file_name_to_vector_id_map[
-                        str(Path(source_document).name)
-                    ] = vector_id
-                for file_name, vector_id in file_name_to_vector_id_map.items():
-                    if file_name not in current_file_names:
-                        stale_vectors.append(
-                            {
-                                "collection_id": collection_id,
-                                "vector_id": vector_id,
-                            }
-                        )
-    for stale_vector in stale_vectors:
-        VectorToDelete.objects.get_or_create(
-            id=UUID(stale_vector["vector_id"]),
-            collection_id=stale_vector["collection_id"],
-        )
+def create_collection_folder_table(cursor):
+    """Map every AI folder's collection name to the folder in a temp table.
+
+    Collection names are built in Python by ``get_collection_name``, so the
+    mapping can't be computed in SQL. Shared names get a NULL folder id.
+    """
+    cursor.execute(
+        """CREATE TEMPORARY TABLE IF NOT EXISTS ai_collection_folder (
+            collection_name text PRIMARY KEY, folder_id bigint
+        ) ON COMMIT PRESERVE ROWS"""
+    )
+    cursor.execute("TRUNCATE ai_collection_folder")
+    cursor.executemany(
+        "INSERT INTO ai_collection_folder VALUES (%s, %s)",
+        list(get_collection_folders().items()),
+    )
+    cursor.execute("ANALYZE ai_collection_folder")
+
+
+STALE_VECTORS_SQL = """
+SELECT
+    embedding.uuid,
+    embedding.collection_id,
+    mapping.collection_name IS NULL
+FROM langchain_pg_embedding embedding
+JOIN langchain_pg_collection collection
+    ON collection.uuid = embedding.collection_id
+LEFT JOIN ai_collection_folder mapping
+    ON mapping.collection_name = collection.name
+WHERE embedding.uuid > %(resume_from)s
+AND NOT EXISTS (
+    SELECT 1 FROM {vector_to_delete} queued WHERE queued.id = embedding.uuid
+)
+-- Collections shared by several folders are left alone.
+AND (mapping.collection_name IS NULL OR mapping.folder_id IS NOT NULL)
+AND (
+    mapping.collection_name IS NULL
+    OR NOT EXISTS (
+        SELECT 1 FROM {file} folderr_file
+        WHERE folderr_file.folder_id = mapping.folder_id
+        AND CASE
+            WHEN embedding.cmetadata ->> 'file_id' IS NOT NULL
+            THEN folderr_file.id::text = embedding.cmetadata ->> 'file_id'
+            ELSE regexp_replace(folderr_file.file, '^.*/', '')
+                = regexp_replace(embedding.cmetadata ->> 'source', '^.*/', '')
+        END
+    )
+)
+ORDER BY embedding.uuid
+"""
+
+
+def iter_stale_vectors(batch_size: int, resume_from: UUID = None):
+    """Yield batches of ``(vector_id, collection_id, orphaned)`` rows.
+
+    A vector is stale when the file it was ingested from is no longer in
+    the AI folder, and orphaned when the AI folder itself is gone. Both are
+    found with one anti-join over every collection, read through a server
+    side cursor in ``uuid`` order so an interrupted run can resume after
+    the last vector id it reported. Collections whose name is shared by
+    several AI folders are skipped.
+    """
+    with connection.cursor() as cursor:
+        create_collection_folder_table(cursor)
+    sql = STALE_VECTORS_SQL.format(
+        vector_to_delete=VectorToDelete._meta.db_table,
+        file=File._meta.db_table,
+    )
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, {"resume_from": str(resume_from or UUID(int=0))})
+        while rows := cursor.fetchmany(batch_size):
+            yield rows
+
+
+def mark_vectors_for_deletion(rows) -> int:
+    created = VectorToDelete.objects.bulk_create(
+        [
+            VectorToDelete(id=vector_id, collection_id=collection_id)
+            for vector_id, collection_id, _ in rows
+        ],
+        ignore_conflicts=True,
+    )
+    return len(created)
@@ -0,0 +1,231 @@
+import json
+import logging
+import re
+import statistics
+import time
+from typing import Any
+
+from assetchat.common import clients, get_vector_store
+from assetchat.vector_index import get_percentiles
+from django.conf import settings
+from django.db import connection
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+
+log = logging.getLogger("assetchat.hybrid_search")
+
+TEXT_INDEX_NAME = "langchain_pg_embedding_document_fts_idx"
+
+# Queries have to use the same configuration as the index for it to be used.
+TEXT_SEARCH_CONFIG = "english"
+
+VECTOR_RETRIEVAL = "vector"
+HYBRID_RETRIEVAL = "hybrid"
+RETRIEVAL_CHOICES = [VECTOR_RETRIEVAL, HYBRID_RETRIEVAL]
+
+PASSAGE_QUERY = "passage"
+IDENTIFIER_QUERY = "identifier"
+
+# Words with both letters and digits, like model, serial and part numbers.
+IDENTIFIER_PATTERN = re.compile(
+    r"\b(?=[\w-]*\d)(?=[\w-]*[a-z])[\w-]{4,}\b", re.I
+)
+
+TEXT_INDEX_SQL = f"""CREATE INDEX CONCURRENTLY IF NOT EXISTS
+{TEXT_INDEX_NAME} ON langchain_pg_embedding
+USING gin (to_tsvector('{TEXT_SEARCH_CONFIG}', document))"""
+
+# Chunks matching any word of the question, not all of them, ranked so those
+# with more and closer matches come first.
+TEXT_SEARCH_SQL = f"""WITH query AS (
+    SELECT to_tsquery(
+        '{TEXT_SEARCH_CONFIG}',
+        replace(
+            plainto_tsquery('{TEXT_SEARCH_CONFIG}', %s)::text, ' & ', ' | '
+        )
+    ) AS query
+)
+SELECT embedding.document, embedding.cmetadata, ts_rank_cd(
+    to_tsvector('{TEXT_SEARCH_CONFIG}', embedding.document), query.query
+)
+FROM langchain_pg_embedding embedding
+JOIN langchain_pg_collection collection
+    ON collection.uuid = embedding.collection_id
+CROSS JOIN query
+WHERE collection.name = %s
+AND to_tsvector('{TEXT_SEARCH_CONFIG}', embedding.document) @@ query.query
+ORDER BY 3 DESC
+LIMIT %s"""
+
+
+def text_search(cursor, query: str, collection_name: str, k: int):
+    cursor.execute(TEXT_SEARCH_SQL, [query, collection_name, k])
+    return cursor.fetchall()
+
+
+def get_document_key(document: Document) -> tuple[str, str]:
+    return document.page_content, json.dumps(document.metadata, sort_keys=True)
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[Document]], rrf_k: int = 60
+) -> list[Document]:
+    """Merge rankings of documents into one.
+
+    Every document scores ``1 / (rrf_k + rank)`` for each ranking it's in,
+    so documents found by several searches rise to the top. Ties keep the
+    order of the first ranking.
+    """
+    documents = {}
+    scores = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = get_document_key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1 / (rrf_k + rank)
+    return [
+        documents[key] for key in sorted(scores, key=scores.get, reverse=True)
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieves chunks by both vector similarity and full-text search.
+
+    The ``fetch_k`` best results of each search are merged with reciprocal
+    rank fusion, so exact model numbers, serial numbers and part codes that
+    embeddings tend to miss are still found.
+    """
+
+    vector_store: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def full_text_search(self, query: str) -> list[Document]:
+        with clients.get_engine().begin() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                rows = text_search(
+                    cursor,
+                    query,
+                    self.vector_store.collection_name,
+                    self.fetch_k,
+                )
+            finally:
+                cursor.close()
+        return [
+            Document(page_content=document, metadata=metadata)
+            for document, metadata, _ in rows
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        vector_documents = self.vector_store.similarity_search(
+            query, k=self.fetch_k
+        )
+        text_documents = self.full_text_search(query)
+        log.debug(
+            "Found %d chunks by vector and %d by full-text search.",
+            len(vector_documents),
+            len(text_documents),
+        )
+        documents = reciprocal_rank_fusion(
+            [vector_documents, text_documents], self.rrf_k
+        )
+        return documents[: self.k]
+
+
+def get_retriever(vector_store, retrieval: str = None, k: int = 4):
+    """Retriever for a vector store.
+
+    ``retrieval`` is either ``"vector"`` or ``"hybrid"`` and defaults to
+    ``AI_RETRIEVAL``.
+    """
+    retrieval = retrieval or settings.AI_RETRIEVAL
+    if retrieval == HYBRID_RETRIEVAL:
+        return HybridRetriever(
+            vector_store=vector_store,
+            k=k,
+            fetch_k=max(k, settings.AI_HYBRID_FETCH_K),
+            rrf_k=settings.AI_HYBRID_RRF_K,
+        )
+    return vector_store.as_retriever(search_kwargs={"k": k})
+
+
+def get_benchmark_queries(document: str) -> list[tuple]:
+    """Queries for a chunk, with a test of whether a result answers them.
+
+    A passage query is the start of the chunk and only the chunk answers
+    it. An identifier query asks for a model or part number found in the
+    chunk and any chunk containing that number answers it.
+    """
+    passage = " ".join(document.split()[:12])
+    queries = [
+        (PASSAGE_QUERY, passage, lambda result: result == document),
+    ]
+    match = IDENTIFIER_PATTERN.search(document)
+    if match is not None:
+        identifier = match.group()
+        queries.append(
+            (
+                IDENTIFIER_QUERY,
+                f"Which documents mention {identifier}?",
+                lambda result: identifier.lower() in result.lower(),
+            )
+        )
+    return queries
+
+
+def benchmark(sample_size: int = 100, k: int = 4) -> dict:
+    """Compare hybrid retrieval against vector-only retrieval.
+
+    Queries are made from stored chunks, see ``get_benchmark_queries``.
+    Returns the recall@k of both retrievals by kind of query and their
+    latency percentiles in milliseconds.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT embedding.document, collection.name
+            FROM langchain_pg_embedding embedding
+            JOIN langchain_pg_collection collection
+                ON collection.uuid = embedding.collection_id
+            ORDER BY random() LIMIT %s""",
+            [sample_size],
+        )
+        samples = cursor.fetchall()
+    recalls = {
+        retrieval: {PASSAGE_QUERY: [], IDENTIFIER_QUERY: []}
+        for retrieval in RETRIEVAL_CHOICES
+    }
+    latencies = {retrieval: [] for retrieval in RETRIEVAL_CHOICES}
+    for document, collection_name in samples:
+        vector_store = get_vector_store(collection_name)
+        for kind, query, is_relevant in get_benchmark_queries(document):
+            for retrieval in RETRIEVAL_CHOICES:
+                retriever = get_retriever(vector_store, retrieval, k)
+                started_at = time.perf_counter()
+                results = retriever.get_relevant_documents(query)
+                latencies[retrieval].append(
+                    (time.perf_counter() - started_at) * 1000
+                )
+                found = any(
+                    is_relevant(result.page_content) for result in results
+                )
+                recalls[retrieval][kind].append(float(found))
+    return {
+        "queries": sum(
+            len(values) for values in recalls[HYBRID_RETRIEVAL].values()
+        ),
+        "recall": {
+            retrieval: {
+                kind: statistics.mean(values) if values else None
+                for kind, values in kinds.items()
+            }
+            for retrieval, kinds in recalls.items()
+        },
+        "latency": {
+            retrieval: get_percentiles(values)
+            for retrieval, values in latencies.items()
+        },
+    }
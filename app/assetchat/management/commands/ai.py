@@ -1,11 +1,34 @@
 from argparse import ArgumentParser
+from collections import Counter
+from uuid import UUID
 
-from assetchat.file_deletion import enumerate_stale_vectors
+from assetchat.answer_cache import get_stats
+from assetchat.benchmark import FILE_KINDS, run_benchmark
+from assetchat.file_deletion import (
+    iter_stale_vectors,
+    mark_vectors_for_deletion,
+)
+from assetchat.hybrid_search import benchmark as benchmark_retrieval
+from assetchat.tasks import purge_stale_vectors_task
+from assetchat.vector_index import (
+    HNSW,
+    IVFFLAT,
+    benchmark,
+    create_index,
+    drop_index,
+    get_index_status,
+)
 from django.contrib.auth import get_user_model
-from django.core.management import BaseCommand
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
 
 RESET_USAGE_LIMIT_ACTION = 0
 ENUMERATE_STALE_VECTORS_ACTION = 1
+VECTOR_INDEX_ACTION = 2
+ANSWER_CACHE_STATS_ACTION = 3
+RETRIEVAL_BENCHMARK_ACTION = 4
+BENCHMARK_ACTION = 5
 
 
 class Command(BaseCommand):
@@ -30,15 +53,256 @@ class Command(BaseCommand):
         enumerate_stale_vectors_subparser.set_defaults(
             action=ENUMERATE_STALE_VECTORS_ACTION
         )
+        enumerate_stale_vectors_subparser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report stale vectors without marking them.",
+        )
+        enumerate_stale_vectors_subparser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of vectors read and marked at a time.",
+        )
+        enumerate_stale_vectors_subparser.add_argument(
+            "--resume-from",
+            type=UUID,
+            metavar="UUID",
+            help="Only check vectors with an id greater than this one.",
+        )
+
+        vector_index_subparser = subparsers.add_parser(
+            "vector_index",
+            help="Manage the approximate nearest neighbour index.",
+        )
+        vector_index_subparser.set_defaults(action=VECTOR_INDEX_ACTION)
+        vector_index_subparser.add_argument(
+            "index_action", choices=["create", "drop", "status", "benchmark"]
+        )
+        vector_index_subparser.add_argument(
+            "--method", choices=[HNSW, IVFFLAT], default=HNSW
+        )
+        vector_index_subparser.add_argument(
+            "--m", type=int, default=16, help="HNSW connections per layer."
+        )
+        vector_index_subparser.add_argument(
+            "--ef-construction",
+            type=int,
+            default=64,
+            help="HNSW candidate list size while building.",
+        )
+        vector_index_subparser.add_argument(
+            "--lists", type=int, default=100, help="IVFFlat list count."
+        )
+        vector_index_subparser.add_argument(
+            "--sample-size",
+            type=int,
+            default=100,
+            help="Number of benchmark queries.",
+        )
+        vector_index_subparser.add_argument(
+            "--k", type=int, default=4, help="Results per benchmark query."
+        )
+
+        answer_cache_stats_subparser = subparsers.add_parser(
+            "answer_cache_stats",
+            help="Show the hit rate of the answer cache.",
+        )
+        answer_cache_stats_subparser.set_defaults(
+            action=ANSWER_CACHE_STATS_ACTION
+        )
+
+        retrieval_benchmark_subparser = subparsers.add_parser(
+            "retrieval_benchmark",
+            help="Compare hybrid retrieval against vector-only retrieval.",
+        )
+        retrieval_benchmark_subparser.set_defaults(
+            action=RETRIEVAL_BENCHMARK_ACTION
+        )
+        retrieval_benchmark_subparser.add_argument(
+            "--sample-size",
+            type=int,
+            default=100,
+            help="Number of chunks benchmark queries are made from.",
+        )
+        retrieval_benchmark_subparser.add_argument(
+            "--k", type=int, default=4, help="Results per benchmark query."
+        )
+
+        benchmark_subparser = subparsers.add_parser(
+            "benchmark",
+            help=(
+                "Train on a synthetic folder and query it offline, with fake "
+                "embeddings and a fake chat model."
+            ),
+        )
+        benchmark_subparser.set_defaults(action=BENCHMARK_ACTION)
+        benchmark_subparser.add_argument(
+            "--files", type=int, default=20, help="Number of files."
+        )
+        benchmark_subparser.add_argument(
+            "--kinds",
+            nargs="+",
+            choices=FILE_KINDS,
+            default=FILE_KINDS,
+            help="Kinds of files to generate, in turn.",
+        )
+        benchmark_subparser.add_argument(
+            "--words", type=int, default=500, help="Words per file."
+        )
+        benchmark_subparser.add_argument(
+            "--queries", type=int, default=50, help="Number of queries."
+        )
+        benchmark_subparser.add_argument(
+            "--k", type=int, default=4, help="Results per query."
+        )
+        benchmark_subparser.add_argument(
+            "--chunk-size", type=int, default=1000
+        )
+        benchmark_subparser.add_argument(
+            "--overlap-size", type=int, default=200
+        )
+        benchmark_subparser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the generated text."
+        )
+        benchmark_subparser.add_argument(
+            "--default-storage",
+            action="store_true",
+            help="Store files in the default storage instead of locally.",
+        )
+        benchmark_subparser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the benchmark user, folder and vectors.",
+        )
 
     def reset_usage_limits(self, user_id: int):
         user = get_user_model().objects.get(pk=user_id)
         user.ai_usage_limit.reset_limits()
         self.stdout.write(f"Limits for {user.email} has been reset.")
 
-    def enumerate_stale_vectors(self):
-        enumerate_stale_vectors()
-        self.stdout.write("Stale vectors marked for deletion.")
+    def enumerate_stale_vectors(
+        self, dry_run: bool, batch_size: int, resume_from: UUID
+    ):
+        stale_counts = Counter()
+        orphaned_counts = Counter()
+        marked_count = 0
+        for rows in iter_stale_vectors(batch_size, resume_from):
+            for _, collection_id, orphaned in rows:
+                if orphaned:
+                    orphaned_counts[collection_id] += 1
+                else:
+                    stale_counts[collection_id] += 1
+            if not dry_run:
+                marked_count += mark_vectors_for_deletion(rows)
+            self.stdout.write(
+                f"Checked vectors up to {rows[-1][0]}, "
+                f"{marked_count} marked so far."
+            )
+        for collection_id in sorted(stale_counts | orphaned_counts):
+            self.stdout.write(
+                f"Collection {collection_id}: "
+                f"{stale_counts[collection_id]} stale, "
+                f"{orphaned_counts[collection_id]} orphaned."
+            )
+        total = sum(stale_counts.values()) + sum(orphaned_counts.values())
+        if dry_run:
+            self.stdout.write(f"{total} vectors would be marked for deletion.")
+            return
+        for collection_id in stale_counts | orphaned_counts:
+            purge_stale_vectors_task.delay(str(collection_id))
+        self.stdout.write(f"{marked_count} vectors marked for deletion.")
+
+    def vector_index(self, index_action: str, options: dict):
+        if index_action == "benchmark":
+            result = benchmark(options["sample_size"], options["k"])
+            self.stdout.write(f"Queries: {result['queries']}")
+            self.stdout.write(f"Recall@{options['k']}: {result['recall']}")
+            for mode, latency in result["latency"].items():
+                self.stdout.write(
+                    f"{mode} latency: p50 {latency['p50']} ms, "
+                    f"p95 {latency['p95']} ms"
+                )
+            return
+        with connection.cursor() as cursor:
+            if index_action == "create":
+                create_index(
+                    cursor,
+                    options["method"],
+                    m=options["m"],
+                    ef_construction=options["ef_construction"],
+                    lists=options["lists"],
+                )
+            elif index_action == "drop":
+                drop_index(cursor)
+            status = get_index_status(cursor)
+        if status is None:
+            self.stdout.write("No vector index.")
+        else:
+            self.stdout.write(
+                f"{status['method']} index, {status['size']} bytes, "
+                f"{'valid' if status['valid'] else 'INVALID'}.\n"
+                f"{status['definition']}"
+            )
+
+    def answer_cache_stats(self):
+        stats = get_stats()
+        if stats["hits"] is None:
+            self.stderr.write("The hits and misses couldn't be read.")
+        hit_rate = stats["hit_rate"]
+        self.stdout.write(
+            f"{stats['hits']} hits, {stats['misses']} misses, "
+            f"hit rate {'n/a' if hit_rate is None else f'{hit_rate:.1%}'}, "
+            f"{stats['entries']} cached answers."
+        )
+
+    def retrieval_benchmark(self, sample_size: int, k: int):
+        result = benchmark_retrieval(sample_size, k)
+        self.stdout.write(f"Queries: {result['queries']}")
+        for retrieval, recalls in result["recall"].items():
+            for kind, recall in recalls.items():
+                self.stdout.write(
+                    f"{retrieval} recall@{k} for {kind} queries: {recall}"
+                )
+        for retrieval, latency in result["latency"].items():
+            self.stdout.write(
+                f"{retrieval} latency: p50 {latency['p50']} ms, "
+                f"p95 {latency['p95']} ms"
+            )
+
+    def benchmark(self, options: dict):
+        try:
+            result = run_benchmark(
+                file_count=options["files"],
+                kinds=options["kinds"],
+                word_count=options["words"],
+                query_count=options["queries"],
+                k=options["k"],
+                chunk_size=options["chunk_size"],
+                overlap_size=options["overlap_size"],
+                seed=options["seed"],
+                local_storage=not options["default_storage"],
+                keep=options["keep"],
+            )
+        except ImproperlyConfigured as e:
+            raise CommandError(e)
+        self.stdout.write(
+            f"Training: {result['processed_files']} files "
+            f"({result['failed_files']} failed), {result['chunks']} chunks "
+            f"in {result['training_seconds']:.2f}s, "
+            f"{result['files_per_second']:.2f} files/sec, "
+            f"{result['chunks_per_second']:.1f} chunks/sec, "
+            f"{result['training_sql_statements']} SQL statements."
+        )
+        for name, latency in [
+            *result["retrieval"].items(),
+            ("answer", result["answers"]),
+        ]:
+            self.stdout.write(
+                f"{name}: p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+                f"{latency['sql_statements']} SQL statements."
+            )
+        self.stdout.write(f"Peak RSS: {result['peak_rss'] / 2**20:.1f} MiB")
 
     def handle(self, *args, **options):
         action = options["action"]
@@ -47,4 +311,16 @@ class Command(BaseCommand):
             user_id = options["user_id"]
             self.reset_usage_limits(user_id)
         elif action == ENUMERATE_STALE_VECTORS_ACTION:
-            pass
+            self.enumerate_stale_vectors(
+                options["dry_run"],
+                options["batch_size"],
+                options["resume_from"],
+            )
+        elif action == VECTOR_INDEX_ACTION:
+            self.vector_index(options["index_action"], options)
+        elif action == ANSWER_CACHE_STATS_ACTION:
+            self.answer_cache_stats()
+        elif action == RETRIEVAL_BENCHMARK_ACTION:
+            self.retrieval_benchmark(options["sample_size"], options["k"])
+        elif action == BENCHMARK_ACTION:
+            self.benchmark(options)
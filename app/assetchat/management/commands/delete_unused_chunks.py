@@ -0,0 +1,14 @@
+from assetchat.chunking import get_params_prefix
+from assetchat.models import ChunkCache
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete cached chunks of other chunker versions or tokenizers, or "
+        "unused for AI_CHUNK_CACHE_RETENTION seconds."
+    )
+
+    def handle(self, *args, **options):
+        count = ChunkCache.delete_unused(get_params_prefix())
+        self.stdout.write(f"Deleted {count} cached chunk lists.")
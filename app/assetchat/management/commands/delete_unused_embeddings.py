@@ -0,0 +1,13 @@
+from assetchat.models import EmbeddingCache
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete cached embeddings of other models or unused for "
+        "AI_EMBEDDING_CACHE_RETENTION seconds."
+    )
+
+    def handle(self, *args, **options):
+        count = EmbeddingCache.delete_unused()
+        self.stdout.write(f"Deleted {count} cached embeddings.")
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.10 on 2026-10-17 10:02
+
+import pgvector.django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("assetchat", "0010_create_default_usage_limits"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmbeddingCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64)),
+                ("model", models.CharField(max_length=100)),
+                ("embedding", pgvector.django.VectorField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "ai_embedding_cache",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="embeddingcache",
+            constraint=models.UniqueConstraint(
+                fields=("content_hash", "model"),
+                name="unique_embedding_per_model",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_file_id_index(apps, schema_editor):
+    from assetchat.common import FILE_ID_INDEX_SQL, create_vector_tables
+
+    with schema_editor.connection.cursor() as cursor:
+        create_vector_tables(cursor)
+        cursor.execute(FILE_ID_INDEX_SQL)
+
+
+def drop_file_id_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "DROP INDEX CONCURRENTLY IF EXISTS "
+            "langchain_pg_embedding_file_id_idx"
+        )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("assetchat", "0011_embeddingcache"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_file_id_index, drop_file_id_index),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_ann_index(apps, schema_editor):
+    from assetchat.vector_index import (
+        HNSW,
+        create_index,
+        embedding_table_exists,
+        supports_hnsw,
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        # langchain creates the table on first use and HNSW needs pgvector
+        # 0.5.0. Otherwise the index is left to `manage.py ai vector_index`.
+        if embedding_table_exists(cursor) and supports_hnsw(cursor):
+            create_index(cursor, HNSW)
+
+
+def drop_ann_index(apps, schema_editor):
+    from assetchat.vector_index import drop_index
+
+    with schema_editor.connection.cursor() as cursor:
+        drop_index(cursor)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("assetchat", "0012_embedding_file_id_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ann_index, drop_ann_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.0.10 on 2026-10-17 22:41
+
+import pgvector.django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("assetchat", "0013_embedding_ann_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedAnswer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("collection_name", models.CharField(max_length=255)),
+                ("collection_version", models.BigIntegerField()),
+                ("question", models.TextField()),
+                ("question_hash", models.CharField(max_length=64)),
+                ("embedding", pgvector.django.VectorField()),
+                ("answer", models.TextField()),
+                ("hit_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "ai_answer_cache",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="cachedanswer",
+            index=models.Index(
+                fields=["collection_name", "collection_version"],
+                name="answer_cache_collection_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cachedanswer",
+            index=models.Index(
+                fields=["collection_name", "last_used_at"],
+                name="answer_cache_lru_idx",
+            ),
+        ),
+    ]
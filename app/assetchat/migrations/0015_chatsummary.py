@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-17 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("assetchat", "0014_cachedanswer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatSummary",
+            fields=[
+                (
+                    "session_id",
+                    models.UUIDField(primary_key=True, serialize=False),
+                ),
+                ("summary", models.TextField(blank=True)),
+                ("watermark", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "ai_chat_summary",
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TABLE_NAME = "langchain_chat_history"
+
+
+def create_session_index(apps, schema_editor):
+    from assetchat.common import (
+        create_chat_history_table,
+        get_session_index_sql,
+    )
+
+    with schema_editor.connection.cursor() as cursor:
+        create_chat_history_table(cursor, TABLE_NAME)
+        cursor.execute(get_session_index_sql(TABLE_NAME))
+
+
+def drop_session_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"DROP INDEX CONCURRENTLY IF EXISTS {TABLE_NAME}_session_id_idx"
+        )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("assetchat", "0015_chatsummary"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_session_index, drop_session_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.0.10 on 2026-10-17 23:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("filemanager", "0066_populate_mime_type"),
+        ("assetchat", "0016_chat_history_session_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processedfile",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, "Processed"), (1, "Failed")], default=0
+            ),
+        ),
+        migrations.CreateModel(
+            name="TrainingState",
+            fields=[
+                (
+                    "folder",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="training_state",
+                        serialize=False,
+                        to="filemanager.folder",
+                    ),
+                ),
+                ("pending_count", models.IntegerField(default=0)),
+                ("processed_count", models.IntegerField(default=0)),
+                ("failed_count", models.IntegerField(default=0)),
+                (
+                    "last_trained_at",
+                    models.DateTimeField(blank=True, null=True),
+                ),
+                (
+                    "collection_version",
+                    models.PositiveIntegerField(default=0),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "ai_training_state",
+            },
+        ),
+    ]
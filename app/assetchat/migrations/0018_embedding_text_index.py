@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_text_index(apps, schema_editor):
+    from assetchat.common import create_vector_tables
+    from assetchat.hybrid_search import TEXT_INDEX_SQL
+
+    with schema_editor.connection.cursor() as cursor:
+        create_vector_tables(cursor)
+        cursor.execute(TEXT_INDEX_SQL)
+
+
+def drop_text_index(apps, schema_editor):
+    from assetchat.hybrid_search import TEXT_INDEX_NAME
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {TEXT_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("assetchat", "0017_trainingstate"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
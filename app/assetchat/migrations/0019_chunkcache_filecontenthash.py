@@ -0,0 +1,63 @@
+# Generated by Django 4.0.10 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("filemanager", "0066_populate_mime_type"),
+        ("assetchat", "0018_embedding_text_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChunkCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64)),
+                ("params", models.CharField(max_length=100)),
+                ("chunks", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "ai_chunk_cache",
+            },
+        ),
+        migrations.CreateModel(
+            name="FileContentHash",
+            fields=[
+                (
+                    "file",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ai_content_hash",
+                        serialize=False,
+                        to="filemanager.file",
+                    ),
+                ),
+                ("content_hash", models.CharField(max_length=64)),
+                ("file_name", models.CharField(max_length=1000)),
+                ("file_updated", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "ai_file_content_hash",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="chunkcache",
+            constraint=models.UniqueConstraint(
+                fields=("content_hash", "params"),
+                name="unique_chunks_per_params",
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+def up(apps, schema_editor):
+    # Answers were stored under versions kept in Redis, which
+    # TrainingState.collection_version replaces.
+    cached_answer_model = apps.get_model("assetchat", "CachedAnswer")
+    cached_answer_model.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("assetchat", "0019_chunkcache_filecontenthash"),
+    ]
+
+    operations = [migrations.RunPython(up, migrations.RunPython.noop)]
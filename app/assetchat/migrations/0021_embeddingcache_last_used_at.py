@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-17 23:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("assetchat", "0020_clear_answer_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="embeddingcache",
+            name="last_used_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-18 00:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("assetchat", "0021_embeddingcache_last_used_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chunkcache",
+            name="last_used_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,18 +1,31 @@
+import datetime
 import decimal
 import uuid
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from filemanager.models import File
+from pgvector.django import VectorField
 
 User = get_user_model()
 
 
 class ProcessedFile(models.Model):
+    PROCESSED = 0
+    FAILED = 1
+    STATUS_CHOICES = (
+        (PROCESSED, "Processed"),
+        (FAILED, "Failed"),
+    )
     file = models.OneToOneField(
         File, on_delete=models.CASCADE, related_name="ai_processed"
     )
+    status = models.PositiveSmallIntegerField(
+        default=PROCESSED, choices=STATUS_CHOICES
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -20,6 +33,67 @@ class ProcessedFile(models.Model):
         ordering = ["-created_at"]
 
 
+class TrainingState(models.Model):
+    """File counts of an AI folder, kept up to date by signals."""
+
+    folder = models.OneToOneField(
+        "filemanager.Folder",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="training_state",
+    )
+    pending_count = models.IntegerField(default=0)
+    processed_count = models.IntegerField(default=0)
+    failed_count = models.IntegerField(default=0)
+    last_trained_at = models.DateTimeField(null=True, blank=True)
+    # Incremented whenever the folder's vectors change.
+    collection_version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "ai_training_state"
+
+    def __str__(self):
+        return f"Training state of folder {self.folder_id}"
+
+    @property
+    def training_required(self) -> bool:
+        # Like before the state was tracked, failed files don't require
+        # training. The next training run retries them.
+        return self.pending_count > 0
+
+    @staticmethod
+    def count_files(folder) -> dict:
+        return folder.files.aggregate(
+            pending_count=models.Count(
+                "pk", filter=models.Q(ai_processed__isnull=True)
+            ),
+            processed_count=models.Count(
+                "pk",
+                filter=models.Q(ai_processed__status=ProcessedFile.PROCESSED),
+            ),
+            failed_count=models.Count(
+                "pk",
+                filter=models.Q(ai_processed__status=ProcessedFile.FAILED),
+            ),
+        )
+
+    @classmethod
+    def for_folder(cls, folder) -> "TrainingState":
+        # Created on first use, from a count of the folder's files.
+        state = cls.objects.filter(folder=folder).first()
+        if state is None:
+            state, _ = cls.objects.get_or_create(
+                folder=folder, defaults=cls.count_files(folder)
+            )
+        return state
+
+    def recount(self):
+        for field, value in self.count_files(self.folder).items():
+            setattr(self, field, value)
+        self.save()
+
+
 class VectorToDelete(models.Model):
     id = models.UUIDField(primary_key=True, unique=True)
     collection_id = models.UUIDField()
@@ -28,6 +102,107 @@ class VectorToDelete(models.Model):
         return str(self.id)
 
 
+class EmbeddingCache(models.Model):
+    content_hash = models.CharField(max_length=64)
+    model = models.CharField(max_length=100)
+    embedding = VectorField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Moved forward at most once a day, when the embedding is reused.
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "ai_embedding_cache"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash", "model"],
+                name="unique_embedding_per_model",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.model} embedding for {self.content_hash}"
+
+    @classmethod
+    def delete_unused(cls) -> int:
+        """Delete embeddings that won't be used again.
+
+        Those are the embeddings of models other than ``AI_EMBEDDING_MODEL``
+        and the ones unused for ``AI_EMBEDDING_CACHE_RETENTION`` seconds.
+        """
+        count, _ = cls.objects.filter(
+            ~Q(model=settings.AI_EMBEDDING_MODEL)
+            | Q(
+                last_used_at__lt=timezone.now()
+                - datetime.timedelta(
+                    seconds=settings.AI_EMBEDDING_CACHE_RETENTION
+                )
+            )
+        ).delete()
+        return count
+
+
+class FileContentHash(models.Model):
+    """SHA-256 of a file's content, valid while the file isn't saved again."""
+
+    file = models.OneToOneField(
+        File,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ai_content_hash",
+    )
+    content_hash = models.CharField(max_length=64)
+    # Storage name and update time of the file when it was hashed.
+    file_name = models.CharField(max_length=1000)
+    file_updated = models.DateTimeField()
+
+    class Meta:
+        db_table = "ai_file_content_hash"
+
+    def __str__(self):
+        return f"{self.file_name}: {self.content_hash}"
+
+
+class ChunkCache(models.Model):
+    """Chunks a file's content was split into with a set of parameters."""
+
+    content_hash = models.CharField(max_length=64)
+    params = models.CharField(max_length=100)
+    chunks = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Moved forward at most once a day, when the chunks are reused.
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "ai_chunk_cache"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash", "params"],
+                name="unique_chunks_per_params",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.params} chunks for {self.content_hash}"
+
+    @classmethod
+    def delete_unused(cls, params_prefix: str) -> int:
+        """Delete chunks that won't be used again.
+
+        Those are the chunks whose parameters don't start with
+        ``params_prefix``, i.e. that were split by another version of the
+        chunker or for another tokenizer, and the ones unused for
+        ``AI_CHUNK_CACHE_RETENTION`` seconds.
+        """
+        count, _ = cls.objects.filter(
+            ~Q(params__startswith=params_prefix)
+            | Q(
+                last_used_at__lt=timezone.now()
+                - datetime.timedelta(seconds=settings.AI_CHUNK_CACHE_RETENTION)
+            )
+        ).delete()
+        return count
+
+
 class Prompt(models.Model):
     QUESTION_GENERATOR = 0
     QUESTION_ANSWERING = 1
@@ -73,6 +248,20 @@ class Chat(models.Model):
         return f"Chat started by {self.user.email} on {self.created_at}"
 
 
+class ChatSummary(models.Model):
+    session_id = models.UUIDField(primary_key=True)
+    summary = models.TextField(blank=True)
+    # Id of the last chat history message included in the summary.
+    watermark = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "ai_chat_summary"
+
+    def __str__(self):
+        return str(self.session_id)
+
+
 class AIUsageLimit(models.Model):
     user = models.OneToOneField(
         "core.User", on_delete=models.CASCADE, related_name="ai_usage_limit"
@@ -102,3 +291,31 @@ class AIUsageLimit(models.Model):
 
     def __str__(self):
         return f"Usage limit for {self.user.email}"
+
+
+class CachedAnswer(models.Model):
+    collection_name = models.CharField(max_length=255)
+    collection_version = models.BigIntegerField()
+    question = models.TextField()
+    question_hash = models.CharField(max_length=64)
+    embedding = VectorField()
+    answer = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "ai_answer_cache"
+        indexes = [
+            models.Index(
+                fields=["collection_name", "collection_version"],
+                name="answer_cache_collection_idx",
+            ),
+            models.Index(
+                fields=["collection_name", "last_used_at"],
+                name="answer_cache_lru_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.question
@@ -1,4 +1,5 @@
-from assetchat.models import Chat
+from assetchat.hybrid_search import RETRIEVAL_CHOICES
+from assetchat.models import Chat, TrainingState
 from filemanager.utils import get_created_or_shared_folder
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -16,6 +17,9 @@ class QuestionSerializer(serializers.Serializer):
     temperature = serializers.DecimalField(
         max_digits=2, decimal_places=1, max_value=1.0
     )
+    retrieval = serializers.ChoiceField(
+        choices=RETRIEVAL_CHOICES, required=False
+    )
 
     def validate_session_id(self, value):
         try:
@@ -25,6 +29,11 @@ class QuestionSerializer(serializers.Serializer):
         return value
 
 
+class ChatHistoryQuerySerializer(serializers.Serializer):
+    cursor = serializers.IntegerField(required=False, min_value=1)
+    limit = serializers.IntegerField(default=50, min_value=1, max_value=200)
+
+
 class ChatSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         validated_data = super().validate(attrs)
@@ -55,3 +64,18 @@ class ChatSerializer(serializers.ModelSerializer):
             "created_at",
         ]
         read_only_fields = ["id", "session_id", "created_at"]
+
+
+class TrainingStateSerializer(serializers.ModelSerializer):
+    training_required = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = TrainingState
+        fields = [
+            "pending_count",
+            "processed_count",
+            "failed_count",
+            "training_required",
+            "last_trained_at",
+            "collection_version",
+        ]
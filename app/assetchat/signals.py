@@ -1,7 +1,11 @@
 from pathlib import Path
 
-from assetchat.models import AIUsageLimit, Prompt
+from assetchat.document_chat import bump_prompt_version
+from assetchat.models import AIUsageLimit, ProcessedFile, Prompt, TrainingState
 from assetchat.tasks import store_deleted_vector_task
+from django.db import transaction
+from django.db.models import F
+from filemanager.models import File
 
 
 def remove_current_default_prompt_before_save(
@@ -18,9 +22,14 @@ def remove_current_default_prompt_before_save(
             pass
 
 
+def invalidate_prompt_cache(sender, instance, *args, **kwargs):
+    # Other processes must not reload the prompts before they're committed.
+    transaction.on_commit(bump_prompt_version)
+
+
 def mark_related_vector_for_deletion(sender, instance, *args, **kwargs):
     store_deleted_vector_task.delay(
-        instance.folder.id, Path(instance.file.name).name
+        instance.folder.id, instance.pk, Path(instance.file.name).name
     )
 
 
@@ -29,3 +38,68 @@ def create_usage_limit_after_signup(
 ):
     if created:
         AIUsageLimit.objects.create(user=instance)
+
+
+def get_status_field(processed_file: ProcessedFile) -> str:
+    if processed_file.status == ProcessedFile.FAILED:
+        return "failed_count"
+    return "processed_count"
+
+
+def count_new_file(sender, instance, created, *args, **kwargs):
+    if created:
+        TrainingState.objects.filter(folder_id=instance.folder_id).update(
+            pending_count=F("pending_count") + 1
+        )
+
+
+def remember_previous_folder(
+    sender, instance, *args, update_fields=None, **kwargs
+):
+    instance._previous_folder_id = None
+    # Saves that don't write the folder can't move the file.
+    if instance.pk is None or (
+        update_fields is not None
+        and not {"folder", "folder_id"} & set(update_fields)
+    ):
+        return
+    instance._previous_folder_id = (
+        File.objects.filter(pk=instance.pk)
+        .values_list("folder_id", flat=True)
+        .first()
+    )
+
+
+def recount_after_move(sender, instance, created, *args, **kwargs):
+    previous_folder_id = getattr(instance, "_previous_folder_id", None)
+    if not created and previous_folder_id not in (None, instance.folder_id):
+        for state in TrainingState.objects.filter(
+            folder_id__in=[previous_folder_id, instance.folder_id]
+        ):
+            state.recount()
+
+
+def count_deleted_file(sender, instance, *args, **kwargs):
+    # The file's ProcessedFile is deleted first and already made it pending.
+    TrainingState.objects.filter(folder_id=instance.folder_id).update(
+        pending_count=F("pending_count") - 1
+    )
+
+
+def count_processed_file(sender, instance, created, *args, **kwargs):
+    if created:
+        status_field = get_status_field(instance)
+        TrainingState.objects.filter(
+            folder__files__pk=instance.file_id
+        ).update(
+            pending_count=F("pending_count") - 1,
+            **{status_field: F(status_field) + 1},
+        )
+
+
+def count_unprocessed_file(sender, instance, *args, **kwargs):
+    status_field = get_status_field(instance)
+    TrainingState.objects.filter(folder__files__pk=instance.file_id).update(
+        pending_count=F("pending_count") + 1,
+        **{status_field: F(status_field) - 1},
+    )
@@ -0,0 +1,310 @@
+"""Server-sent event stream of answers, served next to Django in ASGI.
+
+Django 4.0 can't stream from async code, so this is a plain ASGI app that
+``backend.asgi`` routes ``QUESTION_STREAM_PATH`` to. The chain runs in a
+worker thread and its tokens are handed to the event loop through a queue.
+When the client disconnects, the chain is stopped at its next token.
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from assetchat.document_chat import answer_question
+from assetchat.serializers import QuestionSerializer
+from corsheaders.conf import conf as cors_conf
+from django.db import close_old_connections, connections
+from filemanager.utils import get_created_or_shared_folder
+from langchain.callbacks.base import BaseCallbackHandler
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+log = logging.getLogger("assetchat.streaming")
+
+QUESTION_STREAM_PATH = re.compile(
+    r"^/asset-ai/stream-question/(?P<folder_pk>\d+)/$"
+)
+
+
+class StreamError(Exception):
+    def __init__(self, status: int, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """Puts tokens generated in the chain's thread on an asyncio queue.
+
+    Once ``disconnected`` is set, the next token raises
+    ``ClientDisconnected`` in the chain's thread, which stops the chain.
+    """
+
+    # Otherwise langchain logs the errors of handlers and carries on.
+    raise_error = True
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+        self.disconnected = threading.Event()
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self.disconnected.is_set():
+            raise ClientDisconnected()
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, token)
+
+
+def authenticate(headers: dict):
+    authorization = headers.get(b"authorization", b"").decode().split()
+    if len(authorization) != 2 or authorization[0] != "Bearer":
+        raise StreamError(401, "Authentication credentials were not provided.")
+    authentication = JWTAuthentication()
+    try:
+        token = authentication.get_validated_token(authorization[1])
+        return authentication.get_user(token)
+    except AuthenticationFailed as e:
+        raise StreamError(401, e.detail)
+
+
+def prepare_question(headers: dict, folder_pk: int, body: bytes):
+    close_old_connections()
+    try:
+        user = authenticate(headers)
+        folder = get_created_or_shared_folder(user, folder_pk)
+        if folder is None:
+            raise StreamError(
+                403, "You don't have permission to access this folder."
+            )
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise StreamError(400, "Invalid JSON.")
+        serializer = QuestionSerializer(
+            data=data, context={"request": SimpleNamespace(user=user)}
+        )
+        if not serializer.is_valid():
+            raise StreamError(400, serializer.errors)
+        return folder, serializer.validated_data
+    finally:
+        close_old_connections()
+
+
+def run_question(folder, data: dict, handler: TokenQueueHandler) -> str:
+    try:
+        result = answer_question(
+            data["question"],
+            folder,
+            data["session_id"],
+            float(data["temperature"]),
+            callbacks=[handler],
+            retrieval=data.get("retrieval"),
+        )
+        return result["answer"]
+    finally:
+        # Runs in an executor thread that Django won't clean up after.
+        connections.close_all()
+
+
+def encode_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def discard_answer(answer: asyncio.Future):
+    # Retrieves the error of an answer nobody waits for anymore, so asyncio
+    # doesn't log it as unhandled.
+    if not answer.cancelled():
+        answer.exception()
+
+
+def is_allowed_origin(origin: str) -> bool:
+    return (
+        cors_conf.CORS_ALLOW_ALL_ORIGINS
+        or origin in cors_conf.CORS_ALLOWED_ORIGINS
+        or any(
+            re.match(regex, origin)
+            for regex in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES
+        )
+    )
+
+
+def get_cors_headers(headers: dict, preflight: bool = False) -> list:
+    """The CORS headers django-cors-headers would add to a response.
+
+    Its middleware doesn't run for this app, so the same settings are
+    applied here.
+    """
+    cors_headers = [(b"vary", b"origin")]
+    origin = headers.get(b"origin", b"").decode()
+    if not origin or not is_allowed_origin(origin):
+        return cors_headers
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        cors_headers.append((b"access-control-allow-credentials", b"true"))
+    if (
+        cors_conf.CORS_ALLOW_ALL_ORIGINS
+        and not cors_conf.CORS_ALLOW_CREDENTIALS
+    ):
+        origin = "*"
+    cors_headers.append((b"access-control-allow-origin", origin.encode()))
+    if cors_conf.CORS_EXPOSE_HEADERS:
+        cors_headers.append(
+            (
+                b"access-control-expose-headers",
+                ", ".join(cors_conf.CORS_EXPOSE_HEADERS).encode(),
+            )
+        )
+    if preflight:
+        cors_headers += [
+            (
+                b"access-control-allow-headers",
+                ", ".join(cors_conf.CORS_ALLOW_HEADERS).encode(),
+            ),
+            (
+                b"access-control-allow-methods",
+                ", ".join(cors_conf.CORS_ALLOW_METHODS).encode(),
+            ),
+        ]
+        if cors_conf.CORS_PREFLIGHT_MAX_AGE:
+            cors_headers.append(
+                (
+                    b"access-control-max-age",
+                    str(cors_conf.CORS_PREFLIGHT_MAX_AGE).encode(),
+                )
+            )
+    return cors_headers
+
+
+async def send_preflight(send, headers: dict):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", b"0")]
+            + get_cors_headers(headers, preflight=True),
+        }
+    )
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def send_json(send, status: int, data, headers: dict):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")]
+            + get_cors_headers(headers),
+        }
+    )
+    await send(
+        {"type": "http.response.body", "body": json.dumps(data).encode()}
+    )
+
+
+async def question_stream_app(scope, receive, send):
+    started_at = time.monotonic()
+    headers = dict(scope["headers"])
+    if scope["method"] == "OPTIONS":
+        await send_preflight(send, headers)
+        return
+    if scope["method"] != "POST":
+        await send_json(send, 405, {"detail": "Method not allowed."}, headers)
+        return
+    folder_pk = int(QUESTION_STREAM_PATH.match(scope["path"])["folder_pk"])
+    body = await read_body(receive)
+    try:
+        folder, data = await sync_to_async(prepare_question)(
+            headers, folder_pk, body
+        )
+    except StreamError as e:
+        await send_json(send, e.status, {"detail": e.detail}, headers)
+        return
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]
+            + get_cors_headers(headers),
+        }
+    )
+    queue = asyncio.Queue()
+    handler = TokenQueueHandler(asyncio.get_running_loop(), queue)
+    answer = asyncio.ensure_future(
+        sync_to_async(run_question, thread_sensitive=False)(
+            folder, data, handler
+        )
+    )
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    first_token = True
+    try:
+        while not (answer.done() and queue.empty()):
+            token = asyncio.ensure_future(queue.get())
+            await asyncio.wait(
+                {token, answer, disconnect},
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect.done():
+                token.cancel()
+                handler.disconnected.set()
+                answer.add_done_callback(discard_answer)
+                log.info(
+                    "Client of chat %s disconnected after %.3fs.",
+                    data["session_id"],
+                    time.monotonic() - started_at,
+                )
+                return
+            if not token.done():
+                token.cancel()
+                continue
+            if first_token:
+                first_token = False
+                log.info(
+                    "First token for chat %s sent after %.3fs.",
+                    data["session_id"],
+                    time.monotonic() - started_at,
+                )
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": encode_event("token", {"token": token.result()}),
+                    "more_body": True,
+                }
+            )
+    finally:
+        disconnect.cancel()
+    if answer.exception() is not None:
+        log.error("Streaming answer failed.", exc_info=answer.exception())
+        event = encode_event("error", {"detail": "The answer failed."})
+    else:
+        event = encode_event("done", {"answer": answer.result()})
+    log.info(
+        "Answer for chat %s streamed in %.3fs.",
+        data["session_id"],
+        time.monotonic() - started_at,
+    )
+    await send({"type": "http.response.body", "body": event})
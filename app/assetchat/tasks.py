@@ -2,8 +2,9 @@ import logging
 
 from assetchat.ai_training import train_from_folder
 from assetchat.document_chat import answer_question
-from assetchat.file_deletion import get_stale_vector
+from assetchat.file_deletion import get_file_vectors, purge_stale_vectors
 from assetchat.models import VectorToDelete
+from backend.task_queues import user_task_slot
 from celery import shared_task
 from filemanager.models import Folder
 
@@ -13,8 +14,11 @@ log = logging.getLogger("assetchat.tasks")
 @shared_task
 def ai_trainer_task(folder_pk, chunk_size, overlap_size, clear_existing):
     folder = Folder.objects.get(pk=folder_pk)
-    train_from_folder(folder, chunk_size, overlap_size, clear_existing)
-    return {"contents": {"success": True}}
+    with user_task_slot(folder.created_by_id):
+        summary = train_from_folder(
+            folder, chunk_size, overlap_size, clear_existing
+        )
+    return {"contents": {"success": True, **summary}}
 
 
 @shared_task
@@ -24,25 +28,41 @@ def question_answering_task(
     folder_pk: int,
     session_id: str,
     temperature: float,
+    retrieval: str = None,
 ):
     folder = Folder.objects.get(pk=folder_pk)
-    result = answer_question(question, folder, session_id, temperature)
+    result = answer_question(
+        question, folder, session_id, temperature, retrieval=retrieval
+    )
     return {"user_id": user_id, "contents": {"answer": result["answer"]}}
 
 
 @shared_task
-def store_deleted_vector_task(folder_id, file_name):
+def store_deleted_vector_task(folder_id, file_id, file_name):
     folder = Folder.objects.get(pk=folder_id)
     if folder.title == "AI":
         log.debug("Folder %d is AI.", folder_id)
-        vector_info = get_stale_vector(folder, file_name)
-        if vector_info is not None:
+        vector_info = get_file_vectors(folder, file_id, file_name)
+        if vector_info is not None and vector_info["vector_ids"]:
             log.debug("Received vector_info: %s", vector_info)
-            VectorToDelete.objects.get_or_create(
-                id=vector_info["vector_id"],
-                collection_id=vector_info["collection_id"],
+            VectorToDelete.objects.bulk_create(
+                [
+                    VectorToDelete(
+                        id=vector_id,
+                        collection_id=vector_info["collection_id"],
+                    )
+                    for vector_id in vector_info["vector_ids"]
+                ],
+                ignore_conflicts=True,
             )
+            purge_stale_vectors_task.delay(str(vector_info["collection_id"]))
         else:
-            log.debug("Vector info was None.")
+            log.debug("No vectors found for file %d.", file_id)
     else:
         log.debug("Folder %d isn't AI.", folder_id)
+
+
+@shared_task
+def purge_stale_vectors_task(collection_id):
+    deleted_count = purge_stale_vectors(collection_id)
+    return {"contents": {"deleted_vectors": deleted_count}}
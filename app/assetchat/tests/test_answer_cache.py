@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+from assetchat.answer_cache import (
+    HITS_KEY,
+    bump_collection_version,
+    count,
+    get_ai_folders,
+    get_collection_version,
+)
+from assetchat.common import get_collection_name
+from assetchat.models import TrainingState
+from core.tests.factories import UserFactory
+from django.test import SimpleTestCase, TestCase
+from filemanager.tests.factories import FolderFactory
+
+
+class CollectionVersionTests(TestCase):
+    def create_ai_folder(self, user, asset_title):
+        asset = FolderFactory(created_by=user, title=asset_title)
+        ai_folder = FolderFactory(created_by=user, title="AI", parent=asset)
+        TrainingState.for_folder(ai_folder)
+        return ai_folder
+
+    def test_bump_only_changes_the_collection_folders(self):
+        user = UserFactory()
+        ai_folder = self.create_ai_folder(user, "Beach_house")
+        other_ai_folder = self.create_ai_folder(user, "Beach")
+        collection_name = get_collection_name(ai_folder)
+        self.assertEqual(get_ai_folders(collection_name), [ai_folder])
+        bump_collection_version(collection_name)
+        self.assertEqual(get_collection_version(ai_folder), 1)
+        self.assertEqual(get_collection_version(other_ai_folder), 0)
+
+    def test_untrained_folders_are_at_version_zero(self):
+        ai_folder = FolderFactory(
+            title="AI", parent=FolderFactory(title="Boat")
+        )
+        self.assertEqual(get_collection_version(ai_folder), 0)
+
+
+class StatsTests(SimpleTestCase):
+    @patch("assetchat.answer_cache.cache")
+    def test_cache_errors_dont_fail_counting(self, mock_cache):
+        mock_cache.add.side_effect = ConnectionError
+        with self.assertLogs("assetchat.answer_cache", "WARNING"):
+            count(HITS_KEY)
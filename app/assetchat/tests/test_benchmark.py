@@ -0,0 +1,48 @@
+import random
+
+from assetchat.benchmark import FakeEmbeddingClient, make_text, run_benchmark
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+
+class FakeEmbeddingClientTests(SimpleTestCase):
+    def setUp(self):
+        self.client = FakeEmbeddingClient(dimensions=64)
+
+    def test_same_text_gets_same_vector(self):
+        first, second = self.client.embed_sync(["oil filter", "oil filter"])
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(sum(value * value for value in first), 1.0)
+
+    def test_texts_sharing_words_are_closer(self):
+        query, similar, different = self.client.embed_sync(
+            ["replace the oil filter", "oil filter", "brake light fuse"]
+        )
+
+        def similarity(a, b):
+            return sum(x * y for x, y in zip(a, b))
+
+        self.assertGreater(
+            similarity(query, similar), similarity(query, different)
+        )
+
+    def test_empty_text_gets_a_unit_vector(self):
+        (vector,) = self.client.embed_sync([""])
+        self.assertEqual(sum(value * value for value in vector), 1.0)
+
+
+class MakeTextTests(SimpleTestCase):
+    def test_text_is_reproducible_from_the_seed(self):
+        self.assertEqual(
+            make_text(random.Random(1), 200), make_text(random.Random(1), 200)
+        )
+        self.assertGreaterEqual(
+            len(make_text(random.Random(1), 200).split()), 200
+        )
+
+
+class RunBenchmarkTests(SimpleTestCase):
+    @override_settings(AI_BENCHMARK_ENABLED=False, TEST=False)
+    def test_benchmark_needs_a_dedicated_database(self):
+        with self.assertRaises(ImproperlyConfigured):
+            run_benchmark()
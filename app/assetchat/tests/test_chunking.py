@@ -0,0 +1,85 @@
+from datetime import timedelta
+from pathlib import Path
+
+import tiktoken
+from assetchat.chunking import (
+    CHARACTERS_PER_TOKEN,
+    DEFAULT_ENCODING,
+    Chunker,
+    get_params_prefix,
+)
+from assetchat.models import ChunkCache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from langchain.schema import Document
+
+
+class ChunkerTests(TestCase):
+    def test_sizes_in_characters_are_turned_into_tokens(self):
+        chunker = Chunker(1000, 200)
+        self.assertEqual(chunker.chunk_size, 1000 // CHARACTERS_PER_TOKEN)
+        self.assertEqual(chunker.overlap_size, 200 // CHARACTERS_PER_TOKEN)
+
+    def test_chunk_size_is_counted_in_tokens(self):
+        chunker = Chunker(200, 40)
+        text = " ".join(f"word{i}" for i in range(1000))
+        chunks = chunker.split([Document(page_content=text)])
+        encoding = tiktoken.get_encoding(chunker.encoding_name)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(encoding.encode(chunk.page_content)), 50)
+
+    @override_settings(AI_EMBEDDING_MAX_TOKENS=100)
+    def test_chunk_size_is_capped_at_the_model_limit(self):
+        chunker = Chunker(4000, 2000)
+        self.assertEqual(chunker.chunk_size, 100)
+        self.assertEqual(chunker.overlap_size, 99)
+
+    @override_settings(AI_EMBEDDING_MODEL="unknown-model")
+    def test_unknown_models_use_the_default_encoding(self):
+        self.assertEqual(Chunker(100, 0).encoding_name, DEFAULT_ENCODING)
+
+    def test_cached_chunks_get_the_new_path(self):
+        chunker = Chunker(100, 10)
+        old_path = Path("/tmp/old/1/manual.pdf")
+        new_path = Path("/tmp/new/1/manual.pdf")
+        chunks = [
+            Document(
+                page_content="Replace the filter.",
+                metadata={"source": str(old_path), "page": 3},
+            )
+        ]
+        self.assertIsNone(chunker.get("abc", new_path))
+        chunker.set("abc", chunks, old_path)
+        cached_chunks = chunker.get("abc", new_path)
+        self.assertEqual(
+            cached_chunks,
+            [
+                Document(
+                    page_content="Replace the filter.",
+                    metadata={"source": str(new_path), "page": 3},
+                )
+            ],
+        )
+        self.assertEqual(chunker.counters["chunk_cache_hits"], 1)
+        self.assertEqual(chunker.counters["chunk_cache_misses"], 1)
+        # Other parameters don't reuse the chunks.
+        self.assertIsNone(Chunker(800, 10).get("abc", new_path))
+
+    @override_settings(AI_CHUNK_CACHE_RETENTION=3600)
+    def test_unused_chunks_are_deleted(self):
+        chunker = Chunker(100, 10)
+        kept = ChunkCache.objects.create(
+            content_hash="a", params=chunker.params, chunks=[]
+        )
+        ChunkCache.objects.create(
+            content_hash="a", params="v0:gpt2:25:2", chunks=[]
+        )
+        ChunkCache.objects.create(
+            content_hash="b",
+            params=chunker.params,
+            chunks=[],
+            last_used_at=timezone.now() - timedelta(hours=2),
+        )
+        self.assertEqual(ChunkCache.delete_unused(get_params_prefix()), 2)
+        self.assertEqual(list(ChunkCache.objects.all()), [kept])
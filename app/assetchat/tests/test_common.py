@@ -0,0 +1,24 @@
+from unittest.mock import patch
+
+from assetchat.common import ClientRegistry
+from django.test import SimpleTestCase, override_settings
+
+
+@patch("assetchat.common.get_embeddings")
+@patch("assetchat.common.PooledPGVector")
+class ClientRegistryTests(SimpleTestCase):
+    def test_vector_stores_are_shared(self, mock_store, mock_embeddings):
+        clients = ClientRegistry()
+        self.assertIs(
+            clients.get_vector_store("boat"), clients.get_vector_store("boat")
+        )
+        self.assertEqual(mock_store.call_count, 1)
+
+    @override_settings(AI_VECTOR_STORE_CACHE_SIZE=2)
+    def test_least_recently_used_stores_are_dropped(
+        self, mock_store, mock_embeddings
+    ):
+        clients = ClientRegistry()
+        for collection_name in ["boat", "car", "boat", "house"]:
+            clients.get_vector_store(collection_name)
+        self.assertEqual(list(clients.vector_stores), ["boat", "house"])
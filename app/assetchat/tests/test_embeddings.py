@@ -0,0 +1,118 @@
+import asyncio
+from contextlib import nullcontext
+from datetime import timedelta
+
+from assetchat.embeddings import (
+    AdaptiveBatchEmbeddings,
+    EmbeddingCacheStore,
+    RateLimited,
+)
+from assetchat.models import EmbeddingCache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+
+class FakeEmbeddingClient:
+    """Embeds a text as its length, failing the first ``rate_limit`` calls."""
+
+    def __init__(self, rate_limit=0):
+        self.rate_limit = rate_limit
+        self.batches = []
+
+    def session(self):
+        return nullcontext()
+
+    async def embed(self, texts):
+        await asyncio.sleep(0)
+        return self.embed_sync(texts)
+
+    def embed_sync(self, texts):
+        if self.rate_limit > 0:
+            self.rate_limit -= 1
+            raise RateLimited("Too many requests")
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def get_embeddings(client, **kwargs):
+    options = {
+        "batch_size": 4,
+        "max_batch_size": 16,
+        "concurrency": 2,
+        "max_concurrency": 4,
+        "target_latency": 1.0,
+        "max_retries": 3,
+        "min_backoff": 0.001,
+        "max_backoff": 0.01,
+    }
+    options.update(kwargs)
+    return AdaptiveBatchEmbeddings(client, **options)
+
+
+class AdaptiveBatchEmbeddingsTests(SimpleTestCase):
+    def test_vectors_keep_input_order(self):
+        texts = ["a" * i for i in range(1, 51)]
+        embeddings = get_embeddings(FakeEmbeddingClient())
+
+        vectors = embeddings.embed_documents(texts)
+
+        self.assertEqual(vectors, [[float(i)] for i in range(1, 51)])
+        self.assertEqual(embeddings.embedded_count, 50)
+
+    def test_fast_responses_grow_batches(self):
+        client = FakeEmbeddingClient()
+        embeddings = get_embeddings(client)
+
+        embeddings.embed_documents(["text"] * 100)
+
+        self.assertGreater(max(len(batch) for batch in client.batches), 4)
+        self.assertLessEqual(max(len(batch) for batch in client.batches), 16)
+        self.assertGreater(embeddings.concurrency, 2)
+
+    def test_rate_limit_shrinks_batches_and_retries(self):
+        client = FakeEmbeddingClient(rate_limit=1)
+        embeddings = get_embeddings(client, concurrency=1)
+
+        vectors = embeddings.embed_documents(["ab"] * 8)
+
+        self.assertEqual(vectors, [[2.0]] * 8)
+        self.assertEqual(embeddings.rate_limited_count, 1)
+        self.assertEqual(len(client.batches[0]), 4)
+
+    def test_gives_up_after_max_retries(self):
+        embeddings = get_embeddings(FakeEmbeddingClient(rate_limit=10))
+
+        with self.assertRaises(RateLimited):
+            embeddings.embed_documents(["text"])
+
+    def test_embed_query(self):
+        embeddings = get_embeddings(FakeEmbeddingClient())
+
+        self.assertEqual(embeddings.embed_query("abc"), [3.0])
+
+
+@override_settings(AI_EMBEDDING_MODEL="new", AI_EMBEDDING_CACHE_RETENTION=3600)
+class EmbeddingCacheTests(TestCase):
+    def test_unused_embeddings_are_deleted(self):
+        kept = EmbeddingCache.objects.create(
+            content_hash="a", model="new", embedding=[1.0]
+        )
+        EmbeddingCache.objects.create(
+            content_hash="a", model="old", embedding=[1.0]
+        )
+        EmbeddingCache.objects.create(
+            content_hash="b",
+            model="new",
+            embedding=[1.0],
+            last_used_at=timezone.now() - timedelta(hours=2),
+        )
+        self.assertEqual(EmbeddingCache.delete_unused(), 2)
+        self.assertEqual(list(EmbeddingCache.objects.all()), [kept])
+
+    def test_lookups_record_when_embeddings_were_used(self):
+        store = EmbeddingCacheStore("new")
+        store.mset([("text", [1.0])])
+        used_at = timezone.now() - timedelta(days=2)
+        EmbeddingCache.objects.update(last_used_at=used_at)
+        self.assertEqual(store.mget(["text", "other"]), [[1.0], None])
+        self.assertGreater(EmbeddingCache.objects.get().last_used_at, used_at)
@@ -0,0 +1,24 @@
+from assetchat.common import get_collection_name
+from assetchat.file_deletion import get_collection_folders
+from core.tests.factories import UserFactory
+from django.test import TestCase
+from filemanager.tests.factories import FolderFactory
+
+
+class CollectionFoldersTests(TestCase):
+    def create_ai_folder(self, user, asset_title):
+        asset = FolderFactory(created_by=user, title=asset_title)
+        return FolderFactory(created_by=user, title="AI", parent=asset)
+
+    def test_shared_collection_names_map_to_no_folder(self):
+        user = UserFactory()
+        first = self.create_ai_folder(user, "Boat")
+        second = self.create_ai_folder(user, "Boat")
+        other = self.create_ai_folder(user, "House")
+        with self.assertLogs("assetchat.file_deletion", "WARNING"):
+            mapping = get_collection_folders()
+        self.assertEqual(
+            get_collection_name(first), get_collection_name(second)
+        )
+        self.assertIsNone(mapping[get_collection_name(first)])
+        self.assertEqual(mapping[get_collection_name(other)], other.pk)
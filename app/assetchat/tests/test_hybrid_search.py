@@ -0,0 +1,44 @@
+from assetchat.hybrid_search import (
+    IDENTIFIER_QUERY,
+    PASSAGE_QUERY,
+    get_benchmark_queries,
+    reciprocal_rank_fusion,
+)
+from django.test import SimpleTestCase
+from langchain.schema import Document
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_documents_found_by_both_searches_rank_first(self):
+        a, b, c = (Document(page_content=text) for text in "abc")
+        fused = reciprocal_rank_fusion([[a, b], [c, b]])
+        self.assertEqual(
+            [document.page_content for document in fused], ["b", "a", "c"]
+        )
+
+    def test_documents_are_matched_by_content_and_metadata(self):
+        first = Document(page_content="a", metadata={"file_id": 1})
+        second = Document(page_content="a", metadata={"file_id": 2})
+        fused = reciprocal_rank_fusion(
+            [[first], [Document(page_content="a", metadata={"file_id": 1})]]
+        )
+        self.assertEqual(fused, [first])
+        self.assertEqual(len(reciprocal_rank_fusion([[first], [second]])), 2)
+
+
+class BenchmarkQueryTests(SimpleTestCase):
+    def test_identifier_query_matches_any_chunk_with_the_identifier(self):
+        queries = dict(
+            (kind, (query, is_relevant))
+            for kind, query, is_relevant in get_benchmark_queries(
+                "Replace the filter of model XR-200 every month."
+            )
+        )
+        query, is_relevant = queries[IDENTIFIER_QUERY]
+        self.assertIn("XR-200", query)
+        self.assertTrue(is_relevant("The xr-200 manual."))
+        self.assertFalse(is_relevant("The XR-300 manual."))
+
+    def test_chunks_without_identifiers_only_get_passage_queries(self):
+        queries = get_benchmark_queries("Replace the filter every month.")
+        self.assertEqual([kind for kind, _, _ in queries], [PASSAGE_QUERY])
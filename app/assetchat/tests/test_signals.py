@@ -0,0 +1,30 @@
+from assetchat.models import TrainingState
+from core.tests.factories import UserFactory
+from django.test import TestCase
+from filemanager.tests.factories import FileFactory, FolderFactory
+
+
+class FileMoveTests(TestCase):
+    def setUp(self):
+        user = UserFactory()
+        self.source = FolderFactory(created_by=user, title="AI")
+        self.target = FolderFactory(created_by=user, title="AI")
+        self.file = FileFactory(created_by=user, folder=self.source)
+        TrainingState.for_folder(self.source)
+        TrainingState.for_folder(self.target)
+
+    def get_pending_counts(self) -> list:
+        return [
+            TrainingState.for_folder(folder).pending_count
+            for folder in [self.source, self.target]
+        ]
+
+    def test_moving_a_file_recounts_both_folders(self):
+        self.file.folder = self.target
+        self.file.save()
+        self.assertEqual(self.get_pending_counts(), [0, 1])
+
+    def test_saves_without_the_folder_dont_recount(self):
+        self.file.folder = self.target
+        self.file.save(update_fields=["file_name"])
+        self.assertEqual(self.get_pending_counts(), [1, 0])
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from assetchat.streaming import ClientDisconnected, question_stream_app
+from django.test import SimpleTestCase, override_settings
+
+PATH = "/asset-ai/stream-question/1/"
+ORIGIN = b"https://app.folderr.com"
+DATA = {"question": "How?", "session_id": "abc", "temperature": 0}
+
+
+def get_scope(method="POST", headers=None):
+    return {
+        "type": "http",
+        "method": method,
+        "path": PATH,
+        "headers": headers or [],
+    }
+
+
+def get_events(messages) -> list:
+    body = b"".join(
+        message.get("body", b"")
+        for message in messages
+        if message["type"] == "http.response.body"
+    )
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append(
+            (event.removeprefix("event: "), json.loads(data[len("data: ") :]))
+        )
+    return events
+
+
+class QuestionStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.messages = []
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        if not hasattr(self, "body_sent"):
+            self.body_sent = True
+            return {"type": "http.request", "body": json.dumps(DATA).encode()}
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    async def test_other_methods_are_not_allowed(self):
+        await question_stream_app(get_scope("GET"), self.receive, self.send)
+        self.assertEqual(self.messages[0]["status"], 405)
+
+    @override_settings(
+        CORS_ALLOW_ALL_ORIGINS=True, CORS_ALLOW_CREDENTIALS=True
+    )
+    async def test_preflight_requests_get_cors_headers(self):
+        scope = get_scope(
+            "OPTIONS",
+            [
+                (b"origin", ORIGIN),
+                (b"access-control-request-method", b"POST"),
+                (b"access-control-request-headers", b"authorization"),
+            ],
+        )
+        await question_stream_app(scope, self.receive, self.send)
+        self.assertEqual(self.messages[0]["status"], 200)
+        headers = dict(self.messages[0]["headers"])
+        self.assertEqual(headers[b"access-control-allow-origin"], ORIGIN)
+        self.assertEqual(headers[b"access-control-allow-credentials"], b"true")
+        self.assertIn(b"POST", headers[b"access-control-allow-methods"])
+        self.assertIn(
+            b"authorization", headers[b"access-control-allow-headers"]
+        )
+
+    @override_settings(CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=[])
+    async def test_other_origins_get_no_cors_headers(self):
+        scope = get_scope("POST", [(b"origin", ORIGIN)])
+        await question_stream_app(scope, self.receive, self.send)
+        self.assertNotIn(
+            b"access-control-allow-origin", dict(self.messages[0]["headers"])
+        )
+
+    @override_settings(CORS_ALLOW_ALL_ORIGINS=True)
+    async def test_requests_without_a_token_are_rejected(self):
+        scope = get_scope("POST", [(b"origin", ORIGIN)])
+        await question_stream_app(scope, self.receive, self.send)
+        self.assertEqual(self.messages[0]["status"], 401)
+        self.assertEqual(
+            dict(self.messages[0]["headers"])[b"access-control-allow-origin"],
+            ORIGIN,
+        )
+
+    @patch("assetchat.streaming.prepare_question", return_value=(None, DATA))
+    async def test_tokens_are_streamed_as_events(self, mock_prepare):
+        def answer_question(*args, callbacks, **kwargs):
+            for token in ["Hel", "lo"]:
+                callbacks[0].on_llm_new_token(token)
+            return {"answer": "Hello"}
+
+        scope = get_scope("POST", [(b"origin", ORIGIN)])
+        with patch("assetchat.streaming.answer_question", answer_question):
+            await question_stream_app(scope, self.receive, self.send)
+        self.assertEqual(self.messages[0]["status"], 200)
+        self.assertEqual(
+            dict(self.messages[0]["headers"])[b"access-control-allow-origin"],
+            ORIGIN,
+        )
+        self.assertEqual(
+            get_events(self.messages),
+            [
+                ("token", {"token": "Hel"}),
+                ("token", {"token": "lo"}),
+                ("done", {"answer": "Hello"}),
+            ],
+        )
+
+    @patch("assetchat.streaming.prepare_question", return_value=(None, DATA))
+    async def test_disconnecting_stops_the_chain(self, mock_prepare):
+        stopped = threading.Event()
+
+        def answer_question(*args, callbacks, **kwargs):
+            try:
+                for i in range(500):
+                    callbacks[0].on_llm_new_token(str(i))
+                    time.sleep(0.01)
+            except ClientDisconnected:
+                stopped.set()
+                raise
+            return {"answer": "Too late"}
+
+        async def send(message):
+            self.messages.append(message)
+            if message.get("more_body"):
+                self.disconnected.set()
+
+        with patch("assetchat.streaming.answer_question", answer_question):
+            await question_stream_app(get_scope(), self.receive, send)
+            self.assertTrue(await asyncio.to_thread(stopped.wait, 5))
+        events = get_events(self.messages)
+        self.assertNotIn("done", [event for event, _ in events])
+        self.assertLess(len(events), 500)
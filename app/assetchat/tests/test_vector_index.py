@@ -0,0 +1,77 @@
+from assetchat.vector_index import search
+from django.test import SimpleTestCase, override_settings
+
+
+class FakeCursor:
+    """Cursor over vectors of several collections sharing one index.
+
+    The approximate scan only sees the ``candidates`` nearest vectors of
+    every collection before they're filtered, like a shared ANN index.
+    """
+
+    def __init__(self, vectors, candidates):
+        self.vectors = vectors
+        self.candidates = candidates
+        self.exact = False
+        self.statements = []
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        if "enable_indexscan = off" in sql:
+            self.exact = True
+        if params is None:
+            return
+        _, collection_name, _, k = params
+        vectors = sorted(self.vectors, key=lambda vector: vector[2])
+        if not self.exact:
+            vectors = vectors[: self.candidates]
+        self.rows = [
+            (document, {}, distance)
+            for document, collection, distance in vectors
+            if collection == collection_name
+        ][:k]
+
+    def fetchall(self):
+        return self.rows
+
+
+@override_settings(AI_VECTOR_EF_SEARCH=40, AI_VECTOR_OVERSAMPLE=10)
+class SearchTests(SimpleTestCase):
+    def setUp(self):
+        # The vectors of "boat" are all further from the query than those
+        # of the other collections.
+        self.vectors = [
+            (f"{collection} {i}", collection, offset + i / 100)
+            for offset, collection in enumerate(["house", "car", "boat"])
+            for i in range(50)
+        ]
+
+    def test_approximate_search_with_enough_results_isnt_repeated(self):
+        cursor = FakeCursor(self.vectors, candidates=100)
+        rows = search(cursor, [0.1, 0.2], "house", 4, exact=False)
+        self.assertEqual(
+            [row[0] for row in rows], [f"house {i}" for i in range(4)]
+        )
+        self.assertFalse(cursor.exact)
+        self.assertIn("SET LOCAL hnsw.ef_search = 40", cursor.statements)
+
+    def test_oversampling_raises_ef_search(self):
+        cursor = FakeCursor(self.vectors, candidates=100)
+        search(cursor, [0.1, 0.2], "house", 8, exact=False)
+        self.assertIn("SET LOCAL hnsw.ef_search = 80", cursor.statements)
+
+    def test_search_falls_back_to_exact_when_other_collections_win(self):
+        cursor = FakeCursor(self.vectors, candidates=100)
+        rows = search(cursor, [0.1, 0.2], "boat", 4, exact=False)
+        self.assertEqual(
+            [row[0] for row in rows], [f"boat {i}" for i in range(4)]
+        )
+        self.assertTrue(cursor.exact)
+
+    def test_exact_search_skips_the_index(self):
+        cursor = FakeCursor(self.vectors, candidates=100)
+        rows = search(cursor, [0.1, 0.2], "car", 4, exact=True)
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(cursor.exact)
+        self.assertNotIn("SET LOCAL hnsw.ef_search = 40", cursor.statements)
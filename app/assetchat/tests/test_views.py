@@ -0,0 +1,57 @@
+import json
+
+from assetchat.chat_memory import CHAT_HISTORY_TABLE
+from assetchat.models import Chat
+from core.tests.factories import UserFactory
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from filemanager.tests.factories import FolderFactory
+from rest_framework.test import APIClient
+
+
+class ChatHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.api_client = APIClient()
+
+    def setUp(self):
+        user = UserFactory()
+        folder = FolderFactory(created_by=user, title="AI")
+        self.chat = Chat.objects.create(user=user, folder=folder, name="Car")
+        self.api_client.force_authenticate(user)
+        messages = [("human", "Hi"), ("ai", "Hello"), ("human", "Bye")]
+        with connection.cursor() as cursor:
+            for message_type, content in messages:
+                message = {"type": message_type, "data": {"content": content}}
+                cursor.execute(
+                    f"""INSERT INTO {CHAT_HISTORY_TABLE} (session_id, message)
+                    VALUES (%s, %s)""",
+                    [str(self.chat.session_id), json.dumps(message)],
+                )
+        self.url = reverse("assetchat:chat-history", args=[self.chat.pk])
+
+    def test_without_paging_every_message_is_returned_oldest_first(self):
+        response = self.api_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [["human", "Hi"], ["ai", "Hello"], ["human", "Bye"]],
+        )
+
+    def test_pages_are_returned_newest_first(self):
+        response = self.api_client.get(self.url, {"limit": 2})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(
+            [message["content"] for message in page["results"]],
+            ["Bye", "Hello"],
+        )
+        response = self.api_client.get(
+            self.url, {"limit": 2, "cursor": page["next_cursor"]}
+        )
+        page = response.json()
+        self.assertEqual(
+            [message["content"] for message in page["results"]], ["Hi"]
+        )
+        self.assertIsNone(page["next_cursor"])
@@ -25,5 +25,10 @@ urlpatterns = [
         views.training_required,
         name="training-required",
     ),
+    path(
+        "training-progress/<int:folder_pk>/",
+        views.training_progress,
+        name="training-progress",
+    ),
     path("usage-limit/", views.get_usage_limit, name="usage-limit"),
 ] + router.urls
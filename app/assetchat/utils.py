@@ -1,5 +1,5 @@
+from assetchat.models import TrainingState
+
+
 def check_training_required(folder):
-    for file in folder.files.all():
-        if not hasattr(file, "ai_processed"):
-            return True
-    return False
+    return TrainingState.for_folder(folder).training_required
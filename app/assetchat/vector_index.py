@@ -0,0 +1,208 @@
+import logging
+import statistics
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+log = logging.getLogger("assetchat.vector_index")
+
+INDEX_NAME = "langchain_pg_embedding_ann_idx"
+
+HNSW = "hnsw"
+IVFFLAT = "ivfflat"
+
+EXACT_SEARCH = "exact"
+APPROXIMATE_SEARCH = "approximate"
+
+
+def embedding_expression() -> str:
+    # langchain declares the column without a dimension, which can't be
+    # indexed, so the index and the queries both cast it.
+    return f"(embedding::vector({int(settings.AI_EMBEDDING_DIMENSIONS)}))"
+
+
+def get_create_index_sql(
+    method: str,
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    concurrently: bool = True,
+) -> str:
+    if method == HNSW:
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    elif method == IVFFLAT:
+        options = f"lists = {int(lists)}"
+    else:
+        raise ValueError(f"Unknown index method {method}.")
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}"
+        f"IF NOT EXISTS {INDEX_NAME} ON langchain_pg_embedding "
+        f"USING {method} ({embedding_expression()} vector_cosine_ops) "
+        f"WITH ({options})"
+    )
+
+
+def supports_hnsw(cursor) -> bool:
+    cursor.execute("SELECT 1 FROM pg_am WHERE amname = %s", [HNSW])
+    return cursor.fetchone() is not None
+
+
+def embedding_table_exists(cursor) -> bool:
+    cursor.execute("SELECT to_regclass('langchain_pg_embedding')")
+    return cursor.fetchone()[0] is not None
+
+
+def create_index(cursor, method: str, **options):
+    log.info("Creating %s index %s.", method, INDEX_NAME)
+    cursor.execute(get_create_index_sql(method, **options))
+
+
+def drop_index(cursor, concurrently: bool = True):
+    log.info("Dropping index %s.", INDEX_NAME)
+    cursor.execute(
+        f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}"
+        f"IF EXISTS {INDEX_NAME}"
+    )
+
+
+def get_index_status(cursor) -> Optional[dict]:
+    cursor.execute(
+        """SELECT am.amname, pg_relation_size(index.indexrelid),
+        index.indisvalid, pg_get_indexdef(index.indexrelid)
+        FROM pg_index index
+        JOIN pg_class class ON class.oid = index.indexrelid
+        JOIN pg_am am ON am.oid = class.relam
+        WHERE class.relname = %s""",
+        [INDEX_NAME],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    method, size, valid, definition = row
+    return {
+        "method": method,
+        "size": size,
+        "valid": valid,
+        "definition": definition,
+    }
+
+
+def set_search_options(cursor, k: int):
+    # Both settings only exist once pgvector is loaded, and SET LOCAL keeps
+    # them from leaking into other queries on a pooled connection. The index
+    # covers every collection and the collection is filtered after the scan,
+    # so the scan looks at several times more candidates than are needed.
+    ef_search = max(
+        int(settings.AI_VECTOR_EF_SEARCH),
+        int(k) * int(settings.AI_VECTOR_OVERSAMPLE),
+    )
+    cursor.execute(f"SET LOCAL hnsw.ef_search = {ef_search}")
+    cursor.execute(
+        f"SET LOCAL ivfflat.probes = {int(settings.AI_VECTOR_PROBES)}"
+    )
+
+
+def get_search_sql() -> str:
+    """Nearest neighbours in a collection, ordered by the indexed expression.
+
+    Takes the embedding, the collection name, the embedding again and the
+    number of results as parameters.
+    """
+    vector_type = f"vector({int(settings.AI_EMBEDDING_DIMENSIONS)})"
+    return f"""SELECT embedding.document, embedding.cmetadata,
+    {embedding_expression()} <=> CAST(%s AS {vector_type})
+    FROM langchain_pg_embedding embedding
+    JOIN langchain_pg_collection collection
+        ON collection.uuid = embedding.collection_id
+    WHERE collection.name = %s
+    ORDER BY {embedding_expression()} <=> CAST(%s AS {vector_type})
+    LIMIT %s"""
+
+
+def format_vector(vector) -> str:
+    return "[" + ",".join(str(float(value)) for value in vector) + "]"
+
+
+def search(cursor, vector, collection_name: str, k: int, exact: bool):
+    """Nearest ``k`` vectors of a collection.
+
+    An approximate search that finds fewer than ``k`` vectors, because most
+    candidates of the index belonged to other collections, is done again
+    exactly. So is one on a collection of fewer than ``k`` vectors.
+    """
+    vector = format_vector(vector)
+    params = [vector, collection_name, vector, k]
+    if not exact:
+        set_search_options(cursor, k)
+        cursor.execute(get_search_sql(), params)
+        rows = cursor.fetchall()
+        if len(rows) >= k:
+            return rows
+        log.debug(
+            "Approximate search found %d of %d vectors in %s.",
+            len(rows),
+            k,
+            collection_name,
+        )
+    cursor.execute("SET LOCAL enable_indexscan = off")
+    cursor.execute(get_search_sql(), params)
+    return cursor.fetchall()
+
+
+def benchmark(sample_size: int = 100, k: int = 4) -> dict:
+    """Compare approximate search against exact search.
+
+    Stored embeddings are used as queries against their own collection.
+    Returns the mean recall@k of the approximate results and the latency
+    percentiles of both searches in milliseconds.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT embedding.embedding::text, collection.name
+            FROM langchain_pg_embedding embedding
+            JOIN langchain_pg_collection collection
+                ON collection.uuid = embedding.collection_id
+            ORDER BY random() LIMIT %s""",
+            [sample_size],
+        )
+        samples = cursor.fetchall()
+    recalls = []
+    latencies = {EXACT_SEARCH: [], APPROXIMATE_SEARCH: []}
+    for vector, collection_name in samples:
+        results = {}
+        for mode in latencies:
+            # Each search gets its own transaction so SET LOCAL is undone.
+            with transaction.atomic(), connection.cursor() as cursor:
+                started_at = time.perf_counter()
+                rows = search(
+                    cursor,
+                    vector.strip("[]").split(","),
+                    collection_name,
+                    k,
+                    exact=mode == EXACT_SEARCH,
+                )
+                latencies[mode].append(
+                    (time.perf_counter() - started_at) * 1000
+                )
+            results[mode] = {(row[0], str(row[1])) for row in rows}
+        if results[EXACT_SEARCH]:
+            recalls.append(
+                len(results[EXACT_SEARCH] & results[APPROXIMATE_SEARCH])
+                / len(results[EXACT_SEARCH])
+            )
+    return {
+        "queries": len(samples),
+        "recall": statistics.mean(recalls) if recalls else None,
+        "latency": {
+            mode: get_percentiles(values) for mode, values in latencies.items()
+        },
+    }
+
+
+def get_percentiles(values: list[float]) -> dict:
+    if len(values) < 2:
+        return {"p50": values[0] if values else None, "p95": None}
+    quantiles = statistics.quantiles(values, n=20)
+    return {"p50": statistics.median(values), "p95": quantiles[18]}
@@ -1,15 +1,15 @@
-import json
-
-from assetchat.models import Chat
+from assetchat.chat_memory import get_history, get_history_page
+from assetchat.models import Chat, TrainingState
 from assetchat.permissions import CanChat
 from assetchat.serializers import (
+    ChatHistoryQuerySerializer,
     ChatSerializer,
     QuestionSerializer,
     TrainingSerializer,
+    TrainingStateSerializer,
 )
 from assetchat.tasks import ai_trainer_task, question_answering_task
 from assetchat.utils import check_training_required
-from django.db import connection
 from filemanager.utils import get_created_or_shared_folder
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes
@@ -69,6 +69,7 @@ def ask_question(request, folder_pk):
         folder_pk,
         serializer.validated_data["session_id"],
         float(serializer.validated_data["temperature"]),
+        serializer.validated_data.get("retrieval"),
     )
     return Response({"task_id": task_result.id})
 
@@ -85,18 +86,33 @@ class ChatViewset(viewsets.ModelViewSet):
 @api_view(http_method_names=["GET"])
 @permission_classes([IsAuthenticated])
 def chat_history(request, chat_pk):
+    """Messages of a chat.
+
+    Without ``cursor`` or ``limit``, every message is returned as a list of
+    ``[type, content]`` pairs, oldest first, like before pagination was
+    added. With either of them, a page of messages is returned, newest
+    first. Pass the ``next_cursor`` of a page as ``cursor`` to get the next
+    one.
+    """
     chat = get_object_or_404(request.user.document_chats.all(), pk=chat_pk)
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT message FROM langchain_chat_history WHERE session_id = %s",
-            [str(chat.session_id)],
-        )
-        rows = cursor.fetchall()
-        messages = []
-        for row in rows:
-            message = json.loads(row[0])
-            messages.append((message["type"], message["data"]["content"]))
-        return Response(messages)
+    if not {"cursor", "limit"} & request.query_params.keys():
+        return Response(get_history(chat.session_id))
+    serializer = ChatHistoryQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    limit = serializer.validated_data["limit"]
+    rows = get_history_page(
+        chat.session_id, serializer.validated_data.get("cursor"), limit + 1
+    )
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return Response(
+        {
+            "results": [
+                {"id": message_id, "type": message_type, "content": content}
+                for message_id, message_type, content in rows[:limit]
+            ],
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 @api_view(http_method_names=["GET"])
@@ -110,6 +126,18 @@ def training_required(request, folder_pk):
     return Response({"training_required": check_training_required(folder)})
 
 
+@api_view(http_method_names=["GET"])
+@permission_classes([IsAuthenticated])
+def training_progress(request, folder_pk):
+    folder = get_created_or_shared_folder(request.user, folder_pk)
+    if folder is None:
+        raise NotFound(detail="This folder doesn't exist.")
+    if folder.title != "AI":
+        raise ValidationError(detail=f"{folder.title} isn't an AI folder.")
+    state = TrainingState.for_folder(folder)
+    return Response(TrainingStateSerializer(state).data)
+
+
 @api_view(http_method_names=["GET"])
 @permission_classes([IsAuthenticated])
 def get_usage_limit(request):
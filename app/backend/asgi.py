@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up since it loads models.
+from assetchat.streaming import (  # noqa: E402
+    QUESTION_STREAM_PATH,
+    question_stream_app,
+)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and QUESTION_STREAM_PATH.match(scope["path"]):
+        await question_stream_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
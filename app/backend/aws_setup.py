@@ -1,4 +1,8 @@
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 
 import boto3
 from boto3.s3.transfer import TransferConfig
@@ -47,6 +51,72 @@ def initialize_download_storage_server():
         )
 
 
+_download_client = None
+_download_client_lock = threading.Lock()
+
+
+def get_download_storage_server():
+    """S3 client shared by every thread of the process to sign URLs.
+
+    Creating a client is slow, and boto3 clients are thread-safe.
+    """
+    global _download_client
+    if _download_client is None:
+        with _download_client_lock:
+            if _download_client is None:
+                _download_client = initialize_download_storage_server()
+    return _download_client
+
+
+def reset_download_storage_server():
+    global _download_client
+    _download_client = None
+
+
+# Forked worker processes create their own client.
+os.register_at_fork(after_in_child=reset_download_storage_server)
+
+
+class SignedURLCache:
+    """Least recently used presigned URLs by object key and disposition.
+
+    URLs are reused until ``AWS_URL_CACHE_MARGIN`` seconds before they
+    expire, so every URL handed out stays valid at least that long. At most
+    ``AWS_URL_CACHE_SIZE`` URLs are kept.
+    """
+
+    def __init__(self):
+        self.urls = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.urls.get(key)
+            if entry is None:
+                return None
+            url, reuse_until = entry
+            if time.monotonic() >= reuse_until:
+                del self.urls[key]
+                return None
+            self.urls.move_to_end(key)
+            return url
+
+    def set(self, key: tuple, url: str, expiration: int):
+        margin = min(settings.AWS_URL_CACHE_MARGIN, expiration // 2)
+        with self.lock:
+            self.urls[key] = (url, time.monotonic() + expiration - margin)
+            self.urls.move_to_end(key)
+            while len(self.urls) > settings.AWS_URL_CACHE_SIZE:
+                self.urls.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.urls.clear()
+
+
+signed_urls = SignedURLCache()
+
+
 def download_file(
     server, bucket_name, destination_path, expiration, allow_download=False
 ):
@@ -75,7 +145,11 @@ def download(destination_path, allow_download=False):
             if bucket_name is None:
                 log.warning("Empty bucket name")
                 return ""
-            storage_server = initialize_download_storage_server()
+            url_key = (destination_path, allow_download)
+            url = signed_urls.get(url_key)
+            if url is not None:
+                return url
+            storage_server = get_download_storage_server()
             expiration = get_expiration_ts()
             download_status, download_resp = download_file(
                 storage_server,
@@ -92,6 +166,7 @@ def download(destination_path, allow_download=False):
                     destination_path,
                 )
                 return ""
+            signed_urls.set(url_key, download_resp, expiration)
             return download_resp
         except Exception as e:
             log.exception(e)
@@ -101,6 +176,24 @@ def download(destination_path, allow_download=False):
         return f"http://{domain_name}/media/{destination_path}"
 
 
+def download_many(url_keys) -> dict:
+    """URLs of many objects, by ``(destination_path, allow_download)``.
+
+    Signing doesn't make requests, so with the shared client and the URL
+    cache the whole batch is signed in process.
+    """
+    url_keys = set(url_keys)
+    if settings.DEBUG is False and settings.TEST is False:
+        return {url_key: download(*url_key) for url_key in url_keys}
+    domain_name = Site.objects.first()
+    return {
+        (destination_path, allow_download): (
+            f"http://{domain_name}/media/{destination_path}"
+        )
+        for destination_path, allow_download in url_keys
+    }
+
+
 def extract_text(response, extract_by="LINE"):
     line_text = []
     if response.get("Blocks"):
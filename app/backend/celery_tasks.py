@@ -1,6 +1,8 @@
 import os
 
+from backend.task_queues import record_enqueued, record_wait
 from celery import Celery
+from celery.signals import before_task_publish, task_prerun
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
@@ -9,3 +11,6 @@ app = Celery("backend")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
+
+before_task_publish.connect(record_enqueued)
+task_prerun.connect(record_wait)
@@ -0,0 +1,192 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.storage import get_s3_key
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+
+log = logging.getLogger(__name__)
+
+
+class FetchedObject:
+    """A stored file read ahead into memory.
+
+    At most ``STORAGE_FETCH_SPOOL_SIZE`` bytes are read by the fetching
+    thread. The rest of a larger file is only requested when it's read, so
+    files waiting to be used don't hold a connection.
+    """
+
+    def __init__(self, field_file: FieldFile, size: int, data: bytes):
+        self.field_file = field_file
+        self.size = size
+        self.data = data
+
+    def chunks(self, chunk_size: int = None):
+        chunk_size = chunk_size or settings.STORAGE_READ_CHUNK_SIZE
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start : start + chunk_size]
+        if len(self.data) >= self.size:
+            return
+        stream = open_object(self.field_file, len(self.data))
+        try:
+            while chunk := stream.read(chunk_size):
+                yield chunk
+        finally:
+            stream.close()
+
+    def read(self) -> bytes:
+        return b"".join(self.chunks())
+
+
+def open_object(field_file: FieldFile, start: int = 0):
+    """Stream of a stored file's content from byte ``start`` on."""
+    storage = field_file.storage
+    if hasattr(storage, "bucket"):
+        response = storage.connection.meta.client.get_object(
+            Bucket=storage.bucket_name,
+            Key=get_s3_key(storage, field_file.name),
+            Range=f"bytes={start}-",
+        )
+        return response["Body"]
+    stream = storage.open(field_file.name, "rb")
+    stream.seek(start)
+    return stream
+
+
+def fetch_object(field_file: FieldFile) -> FetchedObject:
+    """Size of a stored file and up to a spool size of its content."""
+    spool_size = settings.STORAGE_FETCH_SPOOL_SIZE
+    storage = field_file.storage
+    if not hasattr(storage, "bucket"):
+        with storage.open(field_file.name, "rb") as stream:
+            return FetchedObject(
+                field_file,
+                storage.size(field_file.name),
+                stream.read(spool_size),
+            )
+    try:
+        response = storage.connection.meta.client.get_object(
+            Bucket=storage.bucket_name,
+            Key=get_s3_key(storage, field_file.name),
+            Range=f"bytes=0-{spool_size - 1}",
+        )
+    except ClientError as e:
+        # No range of an empty object can be satisfied.
+        if e.response["Error"]["Code"] == "InvalidRange":
+            return FetchedObject(field_file, 0, b"")
+        raise
+    try:
+        data = response["Body"].read()
+    finally:
+        response["Body"].close()
+    # "bytes 0-8388607/12345678", absent when the whole object was sent.
+    content_range = response.get("ContentRange")
+    size = (
+        int(content_range.rpartition("/")[2]) if content_range else len(data)
+    )
+    return FetchedObject(field_file, size, data)
+
+
+class ObjectFetcher:
+    """Fetches stored files with a pool of threads.
+
+    Up to ``STORAGE_FETCH_CONCURRENCY`` files are fetched at once, and
+    fetching stops while the files fetched but not yet used could hold
+    more than ``STORAGE_FETCH_MEMORY_BUDGET`` bytes. No connection is held
+    by a file waiting to be used. The number of files
+    and bytes fetched and the throughput are logged for the job when the
+    fetcher is closed.
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.concurrency = settings.STORAGE_FETCH_CONCURRENCY
+        # Files waiting to be used hold at most a spool size in memory each.
+        self.window = max(
+            1,
+            settings.STORAGE_FETCH_MEMORY_BUDGET
+            // settings.STORAGE_FETCH_SPOOL_SIZE,
+        )
+        self.executor = None
+        self.object_count = 0
+        self.byte_count = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def __enter__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="fetcher"
+        )
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown(cancel_futures=True)
+        self.executor = None
+        self.finished_at = time.perf_counter()
+        log.info(
+            "Fetched %d objects, %d bytes for %s at %.1f objects/sec, "
+            "%.0f bytes/sec.",
+            self.object_count,
+            self.byte_count,
+            self.job,
+            self.object_count / self.seconds if self.seconds else 0.0,
+            self.throughput,
+        )
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Bytes fetched per second while the fetcher was open."""
+        seconds = self.seconds
+        return self.byte_count / seconds if seconds else 0.0
+
+    @property
+    def counters(self) -> dict:
+        return {
+            "fetched_objects": self.object_count,
+            "fetched_bytes": self.byte_count,
+            "fetch_throughput": self.throughput,
+        }
+
+    def fetch(self, items, get_file=lambda item: item.file):
+        """Fetch the file of every item.
+
+        Yields ``(item, fetched_object, error)`` in the order of the items,
+        with either a ``FetchedObject`` or the error that fetching raised.
+        """
+        pending = deque()
+        items = iter(items)
+        try:
+            while True:
+                for item in items:
+                    pending.append(
+                        (
+                            item,
+                            self.executor.submit(fetch_object, get_file(item)),
+                        )
+                    )
+                    if len(pending) >= self.window:
+                        break
+                if not pending:
+                    return
+                item, future = pending.popleft()
+                try:
+                    fetched_object = future.result()
+                except Exception as e:
+                    yield item, None, e
+                    continue
+                self.object_count += 1
+                self.byte_count += fetched_object.size
+                yield item, fetched_object, None
+        finally:
+            # The consumer stopped early or raised. Fetches that haven't
+            # started are dropped instead of holding up the executor.
+            for _, future in pending:
+                future.cancel()
@@ -17,6 +17,7 @@ from pathlib import Path
 import environ
 from corsheaders.defaults import default_headers
 from django.core.exceptions import ImproperlyConfigured
+from kombu import Exchange, Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -223,6 +224,79 @@ CELERY_ACCEPT_CONTENT = ["application/json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
+# Tasks someone is waiting on run on the interactive queue, long running ones
+# on the bulk queue so they can't hold up the rest. Both queues order tasks
+# by priority, higher first. The default queue keeps its arguments because
+# RabbitMQ refuses to redeclare a queue with different ones.
+CELERY_TASK_QUEUES = [
+    Queue("celery", Exchange("celery"), routing_key="celery"),
+    Queue(
+        "interactive",
+        Exchange("interactive"),
+        routing_key="interactive",
+        queue_arguments={"x-max-priority": 10},
+    ),
+    Queue(
+        "bulk",
+        Exchange("bulk"),
+        routing_key="bulk",
+        queue_arguments={"x-max-priority": 10},
+    ),
+]
+CELERY_TASK_ROUTES = {
+    "assetchat.tasks.question_answering_task": {
+        "queue": "interactive",
+        "priority": 9,
+    },
+    "core.tasks.send_email_otp": {"queue": "interactive", "priority": 9},
+    "core.tasks.send_sms_otp": {"queue": "interactive", "priority": 9},
+    "core.tasks.task_otp_for_password_reset": {
+        "queue": "interactive",
+        "priority": 9,
+    },
+    "filemanager.tasks.generate_thumbnail_for_video": {
+        "queue": "bulk",
+        "priority": 6,
+    },
+    "core.tasks.fetch_mail_from_s3": {"queue": "bulk", "priority": 5},
+    "core.tasks.process_email_task": {"queue": "bulk", "priority": 5},
+    "assetchat.tasks.ai_trainer_task": {"queue": "bulk", "priority": 3},
+    "filemanager.tasks.zip_folder_contents": {"queue": "bulk", "priority": 3},
+    "assetchat.tasks.store_deleted_vector_task": {
+        "queue": "bulk",
+        "priority": 1,
+    },
+    "assetchat.tasks.purge_stale_vectors_task": {
+        "queue": "bulk",
+        "priority": 0,
+    },
+}
+# Workers only reserve the task they run, so a task sent with a higher
+# priority isn't stuck behind prefetched ones.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Bulk tasks a single user can run at once, see backend.task_queues.
+CELERY_USER_TASK_LIMIT = env.int("CELERY_USER_TASK_LIMIT", 2)
+CELERY_USER_TASK_RETRY_DELAY = env.int("CELERY_USER_TASK_RETRY_DELAY", 10)
+CELERY_USER_TASK_SLOT_TIMEOUT = env.int(
+    "CELERY_USER_TASK_SLOT_TIMEOUT", 60 * 60
+)
+
+# CACHE
+
+if TEST:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": env.str("DJANGO_CACHE_URL", "redis:///1"),
+        }
+    }
+
 # EMAIL
 
 DEFAULT_FROM_EMAIL = SERVER_EMAIL = env.str("DJANGO_DEFAULT_FROM_EMAIL")
@@ -263,6 +337,37 @@ AWS_STORAGE_BUCKET_NAME = env.str("AWS_STORAGE_BUCKET_NAME", "")
 AWS_S3_REGION_NAME = env.str("AWS_S3_REGION_NAME", "us-east-1")
 AWS_SNS_REGION_NAME = env.str("AWS_SNS_REGION_NAME", "us-east-1")
 AWS_URL_EXPIRATION = env.int("AWS_URL_EXPIRATION")
+# Presigned URLs kept per process, and seconds before they expire that
+# they're no longer handed out.
+AWS_URL_CACHE_SIZE = env.int("AWS_URL_CACHE_SIZE", 10000)
+AWS_URL_CACHE_MARGIN = env.int("AWS_URL_CACHE_MARGIN", 5 * 60)
+
+# Bytes read from the start of a file to detect its MIME type.
+MIME_SNIFF_BYTES = env.int("MIME_SNIFF_BYTES", 16 * 1024)
+
+# Size of the chunks stored files are streamed in, and of the parts of
+# streamed uploads. S3 parts must be at least 5 MB and an upload has at most
+# 10,000 parts.
+STORAGE_READ_CHUNK_SIZE = env.int("STORAGE_READ_CHUNK_SIZE", 1024 * 1024)
+STORAGE_UPLOAD_PART_SIZE = env.int(
+    "STORAGE_UPLOAD_PART_SIZE", 16 * 1024 * 1024
+)
+
+# Stored files fetched at once by exports, training and email processing.
+# Up to the spool size of every file is read ahead into memory, as long as
+# the files read ahead fit in the memory budget. The rest of larger files is
+# streamed when they're used.
+STORAGE_FETCH_CONCURRENCY = env.int("STORAGE_FETCH_CONCURRENCY", 8)
+STORAGE_FETCH_SPOOL_SIZE = env.int("STORAGE_FETCH_SPOOL_SIZE", 8 * 1024 * 1024)
+STORAGE_FETCH_MEMORY_BUDGET = env.int(
+    "STORAGE_FETCH_MEMORY_BUDGET", 128 * 1024 * 1024
+)
+
+# Seconds zip archives of folders are kept and reused for unchanged folders.
+ZIP_RETENTION = env.int("ZIP_RETENTION", 24 * 60 * 60)
+
+# Seconds requests to zip a folder share the task already zipping it.
+ZIP_TASK_TIMEOUT = env.int("ZIP_TASK_TIMEOUT", 60 * 60)
 
 # # SIWA
 # SIWA_CLIENT_ID = env.str("SIWA_CLIENT_ID")
@@ -538,8 +643,116 @@ FRONT_END_URL = env.str("FRONT_END_URL")
 
 OPENAI_SECRET_KEY = env.str("OPENAI_SECRET_KEY")
 
+AI_EMBEDDING_MODEL = env.str("AI_EMBEDDING_MODEL", "text-embedding-ada-002")
+
+AI_EMBEDDING_DIMENSIONS = env.int("AI_EMBEDDING_DIMENSIONS", 1536)
+
+# Seconds cached embeddings are kept after they were last used.
+AI_EMBEDDING_CACHE_RETENTION = env.int(
+    "AI_EMBEDDING_CACHE_RETENTION", 90 * 24 * 60 * 60
+)
+
+# Most tokens the embedding model accepts, chunks are never larger.
+AI_EMBEDDING_MAX_TOKENS = env.int("AI_EMBEDDING_MAX_TOKENS", 8191)
+
+AI_EMBEDDING_CLIENT = env.str(
+    "AI_EMBEDDING_CLIENT", "assetchat.embeddings.OpenAIEmbeddingClient"
+)
+
+AI_EMBEDDING_BATCH_SIZE = env.int("AI_EMBEDDING_BATCH_SIZE", 64)
+
+AI_EMBEDDING_MAX_BATCH_SIZE = env.int("AI_EMBEDDING_MAX_BATCH_SIZE", 512)
+
+AI_EMBEDDING_CONCURRENCY = env.int("AI_EMBEDDING_CONCURRENCY", 4)
+
+AI_EMBEDDING_MAX_CONCURRENCY = env.int("AI_EMBEDDING_MAX_CONCURRENCY", 16)
+
+AI_EMBEDDING_TARGET_LATENCY = env.float("AI_EMBEDDING_TARGET_LATENCY", 2.0)
+
+AI_EMBEDDING_MAX_RETRIES = env.int("AI_EMBEDDING_MAX_RETRIES", 8)
+
+# Chat model class used to answer questions, called with ChatOpenAI's
+# arguments.
+AI_CHAT_MODEL = env.str("AI_CHAT_MODEL", "langchain.chat_models.ChatOpenAI")
+
+# Answers reused for questions asked again about the same collection.
+
+AI_ANSWER_CACHE_ENABLED = env.bool("AI_ANSWER_CACHE_ENABLED", False)
+
+AI_ANSWER_CACHE_SIMILARITY = env.float("AI_ANSWER_CACHE_SIMILARITY", 0.95)
+
+AI_ANSWER_CACHE_TTL = env.int("AI_ANSWER_CACHE_TTL", 7 * 24 * 60 * 60)
+
+AI_ANSWER_CACHE_MAX_ENTRIES = env.int("AI_ANSWER_CACHE_MAX_ENTRIES", 500)
+
+# Chat history tokens kept verbatim before older messages are summarized.
+AI_CHAT_SUMMARY_TOKEN_LIMIT = env.int("AI_CHAT_SUMMARY_TOKEN_LIMIT", 1000)
+
+# Seconds between checks for prompts edited by other processes.
+AI_PROMPT_CACHE_CHECK_INTERVAL = env.int("AI_PROMPT_CACHE_CHECK_INTERVAL", 5)
+
+# Connection pool used by the vector store and chat history in each process.
+
+AI_DB_POOL_SIZE = env.int("AI_DB_POOL_SIZE", 5)
+
+AI_DB_MAX_OVERFLOW = env.int("AI_DB_MAX_OVERFLOW", 10)
+
+AI_DB_POOL_RECYCLE = env.int("AI_DB_POOL_RECYCLE", 1800)
+
+# Most vector stores, one per collection, kept by each process.
+AI_VECTOR_STORE_CACHE_SIZE = env.int("AI_VECTOR_STORE_CACHE_SIZE", 100)
+
+# Vector search. "exact" scans every vector of a collection, "approximate"
+# uses the index managed with `manage.py ai vector_index`.
+
+AI_VECTOR_SEARCH = env.str("AI_VECTOR_SEARCH", "exact")
+
+AI_VECTOR_EF_SEARCH = env.int("AI_VECTOR_EF_SEARCH", 100)
+
+AI_VECTOR_PROBES = env.int("AI_VECTOR_PROBES", 10)
+
+# Candidates an approximate search looks at per result wanted, since the
+# index is shared by every collection.
+
+AI_VECTOR_OVERSAMPLE = env.int("AI_VECTOR_OVERSAMPLE", 10)
+
+# Retrieval used to answer questions when a request doesn't pick one.
+# "hybrid" merges vector and full-text search results, "vector" only uses
+# vector search.
+
+AI_RETRIEVAL = env.str("AI_RETRIEVAL", "vector")
+
+AI_HYBRID_FETCH_K = env.int("AI_HYBRID_FETCH_K", 20)
+
+AI_HYBRID_RRF_K = env.int("AI_HYBRID_RRF_K", 60)
+
+# `manage.py ai benchmark` creates a user, files and vectors and trains
+# outside of any transaction, so it only runs against a database where this
+# is set, or under DJANGO_TEST. Never set it in production.
+
+AI_BENCHMARK_ENABLED = env.bool("AI_BENCHMARK_ENABLED", False)
+
 # AI usage limits
 
 FREE_USER_MAX_TRAINING = 5
 
 PLUS_USER_MAX_TRAINING = 100
+
+# AI training
+
+# Processes each training task loads documents with. Every task of a worker
+# starts its own pool, and workers run as many tasks as there are CPUs by
+# default, so keep this at about the CPU count divided by the concurrency of
+# the workers on the "bulk" queue.
+AI_LOADER_PROCESSES = env.int("AI_LOADER_PROCESSES", 2)
+
+AI_LOADER_TIMEOUT = env.int("AI_LOADER_TIMEOUT", 300)
+
+AI_LOADER_MAX_TASKS_PER_CHILD = env.int("AI_LOADER_MAX_TASKS_PER_CHILD", 20)
+
+AI_LOADER_PDF_PAGES_PER_PART = env.int("AI_LOADER_PDF_PAGES_PER_PART", 50)
+
+# Seconds the cached chunks of a file are kept after they were last used.
+AI_CHUNK_CACHE_RETENTION = env.int(
+    "AI_CHUNK_CACHE_RETENTION", 90 * 24 * 60 * 60
+)
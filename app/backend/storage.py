@@ -0,0 +1,146 @@
+import logging
+import tempfile
+
+import magic
+from django.conf import settings
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+
+log = logging.getLogger(__name__)
+
+
+def get_s3_key(storage, name: str) -> str:
+    return storage._normalize_name(storage._clean_name(name))
+
+
+def read_header(field_file: FieldFile, size: int = None) -> bytes:
+    """Read the first ``size`` bytes of a stored file.
+
+    Files on S3 are read with a ranged GET, since opening them through the
+    storage downloads the whole object first.
+    """
+    size = size or settings.MIME_SNIFF_BYTES
+    storage = field_file.storage
+    if hasattr(storage, "bucket"):
+        key = get_s3_key(storage, field_file.name)
+        response = storage.connection.meta.client.get_object(
+            Bucket=storage.bucket_name, Key=key, Range=f"bytes=0-{size - 1}"
+        )
+        return response["Body"].read()
+    with storage.open(field_file.name, "rb") as fp:
+        return fp.read(size)
+
+
+def sniff_mime_type(field_file: FieldFile) -> str:
+    mime_type = magic.from_buffer(read_header(field_file), mime=True)
+    log.debug("Sniffed %s as %s.", field_file.name, mime_type)
+    return mime_type
+
+
+class S3MultipartUpload:
+    """Write-only file object uploading to S3 in parts as it's written.
+
+    At most one part is held in memory. The object only appears in the
+    bucket once ``close`` completes the upload; ``abort`` discards the
+    parts uploaded so far.
+    """
+
+    def __init__(self, client, bucket_name: str, key: str, **params):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = settings.STORAGE_UPLOAD_PART_SIZE
+        self.upload_id = client.create_multipart_upload(
+            Bucket=bucket_name, Key=key, **params
+        )["UploadId"]
+        self.parts = []
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(self.buffer[: self.part_size])
+            del self.buffer[: self.part_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        # Parts other than the last have a minimum size, so data is only
+        # sent once a full part was written.
+        pass
+
+    def upload_part(self, data):
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(data),
+        )
+        self.parts.append(
+            {"ETag": response["ETag"], "PartNumber": part_number}
+        )
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buffer or not self.parts:
+            self.upload_part(self.buffer)
+            self.buffer = bytearray()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+        self.closed = True
+        log.info(
+            "Uploaded %s in %d parts, %d bytes.",
+            self.key,
+            len(self.parts),
+            self.position,
+        )
+
+    def abort(self):
+        if self.closed:
+            return
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id
+        )
+        self.closed = True
+
+
+def save_stream(storage, name: str, write, content_type: str = None) -> str:
+    """Save what ``write`` writes to the file object it's called with.
+
+    On S3 the data is uploaded while it's written, so neither memory nor
+    disk use grows with its size. Other storages get a temporary file that
+    is saved once ``write`` returns. Returns the name the file was saved as.
+    """
+    if hasattr(storage, "bucket"):
+        params = {"ContentType": content_type} if content_type else {}
+        upload = S3MultipartUpload(
+            storage.connection.meta.client,
+            storage.bucket_name,
+            get_s3_key(storage, name),
+            **params,
+        )
+        try:
+            write(upload)
+            upload.close()
+        except BaseException:
+            upload.abort()
+            raise
+        return name
+    with tempfile.SpooledTemporaryFile(
+        max_size=settings.STORAGE_UPLOAD_PART_SIZE
+    ) as fp:
+        write(fp)
+        fp.seek(0)
+        return storage.save(name, File(fp))
@@ -0,0 +1,137 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from celery import current_app, current_task
+from django.conf import settings
+from django.core.cache import cache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = "celery"
+INTERACTIVE_QUEUE = "interactive"
+BULK_QUEUE = "bulk"
+QUEUES = [INTERACTIVE_QUEUE, BULK_QUEUE, DEFAULT_QUEUE]
+
+# Wait times are kept per minute for an hour.
+WAIT_BUCKET_TIMEOUT = 60 * 60
+
+
+@contextmanager
+def user_task_slot(user_id: int):
+    """Hold one of a user's ``CELERY_USER_TASK_LIMIT`` task slots.
+
+    When all of the user's slots are taken, the running task is retried
+    after ``CELERY_USER_TASK_RETRY_DELAY`` seconds. The worker holds the
+    retried task without counting it against its prefetch limit, so other
+    users' tasks keep running meanwhile, but the task isn't put behind the
+    ones queued since. Tasks called directly instead of by a worker aren't
+    limited.
+    """
+    if current_task is None or current_task.request.called_directly:
+        yield
+        return
+    key = f"celery:user_tasks:{user_id}"
+    try:
+        cache.add(key, 0, timeout=settings.CELERY_USER_TASK_SLOT_TIMEOUT)
+        slots_taken = cache.incr(key)
+        if slots_taken > settings.CELERY_USER_TASK_LIMIT:
+            cache.decr(key)
+        else:
+            # Slots of workers that died are freed when the key expires.
+            cache.touch(key, settings.CELERY_USER_TASK_SLOT_TIMEOUT)
+    except Exception:
+        # Tasks run without the limit rather than not at all while the
+        # cache is unavailable.
+        log.warning(
+            "Couldn't take a task slot for user %d.", user_id, exc_info=True
+        )
+        slots_taken = None
+    if slots_taken is None:
+        yield
+        return
+    if slots_taken > settings.CELERY_USER_TASK_LIMIT:
+        log.info(
+            "User %d is at the task limit, retrying %s later.",
+            user_id,
+            current_task.name,
+        )
+        raise current_task.retry(
+            countdown=settings.CELERY_USER_TASK_RETRY_DELAY, max_retries=None
+        )
+    try:
+        yield
+    finally:
+        try:
+            cache.decr(key)
+        except ValueError:
+            # The key expired while the task ran.
+            pass
+        except Exception:
+            log.warning(
+                "Couldn't free a task slot of user %d.",
+                user_id,
+                exc_info=True,
+            )
+
+
+def get_wait_keys(queue: str, minute: int) -> tuple[str, str]:
+    prefix = f"celery:queue_wait:{queue}:{minute}"
+    return f"{prefix}:count", f"{prefix}:ms"
+
+
+def record_enqueued(headers=None, **kwargs):
+    # Retries keep the original time, so waits include time spent waiting
+    # for a slot.
+    headers.setdefault("enqueued_at", time.time())
+
+
+def record_wait(task=None, **kwargs):
+    request = task.request
+    enqueued_at = getattr(request, "enqueued_at", None)
+    if enqueued_at is None:
+        return
+    now = time.time()
+    queue = (request.delivery_info or {}).get("routing_key", DEFAULT_QUEUE)
+    count_key, wait_key = get_wait_keys(queue, int(now // 60))
+    cache.add(count_key, 0, timeout=WAIT_BUCKET_TIMEOUT)
+    cache.add(wait_key, 0, timeout=WAIT_BUCKET_TIMEOUT)
+    cache.incr(count_key)
+    cache.incr(wait_key, max(0, int((now - enqueued_at) * 1000)))
+
+
+def get_queue_stats(window: int = 5) -> dict:
+    """Depth, consumers and mean wait time of every queue.
+
+    The wait time is how long tasks that started in the last ``window``
+    minutes waited between being sent and starting, in milliseconds.
+    """
+    stats = {}
+    minute = int(time.time() // 60)
+    with current_app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for queue in QUEUES:
+            try:
+                _, depth, consumers = channel.queue_declare(
+                    queue=queue, passive=True
+                )
+            except Exception as e:
+                # Passive declarations fail for queues no worker declared.
+                log.debug("Couldn't inspect queue %s: %s", queue, e)
+                channel = connection.channel()
+                depth = consumers = None
+            keys = [
+                key
+                for past_minute in range(minute - window + 1, minute + 1)
+                for key in get_wait_keys(queue, past_minute)
+            ]
+            values = cache.get_many(keys)
+            count = sum(values.get(key, 0) for key in keys[::2])
+            wait = sum(values.get(key, 0) for key in keys[1::2])
+            stats[queue] = {
+                "depth": depth,
+                "consumers": consumers,
+                "started": count,
+                "mean_wait_ms": wait / count if count else None,
+            }
+    return stats
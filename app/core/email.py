@@ -1,6 +1,7 @@
 import logging
 import tempfile
 
+from backend.fetching import ObjectFetcher
 from core.models import FolderrEmail
 from django.core.files import File as DjangoFile
 from filemanager.models import File
@@ -17,23 +18,30 @@ def process_email(pk: int, force=False):
     folderr_email = FolderrEmail.objects.get(pk=pk)
     log.info("Processing FolderrEmail %d", pk)
     if folderr_email.status == folderr_email.PROCESSING and force is False:
-        for attachment in folderr_email.attachments.all():
-            with tempfile.NamedTemporaryFile("wb+") as file_fp:
-                for chunk in attachment.file.chunks():
-                    file_fp.write(chunk)
-                file_fp.seek(0)
-                django_file = DjangoFile(file=file_fp, name=attachment.title)
-                file = File.objects.create(
-                    file_name=attachment.title,
-                    folder=folderr_email.asset,
-                    file=django_file,
-                    created_by=folderr_email.user,
-                )
-                log.info(
-                    "Created file %d from attachment %d",
-                    file.pk,
-                    attachment.pk,
-                )
+        with ObjectFetcher(f"FolderrEmail {pk}") as fetcher:
+            for attachment, fetched_object, error in fetcher.fetch(
+                folderr_email.attachments.all()
+            ):
+                if error is not None:
+                    raise error
+                with tempfile.NamedTemporaryFile("wb+") as file_fp:
+                    for chunk in fetched_object.chunks():
+                        file_fp.write(chunk)
+                    file_fp.seek(0)
+                    django_file = DjangoFile(
+                        file=file_fp, name=attachment.title
+                    )
+                    file = File.objects.create(
+                        file_name=attachment.title,
+                        folder=folderr_email.asset,
+                        file=django_file,
+                        created_by=folderr_email.user,
+                    )
+                    log.info(
+                        "Created file %d from attachment %d",
+                        file.pk,
+                        attachment.pk,
+                    )
         folderr_email.status = folderr_email.PROCESSED
         folderr_email.save()
     else:
@@ -0,0 +1,26 @@
+from argparse import ArgumentParser
+
+from backend.task_queues import get_queue_stats
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Show the depth and wait time of every Celery queue."
+
+    def add_arguments(self, parser: ArgumentParser):
+        parser.add_argument(
+            "--window",
+            type=int,
+            default=5,
+            help="Minutes of started tasks the mean wait is computed over.",
+        )
+
+    def handle(self, *args, **options):
+        for queue, stats in get_queue_stats(options["window"]).items():
+            mean_wait = stats["mean_wait_ms"]
+            self.stdout.write(
+                f"{queue}: {stats['depth']} waiting, "
+                f"{stats['consumers']} consumers, {stats['started']} started, "
+                f"mean wait "
+                f"{'n/a' if mean_wait is None else f'{mean_wait:.0f} ms'}."
+            )
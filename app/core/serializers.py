@@ -2,7 +2,7 @@ import logging
 from datetime import datetime
 
 import pyotp
-from backend.aws_setup import download
+from backend.aws_setup import download, download_many
 from core.models import (
     SMS2FA,
     TOTP,
@@ -15,6 +15,7 @@ from core.tasks import send_email
 from core.utils import recaptcha_valid
 from django.conf import settings
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db.models import Manager
 from django.utils import timezone
 from django.utils.encoding import smart_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
@@ -28,6 +29,45 @@ from rest_framework_simplejwt.serializers import (
 log = logging.getLogger(__name__)
 
 
+class SignedURLListSerializer(serializers.ListSerializer):
+    """Signs the URLs of every item before any of them is rendered.
+
+    The child serializer has to use ``SignedURLMixin``.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        items = list(data)
+        self.child.signed_urls = download_many(
+            url_key
+            for item in items
+            for url_key in self.child.get_url_keys(item)
+        )
+        return super().to_representation(items)
+
+
+class SignedURLMixin:
+    """URLs of stored files for serializers, signed in bulk for lists.
+
+    Serializers list the ``(name, allow_download)`` pairs an instance needs
+    in ``get_url_keys``, render them with ``get_url`` and set
+    ``list_serializer_class = SignedURLListSerializer`` in their ``Meta``.
+    """
+
+    signed_urls = None
+
+    def get_url_keys(self, instance) -> list:
+        return []
+
+    def get_url(self, name: str, allow_download: bool = False) -> str:
+        if self.signed_urls is not None:
+            url = self.signed_urls.get((name, allow_download))
+            if url is not None:
+                return url
+        return download(name, allow_download)
+
+
 class UserSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         rep = super().to_representation(instance)
@@ -356,11 +396,16 @@ class UserSearchSerializer(serializers.ModelSerializer):
         fields = ["id", "email", "avatar", "first_name", "last_name"]
 
 
-class FolderrEmailAttachmentSerializer(serializers.ModelSerializer):
+class FolderrEmailAttachmentSerializer(
+    SignedURLMixin, serializers.ModelSerializer
+):
+    def get_url_keys(self, instance) -> list:
+        return [(instance.file.name, True), (instance.thumbnail.name, True)]
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep["file"] = download(instance.file.name, allow_download=True)
-        rep["thumbnail"] = download(
+        rep["file"] = self.get_url(instance.file.name, allow_download=True)
+        rep["thumbnail"] = self.get_url(
             instance.thumbnail.name, allow_download=True
         )
         return rep
@@ -368,6 +413,7 @@ class FolderrEmailAttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = FolderrEmailAttachment
         exclude = ["email"]
+        list_serializer_class = SignedURLListSerializer
 
 
 class FolderrEmailSerializer(serializers.ModelSerializer):
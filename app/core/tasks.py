@@ -6,6 +6,7 @@ import time
 from io import BytesIO
 
 import boto3
+from backend.task_queues import user_task_slot
 from celery import shared_task
 from core.email import process_email
 from core.models import SMS2FA, Email2FA, FolderrEmail, FolderrEmailAttachment
@@ -180,7 +181,8 @@ def process_email_task(pk):
         email.refresh_from_db()
         retry_count += 1
 
-    process_email(pk)
+    with user_task_slot(email.user_id):
+        process_email(pk)
 
 
 @shared_task
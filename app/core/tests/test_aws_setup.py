@@ -0,0 +1,27 @@
+from unittest.mock import patch
+
+from backend.aws_setup import SignedURLCache
+from django.test import SimpleTestCase, override_settings
+
+
+@override_settings(AWS_URL_CACHE_SIZE=2, AWS_URL_CACHE_MARGIN=60)
+class SignedURLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SignedURLCache()
+
+    def test_urls_are_reused_until_close_to_expiring(self):
+        with patch("backend.aws_setup.time.monotonic", return_value=0):
+            self.cache.set(("a.pdf", False), "url", 600)
+        with patch("backend.aws_setup.time.monotonic", return_value=539):
+            self.assertEqual(self.cache.get(("a.pdf", False)), "url")
+        with patch("backend.aws_setup.time.monotonic", return_value=540):
+            self.assertIsNone(self.cache.get(("a.pdf", False)))
+
+    def test_least_recently_used_urls_are_evicted(self):
+        self.cache.set(("a.pdf", False), "a", 600)
+        self.cache.set(("b.pdf", False), "b", 600)
+        self.cache.get(("a.pdf", False))
+        self.cache.set(("a.pdf", True), "a-download", 600)
+        self.assertIsNone(self.cache.get(("b.pdf", False)))
+        self.assertEqual(self.cache.get(("a.pdf", False)), "a")
+        self.assertEqual(self.cache.get(("a.pdf", True)), "a-download")
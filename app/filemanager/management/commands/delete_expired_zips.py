@@ -0,0 +1,10 @@
+from django.core.management import BaseCommand
+from filemanager.models import ZippedFolder
+
+
+class Command(BaseCommand):
+    help = "Delete zip archives of folders older than ZIP_RETENTION seconds."
+
+    def handle(self, *args, **options):
+        count = ZippedFolder.delete_expired()
+        self.stdout.write(f"Deleted {count} zip archives.")
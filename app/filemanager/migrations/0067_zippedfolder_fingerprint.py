@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("filemanager", "0066_populate_mime_type"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="zippedfolder",
+            name="fingerprint",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
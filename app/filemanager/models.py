@@ -1,17 +1,18 @@
 import datetime
+import hashlib
 import logging
 import mimetypes
 import secrets
-import shutil
 import string
 import tempfile
 import uuid
+import zipfile
 from functools import partial
-from pathlib import Path
 
 import html2text
-import magic
 import requests
+from backend.fetching import ObjectFetcher
+from backend.storage import save_stream, sniff_mime_type
 from ckeditor.fields import RichTextField
 from colorfield.fields import ColorField
 from core.models import FileBaseModal, FolderBaseModel
@@ -20,7 +21,6 @@ from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.core.files import File as DjangoFile
 from django.core.mail import send_mail
 from django.db import IntegrityError, models, transaction
 from django.template.loader import render_to_string
@@ -76,6 +76,57 @@ class ZippedFolder(models.Model):
     )
     file = models.FileField()
     downloaded_at = models.DateTimeField(null=True, blank=True)
+    # Folder.get_zip_fingerprint() of the contents when zipping started.
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+
+    @classmethod
+    def get_reusable(cls, folder, fingerprint: str):
+        """Newest archive of the same contents that isn't about to expire."""
+        kept_for = settings.ZIP_RETENTION - settings.AWS_URL_EXPIRATION
+        return (
+            cls.objects.filter(
+                folder=folder,
+                fingerprint=fingerprint,
+                zipped_at__gte=timezone.now()
+                - datetime.timedelta(seconds=kept_for),
+            )
+            .order_by("-zipped_at")
+            .first()
+        )
+
+    @classmethod
+    def delete_expired(cls) -> int:
+        """Delete archives older than ``ZIP_RETENTION`` seconds."""
+        expired = cls.objects.filter(
+            zipped_at__lt=timezone.now()
+            - datetime.timedelta(seconds=settings.ZIP_RETENTION)
+        )
+        count = 0
+        for zipped_folder in expired.iterator():
+            zipped_folder.file.delete(save=False)
+            zipped_folder.delete()
+            count += 1
+        return count
+
+
+def get_zip_path_part(name: str) -> str:
+    return name.replace("/", "_") or "_"
+
+
+def get_unique_zip_name(names: set, name: str) -> str:
+    """Name for an archive member, numbered if it's already taken."""
+    folder, _, file_name = name.rpartition("/")
+    name = "/".join(filter(None, [folder, get_zip_path_part(file_name)]))
+    stem, dot, suffix = name.rpartition(".")
+    if not dot or "/" in suffix:
+        stem, dot, suffix = name, "", ""
+    unique_name = name
+    number = 1
+    while unique_name in names:
+        unique_name = f"{stem} ({number}){dot}{suffix}"
+        number += 1
+    names.add(unique_name)
+    return unique_name
 
 
 def folder_default_custom_fields():
@@ -200,69 +251,149 @@ class Folder(FolderBaseModel):
         self.is_root = not bool(self.parent)
         super(Folder, self).save(*args, **kwargs)
 
-    def _save_folder_files(self, folder, path: Path):
-        for file in folder.files.all():
-            file_path = path / file.file_name
-            with file_path.open("wb") as fp:
-                for chunk in file.file.chunks():
-                    fp.write(chunk)
-
-    def _save_folder_videos(self, folder, path):
-        for video in folder.video_files.all():
-            file_path = path / video.title
-            with file_path.open("wb") as fp:
-                for chunk in video.file.chunks():
-                    fp.write(chunk)
-
-    def _save_folder_notes(self, folder, path: Path):
+    def _add_to_zip(self, archive: zipfile.ZipFile, name: str, chunks):
+        with archive.open(name, "w", force_zip64=True) as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+
+    def _zip_fetched(self, fetched, archive, names: set, get_name):
+        for item, fetched_object, error in fetched:
+            if error is not None:
+                raise error
+            self._add_to_zip(
+                archive,
+                get_unique_zip_name(names, get_name(item)),
+                fetched_object.chunks(),
+            )
+
+    def _zip_folder_files(self, folder, archive, path, names, fetcher):
+        self._zip_fetched(
+            fetcher.fetch(folder.files.all()),
+            archive,
+            names,
+            lambda file: path + file.file_name,
+        )
+
+    def _zip_folder_videos(self, folder, archive, path, names, fetcher):
+        self._zip_fetched(
+            fetcher.fetch(folder.video_files.all()),
+            archive,
+            names,
+            lambda video: path + video.title,
+        )
+
+    def _zip_folder_notes(self, folder, archive, path: str, names: set):
         for note in folder.stickynotes.all():
-            note_path = path / f"{secrets.token_urlsafe()}.txt"
-            with note_path.open("w", encoding="utf-8") as fp:
-                fp.write(html2text.html2text(note.description))
+            archive.writestr(
+                get_unique_zip_name(
+                    names, f"{path}{secrets.token_urlsafe()}.txt"
+                ),
+                html2text.html2text(note.description),
+            )
 
-    def _save_folder_tasks(self, folder, path: Path):
+    def _zip_folder_tasks(self, folder, archive, path: str, names: set):
         for task in folder.task.all():
-            task_path = path / f"{task.title}.txt"
-            with task_path.open("w", encoding="utf-8") as fp:
-                fp.write(f"Start at: {task.start_at}\n")
-                fp.write(f"End at: {task.end_at}\n")
-                fp.write(f"Remind at: {task.remind_at}\n")
-                fp.write(f"Done: {task.done}\n\n\n")
-                fp.write(task.description)
+            archive.writestr(
+                get_unique_zip_name(names, f"{path}{task.title}.txt"),
+                f"Start at: {task.start_at}\n"
+                f"End at: {task.end_at}\n"
+                f"Remind at: {task.remind_at}\n"
+                f"Done: {task.done}\n\n\n"
+                f"{task.description}",
+            )
 
-    def zip_contents(self):
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            folder_path = Path(tmp_dir)
+    def _zip_folder(self, folder, archive, path: str, names: set, fetcher):
+        self._zip_folder_files(folder, archive, path, names, fetcher)
+        self._zip_folder_videos(folder, archive, path, names, fetcher)
+        self._zip_folder_notes(folder, archive, path, names)
+        self._zip_folder_tasks(folder, archive, path, names)
+
+    def write_zip(self, fp):
+        """Write the folder's contents as a zip archive to ``fp``.
+
+        Objects are fetched from storage concurrently and streamed into the
+        archive, and ``fp`` doesn't need to be seekable.
+        """
+        names = set()
+        fetcher = ObjectFetcher(f"zip of folder {self.pk}")
+        with fetcher, zipfile.ZipFile(
+            fp, "w", zipfile.ZIP_DEFLATED
+        ) as archive:
             if self.is_root:
                 for subfolder in self.subfolders.all():
-                    subfolder_path: Path = folder_path / subfolder.title
-                    subfolder_path.mkdir(exist_ok=True)
-                    self._save_folder_files(subfolder, subfolder_path)
-                    self._save_folder_videos(subfolder, subfolder_path)
-                    self._save_folder_notes(subfolder, subfolder_path)
-                    self._save_folder_tasks(subfolder, subfolder_path)
-            self._save_folder_files(self, folder_path)
-            self._save_folder_videos(self, folder_path)
-            self._save_folder_notes(self, folder_path)
-            self._save_folder_tasks(self, folder_path)
-            zip_basename = str(
-                Path(tempfile.gettempdir()) / slugify(self.title)
+                    self._zip_folder(
+                        subfolder,
+                        archive,
+                        f"{get_zip_path_part(subfolder.title)}/",
+                        names,
+                        fetcher,
+                    )
+            self._zip_folder(self, archive, "", names, fetcher)
+
+    def get_zip_folders(self):
+        if self.is_root:
+            return Folder.objects.filter(
+                models.Q(pk=self.pk) | models.Q(parent=self)
             )
-            zip_filepath = zip_basename + ".zip"
-            shutil.make_archive(
-                zip_basename, "zip", root_dir=tmp_dir, base_dir=tmp_dir
+        return Folder.objects.filter(pk=self.pk)
+
+    def get_zip_fingerprint(self) -> str:
+        """Hash of the contents that go into the folder's zip archive.
+
+        It's made of the count and latest update of the folders, files,
+        videos, notes and tasks the archive holds, so it changes whenever
+        any of them is added, changed or deleted.
+        """
+        folders = self.get_zip_folders()
+        aggregates = [
+            folders.aggregate(
+                count=models.Count("pk"), updated=models.Max("updated")
             )
+        ]
+        for model, updated_field in (
+            (File, "updated"),
+            (VideoFile, "updated_at"),
+            (StickyNote, "updated"),
+            (Task, "updated_at"),
+        ):
+            aggregates.append(
+                model.objects.filter(folder__in=folders).aggregate(
+                    count=models.Count("pk"),
+                    updated=models.Max(updated_field),
+                )
+            )
+        return hashlib.sha256(repr(aggregates).encode()).hexdigest()
+
+    def zip_contents(self):
+        fingerprint = self.get_zip_fingerprint()
+        zipped_folder = ZippedFolder.get_reusable(self, fingerprint)
+        if zipped_folder is not None:
             log.info(
-                "Created zip archive for folder %d at %s",
+                "Reusing zip archive %d for folder %d.",
+                zipped_folder.pk,
                 self.pk,
-                folder_path / zip_filepath,
             )
-            with (folder_path / zip_filepath).open("rb") as fp:
-                file_name = Path(zip_filepath).name
-                django_file = DjangoFile(fp, name=file_name)
-                zipped_folder = ZippedFolder(folder=self, file=django_file)
-                zipped_folder.save()
-                return zipped_folder.pk
+            return zipped_folder.pk
+        zipped_folder = ZippedFolder(folder=self, fingerprint=fingerprint)
+        # Archives are written straight to storage under a unique key, since
+        # S3 overwrites objects with the same name.
+        name = (
+            f"zips/{self.pk}/{secrets.token_hex(8)}/"
+            f"{slugify(self.title) or 'folder'}.zip"
+        )
+        zipped_folder.file.name = save_stream(
+            zipped_folder.file.storage,
+            name,
+            self.write_zip,
+            content_type="application/zip",
+        )
+        zipped_folder.save()
+        log.info(
+            "Created zip archive for folder %d at %s",
+            self.pk,
+            zipped_folder.file.name,
+        )
+        return zipped_folder.pk
 
     def transfer_to_email(self, to_email):
         if hasattr(self, "transfer"):
@@ -354,13 +485,10 @@ class File(FileBaseModal):
         transaction.on_commit(partial(convert_image_to_jpeg, self.pk))
 
     def set_mime_type(self):
-        with tempfile.NamedTemporaryFile("wb+") as fp:
-            for chunk in self.file.chunks():
-                fp.write(chunk)
-            fp.seek(0)
-            mime = magic.from_buffer(fp.read(), mime=True)
-            self._mime_type = mime
-            self.save()
+        mime = sniff_mime_type(self.file)
+        self._mime_type = mime
+        # Saving would schedule the thumbnail and conversion tasks again.
+        File.objects.filter(pk=self.pk).update(_mime_type=mime)
         return mime
 
     @property
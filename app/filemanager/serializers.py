@@ -1,8 +1,13 @@
 import logging
+import mimetypes
 import uuid
 
 from backend.aws_setup import download
-from core.serializers import UserSerializer
+from core.serializers import (
+    SignedURLListSerializer,
+    SignedURLMixin,
+    UserSerializer,
+)
 from realestate.models import Home
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -80,7 +85,7 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class FileSerializer(serializers.ModelSerializer):
+class FileSerializer(SignedURLMixin, serializers.ModelSerializer):
     id = serializers.UUIDField(default=uuid.uuid4)
     created_by = serializers.StringRelatedField(
         default=serializers.CurrentUserDefault(), read_only=True
@@ -89,6 +94,7 @@ class FileSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
         exclude = ["_mime_type"]
+        list_serializer_class = SignedURLListSerializer
 
     def validate(self, attrs):
         file = attrs.get("file")
@@ -102,17 +108,27 @@ class FileSerializer(serializers.ModelSerializer):
         validated_data["created_by"] = self.context["request"].user
         return super().create(validated_data)
 
+    def get_url_keys(self, instance) -> list:
+        url_keys = [(instance.file.name, True)]
+        if instance.thumbnail.name:
+            url_keys.append((instance.thumbnail.name, True))
+        return url_keys
+
     def to_representation(self, instance):
         rep = super(FileSerializer, self).to_representation(instance)
         rep["folder"] = {
             "id": instance.folder.id,
             "title": instance.folder.title,
         }
-        rep["file"] = download(instance.file.name, True)
+        rep["file"] = self.get_url(instance.file.name, True)
         if instance.thumbnail.name:
-            rep["thumbnail"] = download(instance.thumbnail.name, True)
+            rep["thumbnail"] = self.get_url(instance.thumbnail.name, True)
         rep["isImage"] = instance.is_image
-        rep["mime_type"] = instance.mime_type
+        # The type is sniffed when files are saved. Sniffing a file saved
+        # before that would read from storage, so its name is used instead.
+        rep["mime_type"] = (
+            instance._mime_type or mimetypes.guess_type(instance.file.name)[0]
+        )
         return rep
 
 
@@ -198,13 +214,19 @@ class SubFolderSerailizer(serializers.ModelSerializer):
         )
 
 
-class VideoFileSerializer(serializers.ModelSerializer):
+class VideoFileSerializer(SignedURLMixin, serializers.ModelSerializer):
+    def get_url_keys(self, instance) -> list:
+        url_keys = [(instance.file.name, True)]
+        if instance.thumbnail.name:
+            url_keys.append((instance.thumbnail.name, True))
+        return url_keys
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep["file"] = download(instance.file.name, allow_download=True)
+        rep["file"] = self.get_url(instance.file.name, allow_download=True)
         if instance.thumbnail.name:
-            rep["thumbnail"] = download(
-                instance.thumbnail, allow_download=True
+            rep["thumbnail"] = self.get_url(
+                instance.thumbnail.name, allow_download=True
             )
         return rep
 
@@ -229,9 +251,10 @@ class VideoFileSerializer(serializers.ModelSerializer):
         model = VideoFile
         fields = "__all__"
         read_only_fields = ["status", "created_at", "updated_at"]
+        list_serializer_class = SignedURLListSerializer
 
 
-class FolderSerializer(serializers.ModelSerializer):
+class FolderSerializer(SignedURLMixin, serializers.ModelSerializer):
     subfolders = SubFolderSerailizer(many=True, read_only=True)
     stickynotes = StickyNoteSerializer(many=True, read_only=True)
     created_by = serializers.StringRelatedField(
@@ -239,15 +262,22 @@ class FolderSerializer(serializers.ModelSerializer):
     )
     shared_with = ShareSerializer(many=True, read_only=True)
 
+    def get_url_keys(self, instance) -> list:
+        if instance.image.name:
+            return [(instance.image.name, True)]
+        return []
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         if instance.image.name:
-            rep["image"] = download(instance.image.name, allow_download=True)
+            rep["image"] = self.get_url(
+                instance.image.name, allow_download=True
+            )
         elif instance.asset_type.title == "HOME":
             try:
                 home = Home.objects.get(full_address=instance.full_address)
                 if img := home.folder.image.name:
-                    rep["image"] = download(img, allow_download=True)
+                    rep["image"] = self.get_url(img, allow_download=True)
             except Home.DoesNotExist:
                 pass
         return rep
@@ -273,6 +303,7 @@ class FolderSerializer(serializers.ModelSerializer):
             "image",
         )
         read_only_fields = ["email"]
+        list_serializer_class = SignedURLListSerializer
 
     def create(self, validated_data):
         validated_data["created_by"] = self.context["request"].user
@@ -484,7 +515,13 @@ class ZippedFolderSerializer(serializers.ModelSerializer):
         fields = ["file"]
 
 
-class SharedFileSerializer(serializers.ModelSerializer):
+class SharedFileSerializer(SignedURLMixin, serializers.ModelSerializer):
+    def get_url_keys(self, instance) -> list:
+        return [
+            (instance.content_object.file.name, False),
+            (instance.content_object.thumbnail.name, False),
+        ]
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         if instance.content_type.model == "file":
@@ -501,8 +538,10 @@ class SharedFileSerializer(serializers.ModelSerializer):
             {
                 "file_name": file_name,
                 "file_type": instance.content_type.model,
-                "file": download(instance.content_object.file.name),
-                "thumbnail": download(instance.content_object.thumbnail.name),
+                "file": self.get_url(instance.content_object.file.name),
+                "thumbnail": self.get_url(
+                    instance.content_object.thumbnail.name
+                ),
                 "mime_type": mime_type,
             }
         )
@@ -511,6 +550,7 @@ class SharedFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = SharedFile
         fields = ["id", "created_at", "updated_at"]
+        list_serializer_class = SignedURLListSerializer
 
 
 class PerformFolderTransferSerializer(serializers.Serializer):
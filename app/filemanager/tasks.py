@@ -2,15 +2,20 @@ import logging
 import secrets
 import subprocess
 import tempfile
+import uuid
 from pathlib import Path
 
-import magic
-from celery import shared_task
+from backend.task_queues import user_task_slot
+from celery import shared_task, states
+from celery.result import AsyncResult
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files import File as DjangoFile
 from django.core.files.images import ImageFile
 from PIL import Image, ImageOps
 from pillow_heif import register_heif_opener
+
 # from preview_generator.manager import PreviewManager
 
 log = logging.getLogger(__name__)
@@ -22,102 +27,89 @@ register_heif_opener()
 def generate_thumbnail_for_image(image_pk):
     File = apps.get_model("filemanager", "File")
     image_file = File.objects.get(pk=image_pk)
+    # The type is sniffed from the first bytes of the file, so only images
+    # are downloaded in full.
+    file_type, extension = image_file.mime_type.split("/")
+    log.debug("Received file type %s with extension %s", file_type, extension)
+    if file_type != "image":
+        return
     _, tmp_file = tempfile.mkstemp()
     _, tmp_thumb = tempfile.mkstemp(suffix=".jpg")
     with Path(tmp_file).open("wb") as fp:
         for chunk in image_file.file.chunks():
             fp.write(chunk)
 
-    mime_type = magic.from_file(tmp_file, mime=True)
-    file_type, extension = mime_type.split("/")
-    log.debug("Received file type %s with extension %s", file_type, extension)
-    if file_type == "image":
-        with Image.open(tmp_file) as pil_image:
-            thumbnail_image = ImageOps.exif_transpose(pil_image)
-            thumbnail_image.thumbnail((500, 500))
-
-            thumbnail_image = thumbnail_image.convert("RGB")
-
-            thumbnail_image.save(tmp_thumb, format="JPEG")
-            thumbnail_image.seek(0)
-
-            with Path(tmp_thumb).open("rb") as fp:
-                django_file = ImageFile(
-                    file=fp, name=f"{secrets.token_urlsafe()}.jpg"
-                )
-                image_file.thumbnail = django_file
-                image_file.save(generate_thumbnail=False)
-    elif extension == "pdf":
-        cache_path = tempfile.mkdtemp()
-        # manager = PreviewManager(cache_path, create_folder=True)
-        # pdf_preview_path = manager.get_jpeg_preview(tmp_file)
-        # with Path(pdf_preview_path).open("rb") as fp:
-        #     django_file = ImageFile(
-        #         file=fp, name=f"{secrets.token_urlsafe()}.jpg"
-        #     )
-        #     image_file.thumbnail = django_file
-        #     image_file.save(generate_thumbnail=False)
+    with Image.open(tmp_file) as pil_image:
+        thumbnail_image = ImageOps.exif_transpose(pil_image)
+        thumbnail_image.thumbnail((500, 500))
+
+        thumbnail_image = thumbnail_image.convert("RGB")
+
+        thumbnail_image.save(tmp_thumb, format="JPEG")
+        thumbnail_image.seek(0)
+
+        with Path(tmp_thumb).open("rb") as fp:
+            django_file = ImageFile(
+                file=fp, name=f"{secrets.token_urlsafe()}.jpg"
+            )
+            image_file.thumbnail = django_file
+            image_file.save(generate_thumbnail=False)
 
 
 @shared_task
 def convert_image_to_jpeg(file_pk):
     File = apps.get_model("filemanager", "File")
     file = File.objects.get(pk=file_pk)
-    _, tmp_file = tempfile.mkstemp()
+    if file.mime_type != "image/heic":
+        return
     with tempfile.NamedTemporaryFile("wb+") as tmp_file:
         for chunk in file.file.chunks():
             tmp_file.write(chunk)
 
         tmp_file.seek(0)
-
-        mime_type = magic.from_buffer(tmp_file.read(2048), mime=True)
-        file_type, extension = mime_type.split("/")
-        tmp_file.seek(0)
-        if file_type == "image":
-            if extension == "heic":
-                with Image.open(
-                    tmp_file
-                ) as pil_image, tempfile.NamedTemporaryFile("wb+") as tmp_jpeg:
-                    pil_image.save(tmp_jpeg, format="JPEG")
-                    tmp_jpeg.seek(0)
-                    file_name, _ = file.file_name.split(".")
-                    django_file = DjangoFile(
-                        file=tmp_jpeg, name=f"{file_name}.jpg"
-                    )
-                    file.file = django_file
-                    file.file_name = file_name + ".jpg"
-                    file.save(generate_thumbnail=False)
+        with Image.open(tmp_file) as pil_image, tempfile.NamedTemporaryFile(
+            "wb+"
+        ) as tmp_jpeg:
+            pil_image.save(tmp_jpeg, format="JPEG")
+            tmp_jpeg.seek(0)
+            file_name, _ = file.file_name.split(".")
+            django_file = DjangoFile(file=tmp_jpeg, name=f"{file_name}.jpg")
+            file.file = django_file
+            file.file_name = file_name + ".jpg"
+            file._mime_type = "image/jpeg"
+            file.save(generate_thumbnail=False)
 
 
 @shared_task
 def generate_thumbnail_for_video(video_pk):
     VideoFile = apps.get_model("filemanager", "VideoFile")
     video_file = VideoFile.objects.get(pk=video_pk)
-    _, tmp_file = tempfile.mkstemp()
-    with Path(tmp_file).open("wb") as fp:
-        for chunk in video_file.file.chunks():
-            fp.write(chunk)
-
-    _, img_path = tempfile.mkstemp(suffix=".jpg")
-    subprocess.call(
-        [
-            "ffmpeg",
-            "-i",
-            tmp_file,
-            "-ss",
-            "00:00:00.000",
-            "-vframes",
-            "1",
-            "-y",
-            img_path,
-        ]
-    )
-    with Path(img_path).open("rb") as fp:
-        django_file = ImageFile(
-            file=fp, name=f"{video_file.title}-thumbnail.jpg"
+    with user_task_slot(video_file.folder.created_by_id):
+        _, tmp_file = tempfile.mkstemp()
+        with Path(tmp_file).open("wb") as fp:
+            for chunk in video_file.file.chunks():
+                fp.write(chunk)
+
+        _, img_path = tempfile.mkstemp(suffix=".jpg")
+        subprocess.call(
+            [
+                "ffmpeg",
+                "-i",
+                tmp_file,
+                "-ss",
+                "00:00:00.000",
+                "-vframes",
+                "1",
+                "-y",
+                img_path,
+            ]
         )
-        video_file.thumbnail = django_file
-        video_file.save()
+        with Path(img_path).open("rb") as fp:
+            django_file = ImageFile(
+                file=fp, name=f"{video_file.title}-thumbnail.jpg"
+            )
+            video_file.thumbnail = django_file
+            video_file.save()
 
 
 @shared_task
@@ -128,7 +120,53 @@ def zip_folder_contents(folder_id: int):
     except Folder.DoesNotExist:
         log.info("Folder %d doesn't exist.", folder_id)
         return
-    return folder.zip_contents()
+    with user_task_slot(folder.created_by_id):
+        return folder.zip_contents()
+
+
+def queue_zip_folder_contents(folder) -> str:
+    """Id of a task whose result is an archive of the folder's contents.
+
+    An archive of unchanged contents is reused through a result stored
+    right away, and requests while the folder is being zipped share the
+    task already zipping it.
+    """
+    ZippedFolder = apps.get_model("filemanager", "ZippedFolder")
+    fingerprint = folder.get_zip_fingerprint()
+    task_id = str(uuid.uuid4())
+    zipped_folder = ZippedFolder.get_reusable(folder, fingerprint)
+    if zipped_folder is not None:
+        zip_folder_contents.backend.store_result(
+            task_id, zipped_folder.pk, states.SUCCESS
+        )
+        return task_id
+    key = f"filemanager:zip_task:{folder.pk}:{fingerprint}"
+    try:
+        added = cache.add(key, task_id, timeout=settings.ZIP_TASK_TIMEOUT)
+    except Exception:
+        # Without the cache, requests aren't coalesced but still served.
+        log.warning(
+            "Couldn't check for a task zipping folder %d.",
+            folder.pk,
+            exc_info=True,
+        )
+        added = True
+    if not added:
+        queued_task_id = cache.get(key)
+        if (
+            queued_task_id is not None
+            and AsyncResult(queued_task_id).state != states.FAILURE
+        ):
+            log.info(
+                "Folder %d is already being zipped by task %s.",
+                folder.pk,
+                queued_task_id,
+            )
+            return queued_task_id
+        # The queued task failed, so it's tried again.
+        cache.set(key, task_id, timeout=settings.ZIP_TASK_TIMEOUT)
+    zip_folder_contents.apply_async((folder.pk,), task_id=task_id)
+    return task_id
 
 
 @shared_task
@@ -1,10 +1,17 @@
+import tempfile
+import zipfile
+from datetime import timedelta
 from unittest.mock import patch
 
 from django.conf import settings
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.utils.text import slugify
 
-from filemanager.tests.factories import FolderFactory
+from backend.fetching import ObjectFetcher, open_object
+from backend.storage import read_header
+from filemanager.models import ZippedFolder, get_unique_zip_name
+from filemanager.tests.factories import FileFactory, FolderFactory
 
 
 class FolderTests(TestCase):
@@ -23,3 +30,119 @@ class FolderTests(TestCase):
             folder = FolderFactory()
             FolderFactory(title=folder.title)
             self.assertEqual(mock_secrets.token_urlsafe.call_count, 3)
+
+
+class FileMimeTypeTests(TestCase):
+    def test_mime_type_is_set_on_create(self):
+        file = FileFactory(file__data=b"Some plain text.\n" * 100)
+        file.refresh_from_db()
+        self.assertEqual(file._mime_type, "text/plain")
+
+    @override_settings(MIME_SNIFF_BYTES=8)
+    def test_read_header_reads_only_the_header(self):
+        file = FileFactory(file__data=b"abcdef" * 100)
+        self.assertEqual(read_header(file.file), b"abcdefab")
+
+
+class FolderZipTests(TestCase):
+    def test_zip_contents_streams_files_into_the_archive(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+            MEDIA_ROOT=media_root,
+        ):
+            folder = FolderFactory()
+            FileFactory(
+                folder=folder, file_name="manual.txt", file__data=b"first"
+            )
+            FileFactory(
+                folder=folder, file_name="manual.txt", file__data=b"second"
+            )
+            zipped_folder = ZippedFolder.objects.get(pk=folder.zip_contents())
+            with zipped_folder.file.open("rb") as fp:
+                archive = zipfile.ZipFile(fp)
+                self.assertEqual(
+                    sorted(archive.namelist()),
+                    ["manual (1).txt", "manual.txt"],
+                )
+                self.assertEqual(
+                    sorted(archive.read(name) for name in archive.namelist()),
+                    [b"first", b"second"],
+                )
+
+    def test_fingerprint_changes_with_the_contents(self):
+        folder = FolderFactory()
+        fingerprint = folder.get_zip_fingerprint()
+        self.assertEqual(folder.get_zip_fingerprint(), fingerprint)
+        file = FileFactory(folder=folder)
+        self.assertNotEqual(folder.get_zip_fingerprint(), fingerprint)
+        fingerprint = folder.get_zip_fingerprint()
+        file.delete()
+        self.assertNotEqual(folder.get_zip_fingerprint(), fingerprint)
+
+    @override_settings(ZIP_RETENTION=3600, AWS_URL_EXPIRATION=60)
+    def test_archives_of_unchanged_folders_are_reused(self):
+        folder = FolderFactory()
+        zipped_folder = ZippedFolder.objects.create(
+            folder=folder,
+            file="zips/archive.zip",
+            fingerprint=folder.get_zip_fingerprint(),
+        )
+        self.assertEqual(folder.zip_contents(), zipped_folder.pk)
+        ZippedFolder.objects.filter(pk=zipped_folder.pk).update(
+            zipped_at=timezone.now() - timedelta(hours=2)
+        )
+        self.assertIsNone(
+            ZippedFolder.get_reusable(folder, zipped_folder.fingerprint)
+        )
+        with patch.object(ZippedFolder.file.field.storage, "delete"):
+            self.assertEqual(ZippedFolder.delete_expired(), 1)
+        self.assertFalse(ZippedFolder.objects.exists())
+
+    def test_unique_zip_names_are_numbered(self):
+        names = set()
+        self.assertEqual(get_unique_zip_name(names, "a/b.txt"), "a/b.txt")
+        self.assertEqual(get_unique_zip_name(names, "a/b.txt"), "a/b (1).txt")
+        self.assertEqual(get_unique_zip_name(names, "a/c/d"), "a/c/d")
+        self.assertEqual(get_unique_zip_name(names, "a/c/d"), "a/c/d (1)")
+
+
+class ObjectFetcherTests(TestCase):
+    @override_settings(
+        STORAGE_FETCH_SPOOL_SIZE=8, STORAGE_FETCH_MEMORY_BUDGET=16
+    )
+    def test_fetch_yields_files_in_order(self):
+        files = [
+            FileFactory(file__data=data)
+            for data in [b"small", b"larger than the spool size", b"tiny"]
+        ]
+        with ObjectFetcher("test") as fetcher:
+            fetched = [
+                (item, fetched_object.read(), error)
+                for item, fetched_object, error in fetcher.fetch(files)
+            ]
+        self.assertEqual(
+            fetched,
+            [
+                (files[0], b"small", None),
+                (files[1], b"larger than the spool size", None),
+                (files[2], b"tiny", None),
+            ],
+        )
+        self.assertEqual(fetcher.counters["fetched_objects"], 3)
+        self.assertEqual(fetcher.counters["fetched_bytes"], 35)
+
+    @override_settings(
+        STORAGE_FETCH_SPOOL_SIZE=8, STORAGE_FETCH_MEMORY_BUDGET=16
+    )
+    def test_larger_files_are_only_opened_when_read(self):
+        files = [FileFactory(file__data=b"larger than the spool size")]
+        with patch(
+            "backend.fetching.open_object", wraps=open_object
+        ) as mock_open_object, ObjectFetcher("test") as fetcher:
+            [(_, fetched_object, _)] = list(fetcher.fetch(files))
+            self.assertEqual(fetched_object.data, b"larger t")
+            mock_open_object.assert_not_called()
+            self.assertEqual(
+                fetched_object.read(), b"larger than the spool size"
+            )
+            mock_open_object.assert_called_once_with(files[0].file, 8)
@@ -1,12 +1,13 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from django.conf import settings
 from django.core.files import File
 from django.test import TestCase
 
 from core.tests.factories import UserFactory
-from filemanager.serializers import VideoFileSerializer
-from filemanager.tests.factories import FolderFactory
+from filemanager.models import File as FolderrFile
+from filemanager.serializers import FileSerializer, VideoFileSerializer
+from filemanager.tests.factories import FileFactory, FolderFactory
 
 
 class VideoFileSerializerTests(TestCase):
@@ -30,3 +31,31 @@ class VideoFileSerializerTests(TestCase):
             request.user = self.folder.created_by
             serializer = VideoFileSerializer(data=data, context={'request': request})
             self.assertTrue(serializer.is_valid())
+
+
+class FileSerializerTests(TestCase):
+    def test_list_signs_urls_in_one_batch_without_storage_io(self):
+        folder = FolderFactory()
+        for _ in range(3):
+            FileFactory(folder=folder)
+        # Files saved before types were sniffed on upload.
+        FolderrFile.objects.update(_mime_type=None)
+        files = list(FolderrFile.objects.order_by("pk"))
+        with (
+            patch(
+                "core.serializers.download_many",
+                side_effect=lambda url_keys: {
+                    url_key: f"signed:{url_key[0]}" for url_key in url_keys
+                },
+            ) as download_many,
+            patch("core.serializers.download") as download,
+            patch("filemanager.models.sniff_mime_type") as sniff_mime_type,
+        ):
+            data = FileSerializer(files, many=True).data
+        download_many.assert_called_once()
+        download.assert_not_called()
+        sniff_mime_type.assert_not_called()
+        self.assertEqual(
+            [item["file"] for item in data],
+            [f"signed:{file.file.name}" for file in files],
+        )
@@ -84,7 +84,7 @@ from .serializers import (
     VideoFileSerializer,
     ZippedFolderSerializer,
 )
-from .tasks import zip_folder_contents
+from .tasks import queue_zip_folder_contents
 
 log = logging.getLogger(__name__)
 
@@ -180,8 +180,7 @@ class FolderViewSet(viewsets.ModelViewSet):
             except Share.DoesNotExist:
                 raise NotFound()
             folder = share.folder
-        task_result = zip_folder_contents.delay(folder.pk)
-        return Response({"taskId": task_result.id})
+        return Response({"taskId": queue_zip_folder_contents(folder)})
 
     @action(detail=False, methods=["get"], url_path="zip-result")
     def get_zip_result(self, request):
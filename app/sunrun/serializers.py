@@ -1,4 +1,4 @@
-from backend.aws_setup import download
+from core.serializers import SignedURLListSerializer, SignedURLMixin
 from rest_framework import serializers
 from sunrun.models import Checklist, Job, JobNote, JobPhoto, JobVideo
 
@@ -9,11 +9,14 @@ class ChecklistSerializer(serializers.ModelSerializer):
         exclude = ["user"]
 
 
-class JobPhotoSerializer(serializers.ModelSerializer):
+class JobPhotoSerializer(SignedURLMixin, serializers.ModelSerializer):
+    def get_url_keys(self, instance) -> list:
+        return [(instance.file.name, False)]
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         rep["file"] = {
-            "url": download(instance.file.name),
+            "url": self.get_url(instance.file.name),
             "name": instance.file.name,
         }
         return rep
@@ -21,13 +24,17 @@ class JobPhotoSerializer(serializers.ModelSerializer):
     class Meta:
         model = JobPhoto
         fields = "__all__"
+        list_serializer_class = SignedURLListSerializer
+
 
+class JobVideoSerializer(SignedURLMixin, serializers.ModelSerializer):
+    def get_url_keys(self, instance) -> list:
+        return [(instance.video.name, False)]
 
-class JobVideoSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         rep = super().to_representation(instance)
         rep["file"] = {
-            "url": download(instance.video.name),
+            "url": self.get_url(instance.video.name),
             "name": instance.video.name,
         }
         return rep
@@ -35,6 +42,7 @@ class JobVideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = JobVideo
         fields = "__all__"
+        list_serializer_class = SignedURLListSerializer
 
 
 class JobNoteSerializer(serializers.ModelSerializer):
@@ -43,21 +51,30 @@ class JobNoteSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class JobSerializer(serializers.ModelSerializer):
+class JobSerializer(SignedURLMixin, serializers.ModelSerializer):
     notes = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     photos = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
     videos = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
+    def get_url_keys(self, instance) -> list:
+        return [
+            (field_file.name, False)
+            for field_file in (
+                instance.receipt_file,
+                instance.electrical_panel_file,
+            )
+            if field_file.name
+        ]
+
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if receipt_file := getattr(instance.receipt_file, "name"):
-            rep["receipt_file"] = download(receipt_file.name)
-        if electrical_panel_file := getattr(
-            instance.electrical_panel_file, "name"
-        ):
-            rep["electrical_panel_file"] = download(electrical_panel_file.name)
+        if receipt_file := instance.receipt_file.name:
+            rep["receipt_file"] = self.get_url(receipt_file)
+        if electrical_panel_file := instance.electrical_panel_file.name:
+            rep["electrical_panel_file"] = self.get_url(electrical_panel_file)
         return rep
 
     class Meta:
         model = Job
         exclude = ["user"]
+        list_serializer_class = SignedURLListSerializer
@@ -7,6 +7,9 @@ export POETRY_BIN=/home/ubuntu/.local/bin/poetry
 
 sudo systemctl stop folderr
 sudo systemctl stop folderr-celery
+# Missing on the first deploy that ships it.
+sudo systemctl stop folderr-celery-bulk || true
+sudo systemctl stop folderr-stream || true
 rm -rf folderr
 unzip *.zip
 rm -f *.zip
@@ -24,5 +27,10 @@ $POETRY_BIN run python manage.py migrate
 $POETRY_BIN run python manage.py collectstatic
 sudo systemctl start folderr
 sudo systemctl start folderr-celery
+sudo systemctl enable --now folderr-celery-bulk
+sudo systemctl enable --now folderr-stream
+sudo systemctl enable --now folderr-delete-expired-zips.timer
+sudo systemctl enable --now folderr-delete-unused-embeddings.timer
+sudo systemctl enable --now folderr-delete-unused-chunks.timer
 
 unset DOT_ENV_FILE_PATH